@@ -0,0 +1 @@
+"""Synthetic workbooks and stage-level timing of the bonus filter (see generate.py and run.py)."""
@@ -0,0 +1,267 @@
+"""
+Synthetic 输入数据.xlsx / 输出数据.xlsx pairs with the real sheet and column names, for benchmarking.
+
+    python -m benchmarks.generate --rows 1M --out benchmarks/data/1M
+    python benchmarks/generate.py --rows 1M --out benchmarks/data/1M     # the same
+
+Everything is generated column-wise with numpy, and written with report_writer.write_workbook
+using a shared-string table like Excel, so 5M hour rows take minutes rather than hours.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+if not __package__:
+    # Run as a script (python benchmarks/generate.py): the tool's modules are in the repository root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bonus_rules import ASSISTANT_MANAGER_TITLES, STORE_MANAGER_TITLES, TEA_MASTER_CERTS_REQUIRED, TEA_MASTER_TITLES
+from report_writer import write_workbook
+
+INPUT_NAME = '输入数据.xlsx'
+TEMPLATE_NAME = '输出数据.xlsx'
+
+# Headers of the real 输出数据.xlsx
+OUTPUT_HEADERS = ['工号', '姓名', '身份证信息', '门店编码', '部门', '第三方', '工作地区', '职位', '入职日期', '转正日期',
+                  '离职日期', '组织类型', '所属区域', '负责人', '开业时间', '闭店时间', '工时', '年假小时数', '总工时',
+                  '是否门店负责人']
+
+# Title mix of the hour rows: (title, weight). Titles outside the rules are excluded as out of scope.
+TITLE_WEIGHTS = ([(t, 8) for t in TEA_MASTER_TITLES] + [('兼职茶饮师', 12), ('兼职收银员', 6), ('就业见习生', 3)]
+                 + [(t, 3) for t in ASSISTANT_MANAGER_TITLES] + [(t, 2) for t in STORE_MANAGER_TITLES]
+                 + [('调茶大咖', 4), ('收银员', 6), ('储备干部', 2)])
+OTHER_CERTS = ['【奈雪】烘焙岗证书', '【奈雪】食品安全证书']
+REGIONS = ['华南', '华东', '华北', '西南', '华中', '西北']
+CITIES = ['深圳', '广州', '上海', '杭州', '北京', '成都', '武汉', '西安']
+BRANDS = ['奈雪', '奈雪PRO', '台盖']
+THIRD_PARTIES = ['/', '/', '/', '外包A', '外包B']
+SURNAMES = list('王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗')
+GIVEN = list('伟芳娜敏静丽强磊军洋勇艳杰涛明超秀霞平刚')
+
+def parse_size(text):
+    """'10k' / '1.5M' / '20000' -> number of rows."""
+    text = str(text).strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+def positive_int(text):
+    """argparse type: an integer of at least 1."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+def _codes(prefix, n, width):
+    return np.array([f'{prefix}{i:0{width}d}' for i in range(n)], dtype=object)
+
+def _names(n):
+    i = np.arange(n)
+    surnames = np.array(SURNAMES, dtype=object)[i % len(SURNAMES)]
+    given = np.array(GIVEN, dtype=object)
+    return surnames + given[(i // len(SURNAMES)) % len(GIVEN)] + given[(i // 7) % len(GIVEN)]
+
+def _date_cells(dates, rng, text_share):
+    """
+    Date column as the HR exports have it: date cells, with text_share of the values written as
+    'YYYY年MM月DD日' or 'YYYY-MM-DD' text instead. NaT stays empty.
+    """
+    dates = pd.DatetimeIndex(dates)
+    cells = np.array(dates.to_pydatetime(), dtype=object)
+    cells[dates.isna()] = None
+    kind = rng.random(len(dates))
+    chinese = (kind < text_share / 2) & dates.notna()
+    iso = (kind >= text_share / 2) & (kind < text_share) & dates.notna()
+    cells[chinese] = dates[chinese].strftime('%Y年%m月%d日').to_numpy(dtype=object)
+    cells[iso] = dates[iso].strftime('%Y-%m-%d').to_numpy(dtype=object)
+    return cells
+
+def _random_dates(rng, n, start, end):
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    return start + pd.to_timedelta(rng.integers(0, (end - start).days + 1, n), unit='D')
+
+def _blank(rng, values, share):
+    values = np.array(values, dtype=object)
+    values[rng.random(len(values)) < share] = None
+    return values
+
+def generate_sheets(rows, seed=0, rows_per_employee=1.6, duplicate_share=0.01, text_date_share=0.5,
+                    filter_rows=3, month='2025-11'):
+    """
+    The sheets of a synthetic 输入数据.xlsx as {sheet name: DataFrame}.
+
+    rows: hour rows in '工时数据'. rows_per_employee: average number of stores per '工号'
+    (employees appear in several rows). duplicate_share: share of '工号' listed twice in
+    '基本数据' / '花名册'. text_date_share: share of dates written as text instead of date cells.
+    filter_rows: rows of '筛选条件' (each selects one region, half of them also one brand); at
+        least 1, since the first row carries '奖金月份'.
+    month: '奖金月份' written to '筛选条件'.
+    """
+    if filter_rows < 1:
+        raise ValueError(f"filter_rows must be at least 1 (the first row carries '奖金月份'), got {filter_rows}")
+    rng = np.random.default_rng(seed)
+    month_start = pd.Timestamp(month).replace(day=1)
+    n_emp = max(1, min(rows, int(round(rows / rows_per_employee))))
+    n_store = max(10, n_emp // 12)
+
+    emp_ids = _codes('PD', n_emp, 7)
+    emp_names = _names(n_emp)
+    titles = np.array([t for t, _ in TITLE_WEIGHTS], dtype=object)
+    weights = np.array([w for _, w in TITLE_WEIGHTS], dtype=float)
+    emp_titles = titles[rng.choice(len(titles), n_emp, p=weights / weights.sum())]
+    store_codes = np.arange(1000, 1000 + n_store)
+    store_regions = np.array(REGIONS, dtype=object)[np.arange(n_store) % len(REGIONS)]
+    store_names = np.array([f'店{code}' for code in store_codes], dtype=object)
+    managers = np.array([f'区经理{i % 97}' for i in range(n_store)], dtype=object)
+
+    # Every employee has at least one hour row; the rest are extra stores of random employees
+    emp_of_row = np.concatenate([np.arange(n_emp), rng.integers(0, n_emp, rows - n_emp)])
+    emp_of_row.sort(kind='stable')
+    store_of_row = rng.integers(0, n_store, rows)
+    row_titles = emp_titles[emp_of_row].copy()
+    # Some hour rows carry an outdated title that standardisation replaces
+    stale = rng.random(rows) < 0.1
+    row_titles[stale] = titles[rng.integers(0, len(titles), stale.sum())]
+    monthly = rng.integers(0, 480, rows) / 2
+    hours = pd.DataFrame({
+        '区域': store_regions[store_of_row],
+        '营运经理': np.array([f'营运经理{i % 13}' for i in range(len(REGIONS))], dtype=object)[store_of_row % len(REGIONS)],
+        '区经理': managers[store_of_row],
+        '工号': emp_ids[emp_of_row],
+        '姓名': emp_names[emp_of_row],
+        '职位名称': row_titles,
+        '门店编码': store_codes[store_of_row],
+        '门店名称': store_names[store_of_row],
+        '考勤工时': monthly,
+        '总工时': monthly + rng.integers(0, 200, rows),
+    })
+
+    # Reference sheets: most employees are in 基本数据, some only in 花名册, a few in neither
+    def employee_sheet(share):
+        members = np.flatnonzero(rng.random(n_emp) < share)
+        dups = members[rng.random(len(members)) < duplicate_share]
+        return np.sort(np.concatenate([members, dups]), kind='stable')
+
+    entry = _random_dates(rng, n_emp, '2018-01-01', month_start + pd.Timedelta(days=45))
+    regular = entry + pd.Timedelta(days=90)
+    leave = pd.DatetimeIndex(np.where(rng.random(n_emp) < 0.03, entry + pd.Timedelta(days=400), pd.NaT))
+
+    b = employee_sheet(0.95)
+    basic = pd.DataFrame({
+        '工号': emp_ids[b],
+        '姓名': emp_names[b],
+        '身份证号码': _blank(rng, [f'44030{v:013d}' for v in rng.integers(0, 10 ** 13, len(b))], 0.05),
+        '组织类型': 'N',
+        '门店编码': store_codes[rng.integers(0, n_store, len(b))],
+        '门店': None,
+        '第三方公司': np.array(THIRD_PARTIES, dtype=object)[rng.integers(0, len(THIRD_PARTIES), len(b))],
+        '职位': _blank(rng, emp_titles[b], 0.05),
+        '工作地区': np.array(CITIES, dtype=object)[rng.integers(0, len(CITIES), len(b))],
+        '入职日期': _date_cells(_blank(rng, entry[b], 0.01), rng, text_date_share),
+        '转正日期': _date_cells(regular[b], rng, text_date_share),
+        '离职日期': _date_cells(leave[b], rng, text_date_share),
+    })
+    basic['门店'] = '店' + basic['门店编码'].astype(str)
+
+    r = employee_sheet(0.3)
+    roster = pd.DataFrame({
+        '工号': emp_ids[r],
+        '姓名': emp_names[r],
+        '身份证': [f'44030{v:013d}' for v in rng.integers(0, 10 ** 13, len(r))],
+        '工作城市': np.array(CITIES, dtype=object)[rng.integers(0, len(CITIES), len(r))],
+        '所属部门': store_names[rng.integers(0, n_store, len(r))],
+        '职位': _blank(rng, emp_titles[r], 0.1),
+        '在职': '是',
+        '第三方公司': np.array(THIRD_PARTIES, dtype=object)[rng.integers(0, len(THIRD_PARTIES), len(r))],
+        '入职日期': _date_cells(entry[r], rng, text_date_share),
+        '转正日期': _date_cells(regular[r], rng, text_date_share),
+        '离职日期': _date_cells(leave[r], rng, text_date_share),
+    })
+
+    # Certificates: the three required ones are common, plus a few others
+    cert_frames = []
+    for name, share in [(c, 0.6) for c in TEA_MASTER_CERTS_REQUIRED] + [(c, 0.2) for c in OTHER_CERTS]:
+        holders = np.flatnonzero(rng.random(n_emp) < share)
+        effective = _random_dates(rng, len(holders), month_start - pd.Timedelta(days=730), month_start + pd.Timedelta(days=60))
+        cert_frames.append(pd.DataFrame({
+            '证书名称': name,
+            '证书编号': [f'SB{v:013d}' for v in rng.integers(0, 10 ** 13, len(holders))],
+            '姓名': emp_names[holders],
+            '账号': emp_ids[holders],
+            '工号': emp_ids[holders],
+            '所在平台': '深圳市品道餐饮管理有限公司',
+            '生效日期': _date_cells(_blank(rng, effective, 0.02), rng, text_date_share),
+            '失效日期': None,
+            '状态': np.where(rng.random(len(holders)) < 0.85, '有效', '失效'),
+            '来源类型': '系统发证',
+            '来源': None,
+            '发证机构': '深圳市品道餐饮管理有限公司',
+        }))
+    certs = pd.concat(cert_frames, ignore_index=True)
+    certs = certs.iloc[rng.permutation(len(certs))].reset_index(drop=True)
+
+    # Store sheets: the 店长 of a store is usually one of its employees
+    first_row_of_store = pd.Series(np.arange(rows)).groupby(store_of_row).first()
+    store_manager = np.array(emp_ids[rng.integers(0, n_emp, n_store)], dtype=object)
+    store_manager[first_row_of_store.index] = emp_ids[emp_of_row[first_row_of_store.to_numpy()]]
+    manager_sheet = pd.DataFrame({
+        '部门编号': store_codes,
+        '部门名称': store_names,
+        '部门全称': store_regions + '-' + store_names,
+        '门店类型': np.where(rng.random(n_store) < 0.3, 'PRO店', '标准店'),
+        '店长': _blank(rng, store_manager, 0.05),
+        '店长姓名': None,
+    })
+    opened = _random_dates(rng, n_store, '2015-01-01', month_start)
+    closed = pd.DatetimeIndex(np.where(rng.random(n_store) < 0.05, opened + pd.Timedelta(days=900), pd.NaT))
+    status = pd.DataFrame({
+        '列1': _codes('nx', n_store, 4),
+        '区域': store_regions,
+        '省份': '中国',
+        '城市': np.array(CITIES, dtype=object)[np.arange(n_store) % len(CITIES)],
+        'ERP门店编码': store_codes,
+        '品牌': np.array(BRANDS, dtype=object)[rng.integers(0, len(BRANDS), n_store)],
+        '名称': store_names,
+        '状态': '营业',
+        '开始营业': _date_cells(opened, rng, text_date_share),
+        '闭店时间': _date_cells(closed, rng, text_date_share),
+    })
+
+    filters = pd.DataFrame({
+        '工时数据-区域': np.array(REGIONS, dtype=object)[np.arange(filter_rows) % len(REGIONS)],
+        '门店状态表-品牌': _blank(rng, np.array(BRANDS, dtype=object)[rng.integers(0, len(BRANDS), filter_rows)], 0.5),
+        '奖金月份': [month_start.strftime('%Y年%m月')] + [None] * (filter_rows - 1),
+    })
+
+    return {'工时数据': hours, '筛选条件': filters, '过岗数据': certs, '基本数据': basic,
+            '门店负责人': manager_sheet, '门店状态表': status, '花名册': roster}
+
+def generate_workbook(out_dir, rows, **options):
+    """Write 输入数据.xlsx (see generate_sheets for the options) and 输出数据.xlsx to out_dir."""
+    os.makedirs(out_dir, exist_ok=True)
+    write_workbook(generate_sheets(rows, **options), os.path.join(out_dir, INPUT_NAME), shared_strings=True)
+    write_workbook({'Sheet1': pd.DataFrame(columns=OUTPUT_HEADERS)}, os.path.join(out_dir, TEMPLATE_NAME))
+    return os.path.join(out_dir, INPUT_NAME)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic 输入数据.xlsx / 输出数据.xlsx pair.')
+    parser.add_argument('--rows', default='100k', help="hour rows, e.g. 10k, 1M, 5M (default 100k)")
+    parser.add_argument('--out', required=True, help='output directory')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rows-per-employee', type=float, default=1.6)
+    parser.add_argument('--duplicate-share', type=float, default=0.01)
+    parser.add_argument('--text-date-share', type=float, default=0.5)
+    parser.add_argument('--filter-rows', type=positive_int, default=3,
+                        help="rows of '筛选条件' (at least 1; the first carries '奖金月份')")
+    parser.add_argument('--month', default='2025-11')
+    args = parser.parse_args(argv)
+
+    path = generate_workbook(args.out, parse_size(args.rows), seed=args.seed,
+                             rows_per_employee=args.rows_per_employee, duplicate_share=args.duplicate_share,
+                             text_date_share=args.text_date_share, filter_rows=args.filter_rows, month=args.month)
+    print(f"Wrote {path} ({parse_size(args.rows)} hour rows)")
+
+if __name__ == '__main__':
+    main()
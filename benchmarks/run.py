@@ -0,0 +1,232 @@
+"""
+Stage-level benchmark of the bonus filter on synthetic workbooks (see generate.py).
+
+    python -m benchmarks.run --rows 10k 1M                 # time each size
+    python -m benchmarks.run --rows 1M --save-baseline     # store benchmarks/baselines/1M.json
+    python -m benchmarks.run --rows 1M --compare           # exit 1 on a regression beyond --threshold
+    python benchmarks/run.py --rows 10k                    # also works as a script
+
+Each run is one filter_bonus_data() call; the stage times come from its RunProfile:
+load, date_parsing, aggregation, filter, indexes, titles, rules, output and write.
+date_parsing is the part of load spent in parse_date_column and titles the part of the rule
+stage spent in standardize_job_titles; both are reported on their own and not counted twice.
+Sheets are parsed in-process (load_workers=1) so that date parsing can be measured, and the
+sheet cache is cleared before every run unless --warm is given.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+if not __package__:
+    # Run as a script (python benchmarks/run.py): the tool's modules are in the repository root
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import filter_bonus_data as fbd
+from benchmarks.generate import INPUT_NAME, TEMPLATE_NAME, generate_workbook, parse_size
+from run_profile import RunProfile
+from sheet_cache import CACHE_DIR_NAME
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+BASELINE_DIR = os.path.join(BENCH_DIR, 'baselines')
+
+STAGES = ['load', 'date_parsing', 'aggregation', 'filter', 'indexes', 'titles', 'rules', 'output', 'write']
+# Stages timed inside another one: {enclosing stage: nested stage}
+NESTED_STAGES = {'load': 'date_parsing', 'rules': 'titles'}
+
+# A stage is a regression when it is this much slower than the baseline, and by at least MIN_DELTA
+# seconds (so that millisecond stages do not flag on noise)
+DEFAULT_THRESHOLD = 0.2
+MIN_DELTA = 0.05
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where it cannot be read)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+class StageTimer:
+    """
+    Wall time per stage of one filter_bonus_data() run, read from its RunProfile; time spent in
+    wrapped nested functions is moved from the enclosing stage to a stage of its own.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.peak_rss = {}
+
+    @contextlib.contextmanager
+    def wrap(self, module, func_name, stage):
+        """Time every call of module.func_name as `stage` while the block runs."""
+        func = getattr(module, func_name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - start
+
+        setattr(module, func_name, timed)
+        try:
+            yield
+        finally:
+            setattr(module, func_name, func)
+
+    def collect(self, profile):
+        """Add the stages recorded by profile (a RunProfile), less the nested stages timed inside them."""
+        for record in profile.stages:
+            self.seconds[record.name] += record.wall
+            self.peak_rss[record.name] = None if record.rss_after is None else round(record.rss_after, 1)
+        for stage, nested in NESTED_STAGES.items():
+            self.seconds[stage] -= self.seconds[nested]
+
+def run_pipeline(data_dir, warm=False, verbose=False):
+    """One timed filter_bonus_data() run on data_dir. Returns (StageTimer, row counts)."""
+    input_file = os.path.join(data_dir, INPUT_NAME)
+    template = os.path.join(data_dir, TEMPLATE_NAME)
+    if not warm:
+        shutil.rmtree(os.path.join(data_dir, CACHE_DIR_NAME), ignore_errors=True)
+
+    timer = StageTimer()
+    profile = RunProfile()
+    out_dir = tempfile.mkdtemp(prefix='bonus-bench-')
+    try:
+        with contextlib.ExitStack() as stack:
+            if not verbose:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+            stack.enter_context(timer.wrap(fbd, 'parse_date_column', 'date_parsing'))
+            stack.enter_context(timer.wrap(fbd, 'standardize_job_titles', 'titles'))
+            summary = fbd.filter_bonus_data(input_file, template, out_dir, load_workers=1, write_workers=1,
+                                            profile=profile)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    if summary['status'] != 'ok':
+        raise ValueError(f"{input_file}: {summary['status']} {summary['message']}".rstrip())
+    timer.collect(profile)
+    rows = {record.name: record for record in profile.stages}
+    counts = {'hour_rows': rows['load'].rows_out, 'filtered_rows': rows['filter'].rows_out,
+              'eligible_rows': summary['eligible']}
+    return timer, counts
+
+def benchmark(label, data_dir, repeat=1, warm=False, verbose=False):
+    """Best-of-`repeat` stage times on data_dir, as a JSON-ready dict."""
+    best = None
+    counts = {}
+    for _ in range(repeat):
+        timer, counts = run_pipeline(data_dir, warm=warm, verbose=verbose)
+        best = dict(timer.seconds) if best is None else {k: min(v, timer.seconds[k]) for k, v in best.items()}
+    return {
+        'label': label,
+        'data_dir': data_dir,
+        'repeat': repeat,
+        'warm': warm,
+        'stages': {name: round(best[name], 4) for name in STAGES},
+        'total': round(sum(best.values()), 4),
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_mb_by_stage': timer.peak_rss,
+        **counts,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+def compare(result, baseline, threshold=DEFAULT_THRESHOLD):
+    """Regression messages of result against baseline (empty if none)."""
+    problems = []
+    for name in STAGES + ['total']:
+        new = result['stages'].get(name) if name != 'total' else result['total']
+        old = baseline['stages'].get(name) if name != 'total' else baseline['total']
+        if old is None or new is None:
+            continue
+        if new > old * (1 + threshold) and new - old >= MIN_DELTA:
+            problems.append(f"{name}: {old:.3f}s -> {new:.3f}s (+{(new / old - 1) * 100 if old else float('inf'):.0f}%)")
+    old_rss, new_rss = baseline.get('peak_rss_mb'), result.get('peak_rss_mb')
+    if old_rss and new_rss and new_rss > old_rss * (1 + threshold):
+        problems.append(f"peak RSS: {old_rss:.0f} MB -> {new_rss:.0f} MB")
+    return problems
+
+def format_result(result):
+    lines = [f"== {result['label']}: {result.get('hour_rows')} hour rows, "
+             f"{result.get('filtered_rows')} after filter, {result.get('eligible_rows')} eligible"]
+    for name in STAGES:
+        lines.append(f"  {name:<13}{result['stages'][name]:9.3f}s")
+    lines.append(f"  {'total':<13}{result['total']:9.3f}s   peak RSS {result['peak_rss_mb']} MB")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time each stage of the bonus filter on synthetic workbooks.')
+    parser.add_argument('--rows', nargs='+', default=['100k'],
+                        help='sizes to run (10k ... 5M); workbooks are generated under benchmarks/data once')
+    parser.add_argument('--data', help='run on this directory (输入数据.xlsx + 输出数据.xlsx) instead of --rows')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='runs per size; the fastest time per stage is kept')
+    parser.add_argument('--warm', action='store_true', help='keep the sheet cache between runs')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('--compare', action='store_true', help='compare with the stored baselines')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown flagged as a regression (default 0.2)')
+    parser.add_argument('--json', help='also write all results to this file')
+    parser.add_argument('-v', '--verbose', action='store_true', help="show the pipeline's own output")
+    args = parser.parse_args(argv)
+
+    if args.data:
+        targets = [(os.path.basename(os.path.normpath(args.data)), os.path.abspath(args.data))]
+    else:
+        targets = []
+        for size in args.rows:
+            data_dir = os.path.join(DATA_DIR, f'{size}-seed{args.seed}')
+            if not os.path.exists(os.path.join(data_dir, INPUT_NAME)):
+                print(f"Generating {size} hour rows into {data_dir}...")
+                generate_workbook(data_dir, parse_size(size), seed=args.seed)
+            targets.append((size, data_dir))
+
+    results = []
+    regressions = {}
+    for label, data_dir in targets:
+        result = benchmark(label, data_dir, repeat=args.repeat, warm=args.warm, verbose=args.verbose)
+        results.append(result)
+        print(format_result(result))
+
+        baseline_path = os.path.join(BASELINE_DIR, f'{label}.json')
+        if args.compare:
+            if os.path.exists(baseline_path):
+                with open(baseline_path, 'r', encoding='utf-8') as f:
+                    problems = compare(result, json.load(f), args.threshold)
+                for problem in problems:
+                    print(f"  REGRESSION {problem}")
+                if problems:
+                    regressions[label] = problems
+                else:
+                    print("  no regression against the baseline")
+            else:
+                print(f"  no baseline for {label} ({baseline_path})")
+        if args.save_baseline:
+            os.makedirs(BASELINE_DIR, exist_ok=True)
+            with open(baseline_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=1)
+            print(f"  baseline saved to {baseline_path}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# --- Rule declarations ---
+#
+# Each rule applies to a set of job titles and lists its outcomes in priority order:
+# the first outcome whose condition holds decides eligibility and the reason code.
+# Conditions are functions of the feature frame (one row per hour record, see
+# evaluate_rules) returning boolean arrays, so every rule is evaluated over the
+# whole frame at once. Reasons are kept as codes + feature columns and only turned
+# into Chinese text by render_reasons() when the exclusion report is written.
+
+Rule = namedtuple('Rule', ['name', 'applies', 'outcomes'])
+Outcome = namedtuple('Outcome', ['code', 'eligible', 'when'])
+
+TEA_MASTER_TITLES = ['茶饮师', '茶饮师（S）', 'Pro训练员', '茶饮训练员']
+ASSISTANT_MANAGER_TITLES = ['副经理', '副店长']
+STORE_MANAGER_TITLES = ['店长', '店长（S）', '见习店长', '资深店长']
+
+# Required certificates (Rule 1 needs all of them, Rule 2 any of them)
+TEA_MASTER_CERTS_REQUIRED = ['【奈雪】大堂服务岗证书', '【奈雪】后厨岗证书', '【奈雪】水吧岗证书']
+
+MIN_TOTAL_HOURS = 40
+MIN_MONTHLY_HOURS = 50
+# "入职满30天的次月参加分配": (entry date + 29 days) must be before the bonus month
+ENTRY_GRACE_DAYS = 29
+
+def _always(f):
+    return np.ones(len(f), dtype=bool)
+
+def _part_time_ok(f):
+    return (f['total_hours'] >= MIN_TOTAL_HOURS) & (f['monthly_hours'] >= MIN_MONTHLY_HOURS) & _part_time_cert_ok(f)
+
+def _part_time_cert_ok(f):
+    return f['has_any_required'] & (f['earliest_required'] < f['month_start'])
+
+def _entry_cutoff(f):
+    return f['entry_date'] + pd.Timedelta(days=ENTRY_GRACE_DAYS)
+
+RULES = [
+    # Rule 1: Tea Master & Trainers - all 3 certificates, judged on the LATEST date
+    Rule('tea_master', lambda f: f['title'].isin(TEA_MASTER_TITLES), [
+        Outcome('TEA_NO_CERT', False, lambda f: ~f['has_any_cert']),
+        Outcome('TEA_MISSING_CERT', False, lambda f: ~f['has_all_required']),
+        Outcome('TEA_OK', True, lambda f: f['latest_required'] < f['month_start']),
+        Outcome('TEA_CERT_TOO_NEW', False, _always),
+    ]),
+    # Rule 2: Part-time & Interns - hours thresholds plus ANY certificate, judged on the EARLIEST date
+    Rule('part_time', lambda f: f['title'].str.contains('兼职', regex=False) | (f['title'] == '就业见习生'), [
+        Outcome('PART_TIME_OK', True, _part_time_ok),
+        Outcome('PART_TIME_FAIL', False, _always),
+    ]),
+    # Rule 3: Assistant Manager - 30 days since entry
+    Rule('assistant_manager', lambda f: f['title'].isin(ASSISTANT_MANAGER_TITLES), [
+        Outcome('AM_NO_ENTRY_DATE', False, lambda f: f['entry_date'].isna()),
+        Outcome('AM_OK', True, lambda f: _entry_cutoff(f) < f['month_start']),
+        Outcome('AM_TOO_RECENT', False, _always),
+    ]),
+    # Rule 4: Store Manager - always eligible (regardless of the 门店负责人 sheet)
+    Rule('store_manager', lambda f: f['title'].isin(STORE_MANAGER_TITLES), [
+        Outcome('SM_OK', True, _always),
+    ]),
+]
+
+OUT_OF_SCOPE = 'OUT_OF_SCOPE'
+
+REASON_CODES = [o.code for rule in RULES for o in rule.outcomes] + [OUT_OF_SCOPE]
+ELIGIBLE_CODES = [o.code for rule in RULES for o in rule.outcomes if o.eligible]
+
+def _fmt_date(s):
+    return s.dt.strftime('%Y-%m-%d')
+
+def _fmt_number(s):
+    # Same text as f"{value}" on the aggregated hours (e.g. 30.0 for float sums, 0 for ints)
+    return s.astype(str)
+
+def _render_part_time_fail(f):
+    parts = pd.DataFrame(index=f.index)
+    parts['total'] = np.where(f['total_hours'] >= MIN_TOTAL_HOURS, '',
+                              '累计工时(' + _fmt_number(f['total_hours']) + f')<{MIN_TOTAL_HOURS}')
+    parts['monthly'] = np.where(f['monthly_hours'] >= MIN_MONTHLY_HOURS, '',
+                                '当月工时(' + _fmt_number(f['monthly_hours']) + f')<{MIN_MONTHLY_HOURS}')
+    parts['cert'] = np.where(~f['has_any_required'], '无任何有效证书',
+                             np.where(_part_time_cert_ok(f), '',
+                                      '证书日期太新 (' + _fmt_date(f['earliest_required']).fillna('') + ')'))
+    # Join the failed conditions with ', ' (skipping the ones that passed)
+    joined = pd.Series(parts['total'], index=f.index)
+    for col in ['monthly', 'cert']:
+        sep = np.where((joined != '') & (parts[col] != ''), ', ', '')
+        joined = joined + sep + parts[col]
+    return '兼职/实习生：不符合条件 - ' + joined
+
+# Reason text per code, built column-wise from the feature frame
+REASON_TEMPLATES = {
+    'TEA_NO_CERT': lambda f: '茶饮师：无任何有效证书',
+    'TEA_MISSING_CERT': lambda f: '茶饮师：缺少必要的证书（需凑齐大堂、后厨、水吧）',
+    'TEA_OK': lambda f: '茶饮师：3证齐全且符合时间要求 (' + _fmt_date(f['latest_required']) + ')',
+    'TEA_CERT_TOO_NEW': lambda f: ('茶饮师：证书日期太新 (' + _fmt_date(f['latest_required'])
+                                   + ' >= ' + _fmt_date(f['month_start']) + ')'),
+    'PART_TIME_OK': lambda f: '兼职/实习生：符合资格',
+    'PART_TIME_FAIL': _render_part_time_fail,
+    'AM_NO_ENTRY_DATE': lambda f: '副经理/副店长：缺少入职日期',
+    'AM_OK': lambda f: '副经理/副店长：符合入职时间要求',
+    'AM_TOO_RECENT': lambda f: ('副经理/副店长：入职未满要求天数 (' + _fmt_date(_entry_cutoff(f))
+                                + ' >= ' + _fmt_date(f['month_start']) + ')'),
+    'SM_OK': lambda f: '店长类职位：自动符合资格',
+    OUT_OF_SCOPE: lambda f: "职位 '" + f['title'].astype(str) + "' 不在筛选规则范围内",
+}
+
+def evaluate_rules(features):
+    """
+    Evaluate all rules over a feature frame with columns:
+      title, total_hours, monthly_hours, has_any_cert, has_all_required, latest_required,
+      has_any_required, earliest_required, entry_date, month_start
+    Returns a frame with 'eligible' (bool) and 'reason_code' (categorical), aligned to features.
+    """
+    n = len(features)
+    rule_masks = []
+    rule_codes = []
+    for rule in RULES:
+        rule_masks.append(np.asarray(rule.applies(features), dtype=bool))
+        conditions = [np.asarray(o.when(features), dtype=bool) for o in rule.outcomes]
+        codes = [REASON_CODES.index(o.code) for o in rule.outcomes]
+        rule_codes.append(np.select(conditions, codes, default=REASON_CODES.index(OUT_OF_SCOPE)))
+
+    # First matching rule wins, like the original if/elif chain
+    code_idx = np.select(rule_masks, rule_codes, default=REASON_CODES.index(OUT_OF_SCOPE)) if n else np.array([], dtype=int)
+    reason_code = pd.Categorical.from_codes(code_idx, categories=REASON_CODES)
+    eligible = np.isin(code_idx, [REASON_CODES.index(c) for c in ELIGIBLE_CODES])
+    return pd.DataFrame({'eligible': eligible, 'reason_code': reason_code}, index=features.index)
+
+def render_reasons(decisions, features):
+    """Chinese reason text ('排除原因') for each decision row, rendered one reason code at a time."""
+    reasons = pd.Series('', index=decisions.index, dtype=object)
+    for code in decisions['reason_code'].unique():
+        mask = (decisions['reason_code'] == code).to_numpy()
+        text = REASON_TEMPLATES[code](features[mask])
+        reasons[mask] = text if isinstance(text, str) else text.to_numpy()
+    return reasons
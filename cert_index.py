@@ -0,0 +1,63 @@
+import pandas as pd
+
+# Date used for every certificate when '过岗数据' has no '生效日期' column,
+# so date checks always pass and only certificate existence matters.
+FALLBACK_CERT_DATE = pd.Timestamp(2000, 1, 1)
+
+SUMMARY_COLUMNS = ['has_any_cert', 'has_all_required', 'latest_required', 'has_any_required', 'earliest_required']
+
+class CertificateIndex:
+    """
+    Valid certificates ('状态' == '有效') per employee, as an employee x certificate matrix.
+
+    dates: DataFrame indexed by '工号' with one column per required certificate, holding the
+        EARLIEST '生效日期' of that certificate (NaT if the employee does not have it).
+    holders: '工号' of everyone with at least one valid certificate of any kind.
+    summary: per-employee columns used by the rules:
+        has_any_cert, has_all_required, latest_required (latest of the required dates, if all present),
+        has_any_required, earliest_required (earliest of the required dates present).
+
+    Records with a missing '生效日期' are ignored, like an unparseable date.
+    """
+
+    def __init__(self, df_certs, required):
+        self.required = list(required)
+        valid = df_certs[df_certs['状态'] == '有效']
+        if '生效日期' in valid.columns:
+            valid = valid[valid['生效日期'].notna()]
+            dates = pd.to_datetime(valid['生效日期'])
+        else:
+            dates = pd.Series(FALLBACK_CERT_DATE, index=valid.index)
+
+        self.holders = pd.Index(valid['工号'].unique())
+
+        # Single groupby-min pivot over the required certificates
+        is_required = valid['证书名称'].isin(self.required)
+        pivot = (dates[is_required]
+                 .groupby([valid['工号'][is_required], valid['证书名称'][is_required]]).min()
+                 .unstack())
+        self.dates = pivot.reindex(columns=self.required).astype('datetime64[ns]')
+
+        summary = pd.DataFrame(index=self.holders)
+        summary['has_any_cert'] = True
+        present = self.dates.notna()
+        summary['has_all_required'] = present.all(axis=1).reindex(self.holders, fill_value=False)
+        summary['latest_required'] = self.dates.max(axis=1).where(present.all(axis=1)).reindex(self.holders)
+        summary['has_any_required'] = present.any(axis=1).reindex(self.holders, fill_value=False)
+        summary['earliest_required'] = self.dates.min(axis=1).reindex(self.holders)
+        self.summary = summary
+
+    def features(self, emp_ids):
+        """Summary columns for each ID in emp_ids (False/NaT for employees without valid certificates)."""
+        pos = self.summary.index.get_indexer(emp_ids)
+        found = pos >= 0
+        rows = self.summary.iloc[pos[found]]
+        result = pd.DataFrame(index=range(len(pos)))
+        for col in SUMMARY_COLUMNS:
+            if col.startswith('has_'):
+                values = pd.Series(False, index=result.index)
+            else:
+                values = pd.Series(pd.NaT, index=result.index, dtype='datetime64[ns]')
+            values[found] = rows[col].to_numpy()
+            result[col] = values
+        return result
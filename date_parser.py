@@ -0,0 +1,105 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Text date formats, detected per distinct value: (full-match pattern, explicit format for pd.to_datetime)
+TEXT_DATE_FORMATS = [
+    (r'\d{4}年\d{1,2}月\d{1,2}日', '%Y年%m月%d日'),
+    (r'\d{4}年\d{1,2}月', '%Y年%m月'),
+    (r'\d{4}-\d{1,2}-\d{1,2}', '%Y-%m-%d'),
+    (r'\d{4}/\d{1,2}/\d{1,2}', '%Y/%m/%d'),
+    (r'\d{4}\.\d{1,2}\.\d{1,2}', '%Y.%m.%d'),
+    (r'\d{4}-\d{1,2}', '%Y-%m'),
+    (r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?', 'ISO8601'),
+]
+
+# Excel serial numbers (days since 1899-12-30) accepted for numeric cells, up to the last day
+# a pandas Timestamp can hold (2262-04-11)
+EXCEL_EPOCH = np.datetime64('1899-12-30', 'us')
+EXCEL_MAX_SERIAL = (datetime(2262, 4, 11) - datetime(1899, 12, 30)).days
+
+# Whole numbers above the serial range are read as their digits: 20251130 or 202511 (by digit count)
+NUMERIC_DATE_FORMATS = {8: '%Y%m%d', 6: '%Y%m'}
+
+# Parsed value of every distinct raw value seen in this run, shared by all date columns and
+# sheets parsed in this process (dates repeat a lot across 入职日期, 转正日期, 生效日期, ...).
+# Keyed by (type, value): True, 1 and 1.0 are equal but do not parse alike.
+_memo = {}
+
+def reset_date_memo():
+    """Forget the values parsed so far (called at the start of each run)."""
+    _memo.clear()
+
+def _memo_key(value):
+    return type(value), value
+
+def _parse_values(values):
+    """
+    Parse a list of distinct non-missing raw values. Numbers are Excel serials, or yyyymmdd /
+    yyyymm digits above the serial range (see NUMERIC_DATE_FORMATS). Text in none of TEXT_DATE_FORMATS gets one
+    inferring pd.to_datetime pass (each value on its own, like the scalar parse used to), so e.g.
+    '20251130' or '2025/11/30 10:00' still parse; whatever is left becomes NaT.
+    """
+    result = [pd.NaT] * len(values)
+    texts = {}
+    for i, v in enumerate(values):
+        if isinstance(v, (datetime, np.datetime64)):
+            result[i] = pd.Timestamp(v)
+        elif isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, (bool, np.bool_)):
+            if 1 <= v <= EXCEL_MAX_SERIAL:
+                # Microsecond arithmetic: a nanosecond Timedelta overflows beyond ~106751 days
+                result[i] = pd.Timestamp(EXCEL_EPOCH + np.timedelta64(round(float(v) * 86400000000), 'us'))
+            elif v > EXCEL_MAX_SERIAL and float(v).is_integer():
+                digits = str(int(v))
+                if len(digits) in NUMERIC_DATE_FORMATS:
+                    result[i] = pd.to_datetime(digits, format=NUMERIC_DATE_FORMATS[len(digits)], errors='coerce')
+        else:
+            texts[i] = str(v).strip()
+
+    # Text values: one explicit-format pass per detected format
+    if texts:
+        pending = pd.Series(texts, dtype=object)
+        for pattern, fmt in TEXT_DATE_FORMATS:
+            matched = pending[pending.str.fullmatch(pattern)]
+            if matched.empty:
+                continue
+            parsed = pd.to_datetime(matched, format=fmt, errors='coerce')
+            for i, ts in parsed.items():
+                result[i] = ts
+            pending = pending.drop(matched.index)
+            if pending.empty:
+                break
+        if not pending.empty:
+            parsed = pd.to_datetime(pending, errors='coerce', format='mixed')
+            for i, ts in parsed.items():
+                result[i] = ts
+    return result
+
+def parse_date_column(series):
+    """
+    Parse a date column (datetime cells, 'YYYY年MM月DD日', ISO, 'YYYY年MM月', Excel serial numbers, 20251130)
+    to datetime64. Only the distinct values are parsed, with an explicit format where one matches
+    (see _parse_values), and the results are broadcast back to the rows. Unparseable and missing
+    values become NaT.
+    """
+    if series.empty or pd.api.types.is_datetime64_any_dtype(series):
+        return series
+
+    codes, uniques = pd.factorize(series)
+    uniques = list(uniques)
+    todo = [v for v in uniques if _memo_key(v) not in _memo]
+    if todo:
+        _memo.update(zip(map(_memo_key, todo), _parse_values(todo)))
+    parsed = pd.DatetimeIndex([_memo[_memo_key(v)] for v in uniques], dtype='datetime64[us]')
+    values = parsed.take(codes, allow_fill=True, fill_value=pd.NaT)
+    return pd.Series(values, index=series.index, name=series.name)
+
+def parse_date(value):
+    """Scalar version of parse_date_column: Timestamp or NaT."""
+    if pd.isna(value):
+        return pd.NaT
+    key = _memo_key(value)
+    if key not in _memo:
+        _memo[key] = _parse_values([value])[0]
+    return _memo[key]
@@ -0,0 +1,409 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+import bonus_rules
+from bonus_rules import render_reasons
+from entity_index import text_values
+
+# Bump this when the layout or meaning of the stored frames changes; decisions stored by
+# another version are not reused (the next run recomputes every employee).
+DECISION_CACHE_VERSION = 2
+
+DECISION_DIR_NAME = '.bonus_decisions'
+MANIFEST_NAME = 'manifest.json'
+# Each run's state goes to a new sub-directory named by the manifest; it holds these files
+FINGERPRINTS_FILE = 'fingerprints.pkl'
+DECISIONS_FILE = 'decisions.pkl'
+REPORTS_FILE = 'reports.pkl'
+# Sub-directories and files no manifest names are removed once this old (another run may still be writing them)
+STALE_SECONDS = 3600
+
+# Sheet each fingerprint is built from; 'rows' is the identity of the hour rows themselves
+EMPLOYEE_SOURCES = ['hours', 'monthly', 'certs', 'basic', 'roster']
+STORE_SOURCES = ['status', 'managers']
+SOURCE_SHEETS = {'certs': '过岗数据', 'basic': '基本数据', 'roster': '花名册', 'status': '门店状态表',
+                 'managers': '门店负责人'}
+
+# Employees whose result flipped since the previous run of the same bonus month
+DIFF_FILE = '筛选变化.xlsx'
+DIFF_COLUMNS = ['工号', '姓名', '原结果', '新结果', '原职位', '新职位', '原排除原因', '新排除原因']
+ELIGIBLE_TEXT = '符合'
+EXCLUDED_TEXT = '排除'
+
+def rules_fingerprint():
+    """Hash of the rule definitions: decisions made under other rules or thresholds are never reused."""
+    try:
+        source = inspect.getsource(bonus_rules)
+    except (OSError, TypeError):
+        # Packaged exe without sources: fall back to the rule constants
+        source = repr(sorted((name, repr(value)) for name, value in vars(bonus_rules).items() if name.isupper()))
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+def source_versions(sheet_versions, main_sheet_name, state=False):
+    """
+    Content version of the sheet behind every fingerprint source, from load_inputs' 'sheet_versions'.
+    state: hours and certificates come from a month-over-month state rather than the sheets, so
+    they get no version (and are always fingerprinted).
+    """
+    main = sheet_versions.get(main_sheet_name)
+    versions = {'rows': main, 'hours': main, 'monthly': main}
+    versions.update({source: sheet_versions.get(sheet) for source, sheet in SOURCE_SHEETS.items()})
+    if state:
+        versions.update(hours=None, certs=None)
+    return versions
+
+def key_hashes(df, key, cols=None):
+    """
+    Fingerprint of every key of a sheet: the rows holding that key, hashed by value and combined
+    regardless of their order. Returns a uint64 Series indexed by the key as stripped text.
+    """
+    if df is None or key not in df.columns or df.empty:
+        return pd.Series(dtype=np.uint64)
+    rows = pd.util.hash_pandas_object(df[cols] if cols is not None else df, index=False).to_numpy()
+    keys = df[key].astype(str).str.strip().to_numpy()
+    # Row order within a key does not matter: sum the row hashes (wrapping)
+    return pd.Series(rows, dtype=np.uint64).groupby(keys, sort=False).sum()
+
+def changed_keys(current, previous):
+    """Keys whose fingerprint differs between two runs (including keys present in only one)."""
+    both = current.index.intersection(previous.index)
+    changed = both[current[both].to_numpy() != previous[both].to_numpy()]
+    return changed.union(current.index.difference(previous.index)).union(previous.index.difference(current.index))
+
+class DecisionCache:
+    """
+    Rule decisions and report rows of the previous run into an output directory, reused for
+    employees whose inputs did not change (see filter_bonus_data's incremental option).
+
+    Every employee's decision depends on their '工号' rows of the aggregated hours, '过岗数据',
+    '基本数据' and '花名册', and the output columns of an hour row on its employee and on the
+    '门店状态表' / '门店负责人' rows of its store. Each run fingerprints those rows per '工号' and per
+    store code, except for sheets whose content version (see sheet_cache.read_sheets_cached) is
+    the one fingerprinted last time: their fingerprints are carried over unhashed. The next run of
+    the same bonus month under the same rules recomputes only the (工号, title) keys of changed or
+    new employees, rebuilds only the report rows of changed employees and stores (every row when
+    the hours sheet or the template changed), and lists the employees whose result flipped.
+
+    Each save writes a new sub-directory and then switches the manifest to it, so a crashed or
+    concurrent run never leaves a mix of two runs' files.
+    """
+
+    def __init__(self, cache_dir, month_start, versions=None):
+        self.cache_dir = cache_dir
+        self.month = pd.Timestamp(month_start).strftime('%Y-%m')
+        self.rules = rules_fingerprint()
+        self.versions = dict(versions or {})
+        self.previous = self._load()
+        self.fingerprints = None
+        self.changed_employees = None
+        self.changed_stores = None
+        self.hashed = []
+        self.keys = None
+        self.matched = None
+        self.current = None
+        self.reused = 0
+        self.report_state = None
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.cache_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != DECISION_CACHE_VERSION:
+                return None
+            state_dir = os.path.join(self.cache_dir, manifest['dir'])
+            previous = {'manifest': manifest}
+            for name, file_name in (('fingerprints', FINGERPRINTS_FILE), ('decisions', DECISIONS_FILE),
+                                    ('reports', REPORTS_FILE)):
+                with open(os.path.join(state_dir, file_name), 'rb') as f:
+                    previous[name] = pickle.load(f)
+            return previous
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Warning: Could not read previous decisions ({e}). Recomputing every employee.")
+            return None
+
+    @property
+    def comparable(self):
+        """Whether the previous run was for the same bonus month (its results can be diffed)."""
+        return self.previous is not None and self.previous['manifest'].get('month') == self.month
+
+    @property
+    def reusable(self):
+        """Whether the previous run's decisions can be reused (same bonus month, same rules)."""
+        return self.comparable and self.previous['manifest'].get('rules') == self.rules
+
+    def _unchanged(self, source):
+        """Whether the sheet behind a source has the content version it had in the previous run."""
+        version = self.versions.get(source)
+        return version is not None and version == self.previous['manifest'].get('versions', {}).get(source)
+
+    def fingerprint(self, emp_agg_total, emp_agg_monthly, df_certs, prepared):
+        """Fingerprint the inputs of this run, per '工号' for the decisions and per store code for the output lookups."""
+        builders = {
+            'hours': lambda: key_hashes(pd.DataFrame({'工号': emp_agg_total.index.astype(str),
+                                                      '总工时': emp_agg_total.to_numpy(dtype=object).astype(str)}), '工号'),
+            'monthly': lambda: key_hashes(pd.DataFrame({'工号': emp_agg_monthly.index.astype(str),
+                                                        '考勤工时': emp_agg_monthly.to_numpy(dtype=object).astype(str)}), '工号'),
+            'certs': lambda: key_hashes(df_certs, '工号'),
+            'basic': lambda: key_hashes(prepared['basic'].frame, '工号'),
+            'roster': lambda: key_hashes(prepared['roster'].frame, '工号'),
+            'status': lambda: key_hashes(prepared['status'].frame, prepared['status'].key),
+            'managers': lambda: key_hashes(prepared['managers'].frame, prepared['managers'].key),
+        }
+        previous = self.previous['fingerprints'] if self.previous is not None else {}
+        self.fingerprints = {}
+        changed = {}
+        for source, build in builders.items():
+            old = previous.get(source)
+            if old is not None and self._unchanged(source):
+                self.fingerprints[source] = old
+                continue
+            self.hashed.append(source)
+            self.fingerprints[source] = build()
+            if old is not None:
+                changed[source] = changed_keys(self.fingerprints[source], old)
+        if self.previous is not None:
+            self.changed_employees = _union(changed.get(source) for source in EMPLOYEE_SOURCES)
+            self.changed_stores = _union(changed.get(source) for source in STORE_SOURCES)
+
+    def evaluate(self, emp_ids, titles, names, evaluate):
+        """
+        Features and decisions for the (emp_ids[i], titles[i]) keys, in that order.
+        evaluate(rows) computes them for the given key positions (a numpy array); the other keys
+        take the previous run's features and decisions.
+        """
+        self.keys = pd.DataFrame({'工号': emp_ids.to_numpy(dtype=object),
+                                  'title': titles.astype(str).to_numpy(),
+                                  '姓名': names.to_numpy(dtype=object) if names is not None else None})
+        n = len(self.keys)
+        stored_pos = np.full(n, -1)
+        if self.reusable and self.changed_employees is not None:
+            stored = self.previous['decisions']
+            stored_keys = pd.MultiIndex.from_frame(stored[['工号', 'title']])
+            self.matched = stored_keys.get_indexer(pd.MultiIndex.from_frame(self.keys[['工号', 'title']]))
+            stored_pos = self.matched.copy()
+            if len(self.changed_employees):
+                stored_pos[self.keys['工号'].isin(self.changed_employees).to_numpy()] = -1
+        reuse = stored_pos >= 0
+        self.reused = int(reuse.sum())
+
+        rows = np.flatnonzero(~reuse)
+        print(f"Incremental: reusing {self.reused} of {n} decisions, recomputing {len(rows)}.")
+        if not reuse.any():
+            return evaluate(rows)
+        stored = self.previous['decisions'].iloc[stored_pos[reuse]]
+        old_features = stored[[col for col in stored.columns if col not in ('工号', '姓名', 'eligible', 'reason_code')]]
+        old_decisions = stored[['eligible', 'reason_code']]
+        if len(rows):
+            new_features, new_decisions = evaluate(rows)
+            order = np.argsort(np.concatenate([rows, np.flatnonzero(reuse)]), kind='stable')
+            features = pd.concat([new_features, old_features], ignore_index=True).iloc[order]
+            decisions = pd.concat([new_decisions, old_decisions], ignore_index=True).iloc[order]
+        else:
+            features, decisions = old_features, old_decisions
+        return features.reset_index(drop=True), decisions.reset_index(drop=True)
+
+    def affected_report(self, store_codes):
+        """Print how many employees and stores changed since the previous run (store_codes: the hour rows' store codes)."""
+        if self.previous is None or self.changed_employees is None:
+            print("Incremental: no previous run in this output directory, every employee is computed.")
+            return
+        in_stores = 0
+        if len(self.changed_stores):
+            in_stores = int(pd.Series(store_codes).astype(str).str.strip().isin(self.changed_stores).sum())
+        unchanged = [source for source in self.fingerprints if source not in self.hashed]
+        print(f"Incremental: {len(self.changed_employees)} employees with changed inputs since the previous run; "
+              f"{len(self.changed_stores)} changed stores ({in_stores} hour rows get new store columns)"
+              + (f"; unchanged sheets not fingerprinted: {unchanged}." if unchanged else "."))
+
+    def reports(self, df_hours, emp_ids, key_codes, decisions, output_cols, result_file, exclusion_file, build):
+        """
+        The reports of month_reports for all hour rows, with the rows of unchanged employees and
+        stores taken from the previous run's reports. build(rows) returns month_reports' frames
+        for the hour rows at the given positions (ascending); only the other rows are built.
+        """
+        eligible = decisions['eligible'].to_numpy()[key_codes]
+        labels = df_hours.index.to_numpy()
+        store_code = _last_text(df_hours, '门店编码')
+        state = self.previous.get('reports') if self.previous is not None else None
+        if not (self.reusable and state is not None and self.changed_employees is not None
+                and state['output_cols'] == list(output_cols) and self._unchanged('rows')
+                # '是否门店负责人' compares every row against the last row's store code (see month_reports)
+                and state['store_code'] == store_code and store_code not in self.changed_stores):
+            state = None
+
+        if state is None:
+            frames = _report_frames(build(np.arange(len(df_hours))))
+            print("Incremental: every report row built.")
+        else:
+            # Position of each row in the previous report of the same kind (-1: not there, or stale)
+            prev_pos = np.empty(len(df_hours), dtype=np.int64)
+            prev_pos[eligible] = pd.Index(state['labels'][0]).get_indexer(labels[eligible])
+            prev_pos[~eligible] = pd.Index(state['labels'][1]).get_indexer(labels[~eligible])
+            if len(self.changed_employees):
+                prev_pos[emp_ids.isin(self.changed_employees).to_numpy()] = -1
+            if len(self.changed_stores) and '门店编码' in df_hours.columns:
+                prev_pos[np.isin(text_values(df_hours['门店编码']), self.changed_stores)] = -1
+            stale = np.flatnonzero(prev_pos < 0)
+            built = _report_frames(build(stale)) if len(stale) else [None, None]
+            frames = [_merged(state['frames'][i], prev_pos[mask], built[i])
+                      for i, mask in enumerate((eligible, ~eligible))]
+            print(f"Incremental: reusing {len(df_hours) - len(stale)} of {len(df_hours)} report rows, building {len(stale)}.")
+
+        self.report_state = {'output_cols': list(output_cols), 'store_code': store_code,
+                             'labels': [labels[eligible], labels[~eligible]], 'frames': frames}
+        print(f"Eligible employees found: {len(frames[0])}")
+        reports = [(result_file, frames[0])]
+        if frames[1] is not None and len(frames[1]):
+            reports.append((exclusion_file, frames[1]))
+        return reports
+
+    def diff(self, features, decisions):
+        """Employees whose result flipped between eligible and excluded since the previous (comparable) run, as DIFF_COLUMNS."""
+        new = self._decision_frame(features, decisions)
+        old = self.previous['decisions']
+        if self.matched is not None:
+            # Only employees with recomputed decisions, or whose keys appeared or disappeared, can flip
+            hit = np.zeros(len(old), dtype=bool)
+            hit[self.matched[self.matched >= 0]] = True
+            candidates = _union([self.changed_employees, pd.Index(new['工号'].to_numpy()[self.matched < 0]),
+                                 pd.Index(old['工号'].to_numpy()[~hit])])
+            new = new[new['工号'].isin(candidates).to_numpy()]
+            old = old[old['工号'].isin(candidates).to_numpy()]
+        # An employee is eligible if any of their titles is; only flipped employees get their texts joined
+        new_ok = new.groupby('工号', sort=False)['eligible'].any()
+        old_ok = old.groupby('工号', sort=False)['eligible'].any()
+        both = new_ok.index.intersection(old_ok.index)
+        flipped = both[new_ok[both].to_numpy() != old_ok[both].to_numpy()]
+        if not len(flipped):
+            return pd.DataFrame(columns=DIFF_COLUMNS)
+        new = _per_employee(_with_reasons(new[new['工号'].isin(flipped)]))
+        old = _per_employee(_with_reasons(old[old['工号'].isin(flipped)])).reindex(new.index)
+        return pd.DataFrame({
+            '工号': new.index,
+            '姓名': new['姓名'].to_numpy(),
+            '原结果': np.where(old['eligible'].to_numpy(dtype=bool), ELIGIBLE_TEXT, EXCLUDED_TEXT),
+            '新结果': np.where(new['eligible'].to_numpy(dtype=bool), ELIGIBLE_TEXT, EXCLUDED_TEXT),
+            '原职位': old['title'].to_numpy(),
+            '新职位': new['title'].to_numpy(),
+            '原排除原因': old['reason'].to_numpy(),
+            '新排除原因': new['reason'].to_numpy(),
+        }, columns=DIFF_COLUMNS)
+
+    def _decision_frame(self, features, decisions):
+        """Stored form of this run's decisions: key, name, features and decision per (工号, title)."""
+        if self.current is None:
+            frame = pd.concat([self.keys[['工号', '姓名']], features.reset_index(drop=True),
+                               decisions.reset_index(drop=True)], axis=1)
+            frame['title'] = self.keys['title'].to_numpy()
+            self.current = frame
+        return self.current
+
+    def save(self, features, decisions):
+        """
+        Store this run's fingerprints, decisions and reports for the next run: written to a new
+        sub-directory, then the manifest is switched to it and the previous one removed.
+        """
+        serial = self.previous['manifest'].get('serial', 0) + 1 if self.previous is not None else 1
+        name = f'{serial:06d}-{os.getpid()}'
+        state_dir = os.path.join(self.cache_dir, name)
+        try:
+            os.makedirs(state_dir, exist_ok=True)
+            for file_name, value in ((FINGERPRINTS_FILE, self.fingerprints),
+                                     (DECISIONS_FILE, self._decision_frame(features, decisions)),
+                                     (REPORTS_FILE, self.report_state)):
+                with open(os.path.join(state_dir, file_name), 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            manifest = {'version': DECISION_CACHE_VERSION, 'month': self.month, 'rules': self.rules,
+                        'versions': self.versions, 'dir': name, 'serial': serial, 'saved': time.time(),
+                        'decisions': len(self.keys)}
+            path = os.path.join(self.cache_dir, MANIFEST_NAME)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not store decisions for the next run ({e}).")
+            shutil.rmtree(state_dir, ignore_errors=True)
+            return
+        superseded = self.previous['manifest']['dir'] if self.previous is not None else None
+        self._sweep(keep=name, superseded=superseded)
+
+    def _sweep(self, keep, superseded):
+        """Remove the superseded state directory and anything else the manifest does not name once it is stale."""
+        now = time.time()
+        for entry in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, entry)
+            if entry in (MANIFEST_NAME, keep):
+                continue
+            try:
+                if entry != superseded and now - os.path.getmtime(path) <= STALE_SECONDS:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+            except OSError:
+                pass
+
+def _union(indexes):
+    """Union of the given key indexes (None entries are skipped)."""
+    result = pd.Index([])
+    for index in indexes:
+        if index is not None:
+            result = result.union(index)
+    return result
+
+def _last_text(df, col):
+    """Stripped text of the last row's value of col ('' if missing)."""
+    if col not in df.columns or df.empty:
+        return ''
+    value = df[col].iloc[-1]
+    return str(value).strip() if pd.notna(value) else ''
+
+def _report_frames(reports):
+    """[eligible frame, excluded frame or None] of month_reports' reports."""
+    return [reports[0][1].reset_index(drop=True), reports[1][1].reset_index(drop=True) if len(reports) > 1 else None]
+
+def _merged(previous, prev_pos, built):
+    """
+    One report's rows in hour row order: previous.iloc[prev_pos[i]] where prev_pos[i] >= 0, the
+    next row of built (the rebuilt rows, in the same order) elsewhere.
+    """
+    reused = prev_pos >= 0
+    if reused.all():
+        if previous is not None and len(prev_pos) == len(previous) and (prev_pos == np.arange(len(prev_pos))).all():
+            return previous
+        return previous.iloc[prev_pos].reset_index(drop=True) if previous is not None else built
+    if not reused.any():
+        return built
+    parts = pd.concat([previous.iloc[prev_pos[reused]], built], ignore_index=True)
+    order = np.empty(len(prev_pos), dtype=np.int64)
+    order[reused] = np.arange(reused.sum())
+    order[~reused] = reused.sum() + np.arange((~reused).sum())
+    return parts.iloc[order].reset_index(drop=True)
+
+def _with_reasons(frame):
+    """Stored decision rows with the reason text of the excluded ones ('' for eligible rows)."""
+    reasons = np.full(len(frame), '', dtype=object)
+    excluded = ~frame['eligible'].to_numpy(dtype=bool)
+    if excluded.any():
+        reasons[excluded] = render_reasons(frame[excluded], frame[excluded]).to_numpy()
+    return frame.assign(reason=reasons)
+
+def _per_employee(frame):
+    """Decision rows grouped per '工号': eligible if any title is, with the titles and reasons joined."""
+    return frame.groupby('工号', sort=False).agg(姓名=('姓名', 'first'), eligible=('eligible', 'any'),
+                                               title=('title', _joined), reason=('reason', _joined))
+
+def _joined(values):
+    """Distinct non-empty texts joined with '；' (one employee can hold several titles)."""
+    return '；'.join(dict.fromkeys(v for v in values if isinstance(v, str) and v))
@@ -0,0 +1,231 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from bonus_rules import render_reasons
+from entity_index import blank_values, text_values
+from filter_compiler import available_filter_columns, build_filter_frame, compile_filter, match_filter
+
+# One markdown file per traced employee, in this folder of the output directory
+TRACE_DIR_NAME = '筛选追踪'
+
+# Hour row columns shown in the trace, when present
+TRACE_HOUR_COLUMNS = ['门店编码', '区域', '区经理', '职位名称', '总工时', '考勤工时']
+TRACE_CERT_COLUMNS = ['证书名称', '状态', '生效日期']
+
+class EmployeeTrace:
+    """
+    Employees followed through one run of filter_bonus_data, selected by '工号' and/or by the
+    '门店编码' of their hour rows (an employee found through a store is traced with all of their rows).
+
+    Nothing is recorded while the pipeline runs: write() is called with the frames the stages
+    produced and selects the traced employees' rows from them afterwards (one isin over the hour
+    rows, lookups on the traced keys only), so untraced rows cost nothing. Each employee gets one
+    markdown file with their hour rows and the filter rows they matched, the title standardization,
+    the aggregated hours, the certificate records and dates, and the rule verdict per title.
+    """
+
+    enabled = True
+
+    def __init__(self, emp_ids=(), store_codes=()):
+        self.emp_ids = list(dict.fromkeys(str(v).strip() for v in emp_ids if str(v).strip()))
+        self.store_codes = list(dict.fromkeys(str(v).strip() for v in store_codes if str(v).strip()))
+
+    def employees(self, hours):
+        """Traced '工号' (the given ones first, then the ones found through store codes) and the hour row mask."""
+        emp_text = text_values(hours['工号']) if '工号' in hours.columns else np.full(len(hours), '', dtype=object)
+        emps = list(self.emp_ids)
+        if self.store_codes and '门店编码' in hours.columns:
+            in_stores = pd.Series(text_values(hours['门店编码'])).isin(self.store_codes).to_numpy()
+            emps += [emp for emp in pd.unique(emp_text[in_stores]) if emp not in set(emps) and emp not in ('', 'nan')]
+        return emps, pd.Series(emp_text).isin(emps).to_numpy(), emp_text
+
+    def write(self, out_dir, hours, kept=None, df_filter=None, main_sheet_name=None, ref_frames=None, joins=(),
+              emp_agg_total=None, emp_agg_monthly=None, df_certs=None, cert_index=None, prepared=None,
+              key_codes=None, features=None, decisions=None):
+        """
+        Write the trace files of one run to out_dir/TRACE_DIR_NAME. Returns their paths.
+        hours: the hour rows as loaded; kept: the rows the filter kept, after title standardization
+        (None if the run stopped before). df_filter, main_sheet_name, ref_frames and joins are what
+        the filter was applied with (see filter_compiler.match_hour_rows). The other arguments are
+        the stage outputs of filter_bonus_data; key_codes maps the kept rows to the rows of features/decisions.
+        Arguments left as None (a run that stopped early) leave their section out.
+        """
+        emps, traced, emp_text = self.employees(hours)
+        rows = hours[traced]
+        row_emps = emp_text[traced]
+        # Position of every traced row among the kept rows (-1: filtered out)
+        kept_pos = kept.index.get_indexer(rows.index) if kept is not None else np.full(len(rows), -1)
+
+        # Every section is selected once for all traced employees, then split per employee
+        matches = _filter_matches(rows, df_filter, main_sheet_name, ref_frames, joins)
+        sections = [('Hour rows', _hour_rows(rows, row_emps, kept_pos, matches), "No hour rows with this '工号'.")]
+        if emp_agg_total is not None:
+            sections.append(('Aggregated hours', _aggregated(emps, emp_agg_total, emp_agg_monthly), None))
+        if kept is not None and prepared is not None:
+            sections.append(('Title', _titles(rows, kept, kept_pos, row_emps, prepared),
+                             "No hour row passed the filter; titles were not standardized."))
+        if df_certs is not None:
+            sections.append(('Certificates', _cert_records(df_certs, emps), "No records in '过岗数据'."))
+        if cert_index is not None:
+            sections.append(('Required certificates (earliest valid date)', _cert_dates(cert_index, emps), None))
+        if features is not None:
+            sections.append(('Rule verdict', _verdicts(kept_pos, row_emps, key_codes, features, decisions),
+                             "Not evaluated: no hour row passed the filter."))
+        # Rendered to markdown rows once; each file then only picks its employee's rows
+        split = [(title, _table_header(frame.columns.drop('工号')), _table_rows(frame.drop(columns='工号')),
+                  frame.groupby('工号', sort=False).indices, empty) for title, frame, empty in sections]
+
+        trace_dir = os.path.join(out_dir, TRACE_DIR_NAME)
+        os.makedirs(trace_dir, exist_ok=True)
+        paths = []
+        for emp in emps:
+            own = rows[row_emps == emp]
+            lines = _employee_header(emp, own, self)
+            for title, header, table_rows, groups, empty in split:
+                lines += [f"## {title}", '']
+                if emp in groups:
+                    lines += header + [table_rows[i] for i in groups[emp]] + ['']
+                else:
+                    lines += [empty, '']
+            path = os.path.join(trace_dir, re.sub(r'[\\/:*?"<>|]', '_', emp) + '.md')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+            paths.append(path)
+        print(f"Trace files of {len(paths)} employees written to {trace_dir}")
+        return paths
+
+class NullTrace:
+    """Stand-in when nothing is traced."""
+
+    enabled = False
+
+    def write(self, out_dir, hours, **stages):
+        return []
+
+def _filter_matches(rows, df_filter, main_sheet_name, ref_frames, joins):
+    """
+    '筛选条件' rows (as Excel row numbers) matched by each of the given hour rows, or None when no
+    filter applies. Matched one filter row at a time, on the given rows only.
+    """
+    if df_filter is None or df_filter.dropna(how='all').empty:
+        return None
+    available = set(available_filter_columns(rows, main_sheet_name, ref_frames, joins))
+    cols = [col for col in df_filter.columns if col in available]
+    if not cols:
+        return None
+    matches = [[] for _ in range(len(rows))]
+    if rows.empty:
+        return matches
+    frame = build_filter_frame(rows, main_sheet_name, ref_frames, joins, cols)
+    filter_rows = df_filter.dropna(how='all')
+    for label in filter_rows.index:
+        matched = match_filter(frame, compile_filter(filter_rows.loc[[label]], cols))
+        for pos in np.unique(frame['_row'].to_numpy()[matched]):
+            # Header is Excel row 1
+            matches[pos].append(label + 2)
+    return matches
+
+def _employee_header(emp, rows, trace):
+    names = [n for n in pd.unique(rows['姓名'].dropna().astype(str))] if '姓名' in rows.columns else []
+    reasons = []
+    if emp in trace.emp_ids:
+        reasons.append('工号')
+    stores = sorted(set(text_values(rows['门店编码'])) & set(trace.store_codes)) if '门店编码' in rows.columns else []
+    if stores:
+        reasons.append('门店编码 ' + ', '.join(stores))
+    return [f"# {emp} {' / '.join(names)}".rstrip(), '', f"Traced by: {'; '.join(reasons)}", '']
+
+def _hour_rows(rows, row_emps, kept_pos, matches):
+    """Traced hour rows (Excel row numbers) with the filter outcome of each."""
+    table = pd.DataFrame({'工号': row_emps, 'row': rows.index.to_numpy() + 2})
+    for col in TRACE_HOUR_COLUMNS:
+        if col in rows.columns:
+            table[col] = rows[col].to_numpy(dtype=object)
+    if matches is None:
+        table['filter'] = np.where(kept_pos >= 0, 'kept (no filter)', 'filtered out')
+    else:
+        table['filter'] = ['kept (筛选条件 row ' + ', '.join(map(str, m)) + ')' if pos >= 0 else 'filtered out'
+                           for pos, m in zip(kept_pos, matches)]
+    return table
+
+def _aggregated(emps, emp_agg_total, emp_agg_monthly):
+    """Hours the rules use per traced employee: summed over all of their hour rows, filtered out or not."""
+    return pd.DataFrame({'工号': emps,
+                         '总工时': emp_agg_total.reindex(emps, fill_value=0).to_numpy(dtype=object),
+                         '考勤工时': emp_agg_monthly.reindex(emps, fill_value=0).to_numpy(dtype=object)})
+
+def _reference_titles(index, emps):
+    """'职位' of every employee in a reference EntityIndex as text ('' where missing)."""
+    if '职位' not in index.columns:
+        return np.full(len(emps), '', dtype=object)
+    titles = index.take('职位', index.positions(emps))
+    return np.where(blank_values(titles), '', text_values(titles))
+
+def _titles(rows, kept, kept_pos, row_emps, prepared):
+    """Standardized title of every traced row the filter kept, with the title it came from."""
+    own = kept_pos >= 0
+    emps = row_emps[own]
+    basic = _reference_titles(prepared['basic'], emps)
+    roster = _reference_titles(prepared['roster'], emps)
+    # Same precedence as standardize_job_titles: 基本数据 > 花名册 > the hour row's own title
+    return pd.DataFrame({
+        '工号': emps,
+        'row': rows.index.to_numpy()[own] + 2,
+        '职位名称': rows['职位名称'].to_numpy(dtype=object)[own] if '职位名称' in rows.columns else '',
+        '基本数据 职位': basic,
+        '花名册 职位': roster,
+        'standardized': kept['职位名称'].iloc[kept_pos[own]].to_numpy(dtype=object),
+        'source': np.where(basic != '', '基本数据', np.where(roster != '', '花名册', '工时数据')),
+    })
+
+def _cert_records(df_certs, emps):
+    """'过岗数据' records of the traced employees (Excel row numbers)."""
+    records = df_certs[df_certs['工号'].isin(emps)] if '工号' in df_certs.columns else df_certs.iloc[:0]
+    table = pd.DataFrame({'工号': records['工号'].to_numpy(dtype=object) if len(records) else [],
+                          'row': records.index.to_numpy() + 2})
+    for col in TRACE_CERT_COLUMNS:
+        if col in records.columns:
+            table[col] = records[col].to_numpy(dtype=object)
+    return table
+
+def _cert_dates(cert_index, emps):
+    """Earliest valid date of each required certificate per traced employee, as the rules see them."""
+    dates = cert_index.dates.reindex(emps)
+    return pd.DataFrame({'工号': np.repeat(np.asarray(emps, dtype=object), len(dates.columns)),
+                         '证书名称': np.tile(dates.columns.to_numpy(dtype=object), len(emps)),
+                         '生效日期': dates.to_numpy(dtype=object).ravel()})
+
+def _verdicts(kept_pos, row_emps, key_codes, features, decisions):
+    """Rule decision of every (工号, title) key of the traced rows the filter kept."""
+    own = kept_pos >= 0
+    codes, first = np.unique(key_codes[kept_pos[own]], return_index=True)
+    f = features.iloc[codes]
+    d = decisions.iloc[codes]
+    table = pd.DataFrame({
+        '工号': row_emps[own][first],
+        '职位': f['title'].to_numpy(dtype=object),
+        'result': np.where(d['eligible'].to_numpy(), 'eligible', 'excluded'),
+        'reason_code': d['reason_code'].astype(str).to_numpy(),
+        'reason': render_reasons(d, f).to_numpy(),
+    })
+    for col in ['total_hours', 'monthly_hours', 'entry_date', 'latest_required', 'earliest_required', 'month_start']:
+        table[col] = f[col].to_numpy(dtype=object)
+    return table
+
+def _table_header(columns):
+    return ['| ' + ' | '.join(map(str, columns)) + ' |', '|' + ' --- |' * len(columns)]
+
+def _table_rows(frame):
+    """Markdown table row of every row of a frame (dates as YYYY-MM-DD, missing values blank)."""
+    return ['| ' + ' | '.join(_cell(v) for v in values) + ' |' for values in frame.to_numpy(dtype=object).tolist()]
+
+def _cell(value):
+    if value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        value = pd.Timestamp(value)
+        return '' if pd.isna(value) else value.strftime('%Y-%m-%d')
+    return str(value).replace('|', '\\|')
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from sheet_schema import decoded
+
+def text_values(series):
+    """
+    str(x).strip() for every value, as a numpy object array ('nan' for missing values, like the
+    scalar code). The conversion runs once per distinct value, not once per row.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    if series.dtype == object and len(series):
+        # factorize treats 1001 and 1001.0 (or 1 and True) as one value; str() does not
+        values = series.where(series.notna(), np.nan).to_numpy()
+        kinds, _ = pd.factorize(np.array([type(v) for v in values], dtype=object))
+        if kinds.max() > 0:
+            codes, _ = pd.factorize(codes.astype(np.int64) * (kinds.max() + 1) + kinds)
+            uniques = values[np.unique(codes, return_index=True)[1]]
+    texts = np.array([str(u).strip() for u in uniques] + [''], dtype=object)
+    return texts[codes]
+
+def blank_values(values):
+    """Whether each value of a Series counts as empty: missing, whitespace-only, or 'nan' in any case."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Decided once per category; missing values are blank
+        return np.append(blank_values(pd.Series(values.cat.categories)), True)[values.cat.codes.to_numpy()]
+    if values.dtype == object:
+        # Mixed values: decide once per distinct value
+        codes, uniques = pd.factorize(values)
+        blank = np.array([(isinstance(u, str) and not u.strip()) or str(u).lower() == 'nan' for u in uniques] + [True])
+        return blank[codes]
+    if pd.api.types.is_string_dtype(values.dtype):
+        return (values.isna() | (values.str.strip() == '') | (values.str.lower() == 'nan')).to_numpy(dtype=bool)
+    return values.isna().to_numpy()
+
+def coalesce(candidates):
+    """
+    Blank-aware coalesce of aligned Series (same RangeIndex): per row, the first candidate
+    that is not blank (see blank_values), otherwise the last candidate's value as-is.
+    """
+    values = decoded(candidates[-1])
+    for candidate in reversed(candidates[:-1]):
+        candidate = decoded(candidate)
+        values = candidate.where(~blank_values(candidate), values)
+    return values
+
+class EntityIndex:
+    """
+    A reference sheet deduplicated on its key column, with a hash index from key to row position.
+
+    Every lookup is batched: positions() resolves many keys at once and take() / lookup()
+    return a column's values for all of them, so no per-entity Python objects are built.
+    Duplicate keys keep their first row, with a warning naming the sheet.
+    """
+
+    def __init__(self, df, key, sheet_name):
+        self.key = key
+        self.sheet_name = sheet_name
+        if key is None:
+            self.frame = pd.DataFrame(index=range(0))
+            self.index = pd.Index([])
+            return
+        duplicated = df[key].duplicated(keep=False)
+        if duplicated.any():
+            print(f"Warning: Found duplicate '{key}' in '{sheet_name}'. Count: {int(duplicated.sum())}. "
+                  f"Keeping first occurrence.")
+            df = df[~df[key].duplicated()]
+        self.frame = df.reset_index(drop=True)
+        self.index = pd.Index(self.frame[key])
+
+    @classmethod
+    def empty(cls, sheet_name):
+        """Index without any entity (every key is missing)."""
+        return cls(None, None, sheet_name)
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def columns(self):
+        return self.frame.columns
+
+    def positions(self, keys):
+        """Row position of every key (-1 where the key is missing)."""
+        return self.index.get_indexer(keys)
+
+    def take(self, col, positions):
+        """Values of col at positions, as a Series with a RangeIndex (missing where the position is -1)."""
+        return self.frame[col].reindex(positions).reset_index(drop=True)
+
+    def lookup(self, keys, col, default=None):
+        """Values of col for every key as an object array (default where the key or the column is missing)."""
+        if col not in self.frame.columns:
+            return np.full(len(keys), default, dtype=object)
+        values = np.append(self.frame[col].to_numpy(dtype=object), [default])
+        return values[self.positions(keys)]
+
+class PairSet:
+    """Set of (left, right) pairs, compared as stripped text and tested for many pairs at once."""
+
+    def __init__(self, left, right):
+        self.pairs = pd.MultiIndex.from_arrays([text_values(left), text_values(right)])
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def contains(self, left, right):
+        """Whether each (left[i], right[i]) is in the set. left: texts as-is; right: any values."""
+        return pd.MultiIndex.from_arrays([left, text_values(right)]).isin(self.pairs)
@@ -1,284 +1,378 @@
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-
-def parse_dates_vectorized(series):
-    """
-    Vectorized date parsing to handle Chinese formats and standard formats efficiently.
-    Replaces row-by-row processing with whole-column operations.
-    """
-    if series.empty:
-        return series
-        
-    # If already datetime, return as is
-    if pd.api.types.is_datetime64_any_dtype(series):
-        return series
-        
-    # Convert to string (coercing NaNs to 'nan' which to_datetime handles)
-    s = series.astype(str).str.strip()
-    
-    # Replace Chinese format 'YYYY年MM月DD日' -> 'YYYY-MM-DD'
-    # We replace '年' and '月' with '-' and remove '日'
-    s = s.str.replace('年', '-', regex=False).str.replace('月', '-', regex=False).str.replace('日', '', regex=False)
-    
-    # Use pandas vectorized to_datetime
-    # errors='coerce' turns unparseable strings (like 'nan', 'NaT', garbage) into NaT
-    return pd.to_datetime(s, errors='coerce')
-
-def robust_parse_date(x):
-    """Helper to parse dates with support for Chinese format YYYY年MM月DD日 (Scalar version)"""
-    if pd.isna(x):
-        return pd.NaT
-    if isinstance(x, datetime):
-        return x
-    
-    s = str(x).strip()
-    # Try Chinese format first if it looks like it
-    if '年' in s and '月' in s and '日' in s:
-        try:
-            return datetime.strptime(s, '%Y年%m月%d日')
-        except ValueError:
-            pass
-    
-    # Fallback to pandas to_datetime for other formats
-    try:
-        return pd.to_datetime(s)
-    except:
-        return pd.NaT
-
-def filter_bonus_data():
-    input_file = '输入数据.xlsx'
-    output_template = '输出数据.xlsx'
-    result_file = '筛选结果.xlsx'
-    
-    # 1. Load Data
-    print("Loading data...")
-    try:
-        # Try to load '工时数据' first, then '累计工时'
-        xl = pd.ExcelFile(input_file)
-        sheet_names = xl.sheet_names
-        
-        main_sheet_name = None
-        if '工时数据' in sheet_names:
-            main_sheet_name = '工时数据'
-        elif '累计工时' in sheet_names:
-            main_sheet_name = '累计工时'
-        else:
-            print("Error: Could not find '工时数据' or '累计工时' sheet.")
-            return
-
-        print(f"Using main data sheet: {main_sheet_name}")
-        df_hours = pd.read_excel(xl, sheet_name=main_sheet_name)
-        df_filter = pd.read_excel(xl, sheet_name='筛选条件')
-        df_certs = pd.read_excel(xl, sheet_name='过岗数据')
-        
-        # Normalize IDs in main data and certs to ensure consistent matching
-        if '工号' in df_hours.columns:
-            df_hours['工号'] = df_hours['工号'].astype(str).str.strip()
-        if '工号' in df_certs.columns:
-            df_certs['工号'] = df_certs['工号'].astype(str).str.strip()
-            
-        df_basic = pd.read_excel(xl, sheet_name='基本数据')
-        df_managers = pd.read_excel(xl, sheet_name='门店负责人')
-        df_status = pd.read_excel(xl, sheet_name='门店状态表')
-        try:
-            df_roster = pd.read_excel(xl, sheet_name='花名册')
-        except:
-            print("Warning: Could not find '花名册' sheet. Fallback logic will be skipped.")
-            df_roster = pd.DataFrame()
-        
-        # --- Pre-process Date Columns (Handle Chinese Dates) ---
-        print("Preprocessing date columns...")
-        
-        # 1. Store Status Dates
-        for col in ['开始营业', '闭店时间']:
-            if col in df_status.columns:
-                df_status[col] = parse_dates_vectorized(df_status[col])
-                
-        # 2. Basic Info Dates
-        for col in ['入职日期', '转正日期', '离职日期']:
-            if col in df_basic.columns:
-                df_basic[col] = parse_dates_vectorized(df_basic[col])
-
-        # 3. Roster Dates
-        if not df_roster.empty:
-            for col in ['入职日期', '转正日期', '离职日期']:
-                if col in df_roster.columns:
-                    df_roster[col] = parse_dates_vectorized(df_roster[col])
-
-        # 4. Cert Dates
-        if '生效日期' in df_certs.columns:
-            df_certs['生效日期'] = parse_dates_vectorized(df_certs['生效日期'])
-            
-        # Load template columns
-        df_template = pd.read_excel(output_template, nrows=0)
-        output_cols = df_template.columns.tolist()
-        
-    except Exception as e:
-        print(f"Error loading files: {e}")
-        return
+from datetime import datetime
 
-    # Determine Bonus Month
-    # Look for '奖金月份' column in df_filter
-    BONUS_MONTH_START = datetime(2025, 11, 1) # Default
-    
+from bonus_rules import TEA_MASTER_CERTS_REQUIRED, evaluate_rules, render_reasons
+from cert_index import CertificateIndex
+from date_parser import parse_date, parse_date_column, reset_date_memo
+from decision_cache import DECISION_DIR_NAME, DIFF_FILE, DecisionCache, source_versions
+from employee_trace import EmployeeTrace, NullTrace
+from entity_index import EntityIndex, PairSet, coalesce, text_values
+from filter_compiler import available_filter_columns, match_hour_rows
+from report_writer import XlsxAppender, write_reports
+from run_profile import NullProfile, RunProfile
+from schema_probe import check_workbook, probe_workbook, template_headers
+from sheet_cache import read_sheets_cached
+from sheet_loader import load_sheets
+from sheet_schema import apply_schema, widened
+from state_store import BonusStateStore
+from warm_cache import NullWarmCache
+from xlsx_reader import XlsxReader
+
+# Date columns parsed at load time, per sheet
+SHEET_DATE_COLUMNS = {
+    '门店状态表': ['开始营业', '闭店时间'],
+    '基本数据': ['入职日期', '转正日期', '离职日期'],
+    '花名册': ['入职日期', '转正日期', '离职日期'],
+    '过岗数据': ['生效日期'],
+}
+
+# Columns the pipeline reads from each sheet; everything else is skipped while parsing.
+# Columns referenced by '筛选条件' headers ('<sheet>-<column>') are added on top (see sheet_usecols).
+HOURS_COLUMNS = ['区域', '区经理', '工号', '姓名', '职位名称', '门店编码', '考勤工时', '总工时']
+SHEET_COLUMNS = {
+    '过岗数据': ['工号', '证书名称', '状态', '生效日期'],
+    '基本数据': ['工号', '身份证号码', '第三方公司', '职位', '工作地区', '入职日期', '转正日期', '离职日期'],
+    '门店负责人': ['部门编号', '部门名称', '店长'],
+    '门店状态表': ['ERP门店编码', '门店编码', '品牌', '开始营业', '闭店时间'],
+    '花名册': ['工号', '身份证', '第三方公司', '工作城市', '职位', '入职日期', '转正日期', '离职日期'],
+}
+
+# Reference sheets the '筛选条件' headers can use ('<sheet>-<column>'), joined to the hours sheet:
+# (sheet name, hours key column, sheet key column)
+FILTER_JOINS = [
+    ('基本数据', '工号', '工号'),
+    ('门店状态表', '门店编码', 'ERP门店编码'),
+    ('门店负责人', '门店编码', '部门编号'),
+]
+
+# Columns of 筛选结果.xlsx (headers of 输出数据.xlsx) -> sources, as (table, column).
+# Tables: 'hours' = the eligible hour row, 'basic' / 'roster' = 基本数据 / 花名册 row of its '工号',
+# 'status' / 'managers' = 门店状态表 / 门店负责人 row of its '门店编码'.
+# With several sources the first non-blank one wins, otherwise the last source is used as-is.
+OUTPUT_SPEC = {
+    '工号': [('hours', '工号')],
+    '姓名': [('hours', '姓名')],
+    '身份证信息': [('basic', '身份证号码'), ('roster', '身份证')],
+    '门店编码': [('hours', '门店编码')],
+    '部门': [('managers', '部门名称')],
+    '第三方': [('basic', '第三方公司'), ('roster', '第三方公司')],
+    '工作地区': [('basic', '工作地区'), ('roster', '工作城市')],
+    # '最终职位' is the source of truth; the others are a safety net for blank titles
+    '职位': [('hours', '最终职位'), ('basic', '职位'), ('roster', '职位'), ('hours', '职位名称')],
+    '入职日期': [('basic', '入职日期'), ('roster', '入职日期')],
+    '转正日期': [('basic', '转正日期'), ('roster', '转正日期')],
+    '离职日期': [('basic', '离职日期'), ('roster', '离职日期')],
+    '组织类型': [('status', '品牌')],  # Template: "取门店状态表的：品牌"
+    '所属区域': [('hours', '区域')],
+    '负责人': [('hours', '区经理')],
+    '开业时间': [('status', '开始营业')],
+    '闭店时间': [('status', '闭店时间')],
+    '工时': [('hours', '总工时')],  # Template: '工时' -> "取工时数据：总工时"
+    '总工时': [('hours', '总工时')],  # Placeholder, user might want calculation (工时+年假小时)
+}
+OUTPUT_CONSTANTS = {'年假小时数': 0}
+# Lookup key of each reference table, taken from the hour row
+OUTPUT_LOOKUP_KEYS = {'basic': '工号', 'roster': '工号', 'status': '门店编码', 'managers': '门店编码'}
+
+def prepare_sheet(sheet_name, df):
+    """
+    Per-sheet preprocessing done once at load time (and stored in the sheet cache):
+    normalize '工号' to stripped strings, parse the known date columns and give the other
+    known columns their compact dtypes (see sheet_schema.SHEET_SCHEMA).
+    """
+    # Normalize IDs to ensure consistent matching across sheets
+    if '工号' in df.columns:
+        df['工号'] = df['工号'].astype(str).str.strip()
+
+    # Pre-process Date Columns (Handle Chinese Dates)
+    if not df.empty:
+        for col in SHEET_DATE_COLUMNS.get(sheet_name, []):
+            if col in df.columns:
+                df[col] = parse_date_column(df[col])
+    return apply_schema(sheet_name, df)
+
+def standardize_job_titles(df_hours, basic, roster):
+    """
+    Standardized title for every hour row: Basic Data '职位' > Roster '职位' > original '职位名称'.
+    Blank and 'nan' titles count as missing. basic/roster: EntityIndex of the sheets on '工号'.
+    Returns (titles as numpy array, number of rows whose title changed).
+    """
+    n = len(df_hours)
+    if '工号' in df_hours.columns:
+        emp_ids = pd.Series(text_values(df_hours['工号']), index=df_hours.index)
+        emp_ids[df_hours['工号'].isna().to_numpy()] = ''
+    else:
+        emp_ids = pd.Series([''] * n, index=df_hours.index, dtype=object)
+    original = text_values(df_hours['职位名称']) if '职位名称' in df_hours.columns else np.full(n, '', dtype=object)
+
+    def lookup_titles(index):
+        """(title per hour row, whether it is usable). Validity is decided once per reference row."""
+        if not len(index) or '职位' not in index.columns:
+            return np.full(n, '', dtype=object), np.zeros(n, dtype=bool)
+        titles = text_values(index.frame['职位'])
+        valid = np.array([t != '' and t.lower() != 'nan' for t in titles] + [False])
+        pos = index.positions(emp_ids)
+        # Employees missing from the reference sheet land on the trailing 'invalid' slot
+        return np.append(titles, '')[pos], valid[pos]
+
+    basic_titles, basic_valid = lookup_titles(basic)
+    roster_titles, roster_valid = lookup_titles(roster)
+    final = np.where(basic_valid, basic_titles, np.where(roster_valid, roster_titles, original))
+    replaced_count = int((final != original).sum())
+    return final, replaced_count
+
+def lookup_values(keys, index, values, default):
+    """values[i] where index[i] == key, for every key (default where the key is missing). index must be unique."""
+    pos = pd.Index(index).get_indexer(keys)
+    return np.append(np.asarray(values, dtype=object), [default])[pos]
+
+def build_output(df_rows, indexes, output_cols, manager_pairs, store_codes):
+    """
+    Output frame with output_cols, one row per eligible hour row, following OUTPUT_SPEC.
+    indexes: {'basic'|'roster'|'status'|'managers': EntityIndex of that sheet}.
+    '是否门店负责人' is "是" when (store_codes[i], 工号 of row i) is in manager_pairs (a PairSet).
+    """
+    n = len(df_rows)
+    missing = pd.Series(None, index=range(n), dtype=object)
+    positions = {}
+
+    def source_values(table, col):
+        if table == 'hours':
+            return df_rows[col].reset_index(drop=True) if col in df_rows.columns else missing
+        index = indexes[table]
+        if col not in index.columns:
+            return missing
+        if table not in positions:
+            # Row of the reference sheet for every output row (-1 if not found), computed once per sheet
+            key_col = OUTPUT_LOOKUP_KEYS[table]
+            positions[table] = index.positions(df_rows[key_col] if key_col in df_rows.columns else missing)
+        return index.take(col, positions[table])
+
+    df_out = pd.DataFrame(index=range(n))
+    for out_col, sources in OUTPUT_SPEC.items():
+        df_out[out_col] = coalesce([source_values(*source) for source in sources])
+    for out_col, value in OUTPUT_CONSTANTS.items():
+        df_out[out_col] = value
+
+    # '是否门店负责人': "判断：门店负责人在的店长，用门店编码和工号判断"
+    df_out['是否门店负责人'] = np.where(manager_pairs.contains(store_codes, df_rows['工号']), "是", "否")
+    return df_out.reindex(columns=output_cols)
+
+def rule_features(emp_ids, titles, emp_agg_total, emp_agg_monthly, cert_index, basic, month_start):
+    """
+    Feature frame for bonus_rules.evaluate_rules, one row per (emp_ids, titles) pair (RangeIndex).
+    emp_agg_*: aggregated hours per '工号'; cert_index: CertificateIndex of the valid certificates;
+    basic: EntityIndex of '基本数据' on '工号'.
+    """
+    n = len(emp_ids)
+    features = pd.DataFrame(index=range(n))
+    features['title'] = titles.to_numpy()
+    # Hours stay as the aggregated scalars (0 for unknown employees); the reason text prints them as-is
+    features['total_hours'] = lookup_values(emp_ids, emp_agg_total.index, emp_agg_total.to_numpy(dtype=object), 0)
+    features['monthly_hours'] = lookup_values(emp_ids, emp_agg_monthly.index, emp_agg_monthly.to_numpy(dtype=object), 0)
+
+    certs = cert_index.features(emp_ids)
+    for col in certs.columns:
+        features[col] = certs[col].to_numpy()
+
+    if '入职日期' in basic.columns:
+        entry = basic.lookup(emp_ids, '入职日期', pd.NaT)
+    else:
+        entry = [pd.NaT] * n
+    features['entry_date'] = pd.to_datetime(pd.Series(entry, index=features.index, dtype=object))
+    features['month_start'] = pd.Timestamp(month_start)
+    return features
+
+def sheet_usecols(main_sheet_name, filter_columns):
+    """Columns to load per sheet: the fixed ones above plus whatever the filter sheet references."""
+    usecols = {main_sheet_name: list(HOURS_COLUMNS)}
+    for sheet_name, cols in SHEET_COLUMNS.items():
+        usecols[sheet_name] = list(cols)
+    for header in filter_columns:
+        sheet_name, sep, col = str(header).partition('-')
+        if sep and sheet_name in usecols and col not in usecols[sheet_name]:
+            usecols[sheet_name].append(col)
+    return usecols
+
+# Used when '筛选条件' has no usable '奖金月份'
+DEFAULT_BONUS_MONTH = datetime(2025, 11, 1)
+
+# Hour rows per batch of the chunked mode (filter_bonus_chunked)
+DEFAULT_CHUNK_ROWS = 200000
+
+# '累计工时' already holds each employee's cumulative hours; merging it into a state would count them twice
+STATE_CUMULATIVE_ERROR = "The state directory needs the month's '工时数据'; '累计工时' is already cumulative"
+
+# Date columns of 筛选结果.xlsx, written as real Excel dates shown as YYYY-MM-DD (no time part)
+OUTPUT_DATE_COLUMNS = ['入职日期', '转正日期', '离职日期', '开业时间', '闭店时间']
+
+def template_columns(output_template):
+    """Headers of the output template (the columns of 筛选结果.xlsx), read without loading the workbook."""
+    return template_headers(output_template)
+
+def load_inputs(input_file, output_template, filter_sheets=('筛选条件',), load_workers=None, timings=None,
+                output_cols=None, stream_hours=False, memory=None):
+    """
+    Load every sheet the pipeline uses plus the headers of the output template.
+    Returns a dict with 'main_sheet_name', 'filters' ({filter sheet name: DataFrame}), 'hours',
+    'hours_columns', 'certs', 'basic', 'managers', 'status', 'roster', 'output_cols' and 'sheet_versions'
+    ({sheet name: content version}, see sheet_cache.read_sheets_cached), or None (after printing
+    an error) when the workbook has no hours sheet. The sheet headers are checked first (see
+    schema_probe.check_workbook): missing required sheets or columns raise ValueError before any data is loaded.
+    timings: optional dict that receives {sheet name: parse seconds} for the sheets not taken from the cache.
+    output_cols: template headers read beforehand (see template_columns); the template is then not opened.
+    stream_hours: leave the hours sheet out ('hours' is None), for callers that stream it in
+        batches of the columns listed in 'hours_columns'.
+    memory: in-memory sheet store of a long-running process (see warm_cache.WarmCache), so
+        unchanged sheets are reused without touching the disk.
+    """
+    # Preflight: only the header rows are read, so a missing sheet or column is reported at once
+    # ('工时数据' is used if present, then '累计工时')
+    preflight = check_workbook(probe_workbook(input_file), filter_sheets)
+    main_sheet_name = preflight['main_sheet']
+    if main_sheet_name is None:
+        print("Error: Could not find '工时数据' or '累计工时' sheet.")
+        return None
+
+    print(f"Using main data sheet: {main_sheet_name}")
+    for message in preflight['warnings']:
+        print(f"Warning: {message}")
+    if preflight['errors']:
+        raise ValueError('; '.join(preflight['errors']))
+
+    # Parsed sheets are cached next to the workbook, so only sheets that
+    # changed since the last run are parsed again. Parsing streams the sheet XML,
+    # keeps only the columns the pipeline uses and runs in worker processes
+    # (date parsing included) for large workbooks.
+    usecols = {}
+    versions = {}
+    def read_sheets(names):
+        return load_sheets(input_file, names, usecols=usecols, prepare=prepare_sheet, workers=load_workers,
+                           timings=timings)
+
+    # The filter sheets are read first: their headers decide which extra columns to load
+    filters = read_sheets_cached(input_file, list(filter_sheets), read_sheets, memory=memory)
+
+    usecols = sheet_usecols(main_sheet_name, [col for df in filters.values() for col in df.columns])
+    # Main sheet first: it is by far the largest and is scheduled before the others
+    wanted = [main_sheet_name, '过岗数据', '基本数据', '门店负责人', '门店状态表', '花名册']
+    if stream_hours:
+        wanted = wanted[1:]
+    sheets = read_sheets_cached(input_file, wanted, read_sheets, columns=usecols, memory=memory, versions=versions)
+
+    # Load template columns
+    if output_cols is None:
+        output_cols = template_columns(output_template)
+    return {
+        'main_sheet_name': main_sheet_name,
+        'filters': {name: filters[name] for name in filter_sheets},
+        'hours': None if stream_hours else sheets[main_sheet_name],
+        'hours_columns': usecols[main_sheet_name],
+        'certs': sheets['过岗数据'],
+        'basic': sheets['基本数据'],
+        'managers': sheets['门店负责人'],
+        'status': sheets['门店状态表'],
+        'roster': sheets.get('花名册', pd.DataFrame()),
+        'output_cols': list(output_cols),
+        'sheet_versions': versions,
+    }
+
+def bonus_month(df_filter):
+    """First day of the bonus month given by the first '奖金月份' of a filter sheet (DEFAULT_BONUS_MONTH if none)."""
+    month_start = DEFAULT_BONUS_MONTH
     if '奖金月份' in df_filter.columns:
         first_val = df_filter['奖金月份'].dropna().iloc[0] if not df_filter['奖金月份'].dropna().empty else None
-        
+
         if first_val:
-            # Try robust parse first (handles YYYY-MM-DD or YYYY年MM月DD日)
-            parsed_date = robust_parse_date(first_val)
-            
+            # Handles dates (YYYY-MM-DD, YYYY年MM月DD日, date cells) and months (YYYY-MM, YYYY年MM月)
+            parsed_date = parse_date(first_val)
+
             if pd.notna(parsed_date):
-                 BONUS_MONTH_START = parsed_date.replace(day=1)
+                month_start = parsed_date.replace(day=1)
             else:
-                 # Try parsing 'YYYY-MM' or 'YYYY年MM月' (without day)
-                 s = str(first_val).strip()
-                 try:
-                     if '年' in s and '月' in s:
-                         # Handle '2025年11月'
-                         dt = datetime.strptime(s, '%Y年%m月')
-                         BONUS_MONTH_START = dt
-                     else:
-                         # Handle '2025-11'
-                         dt = datetime.strptime(s, '%Y-%m')
-                         BONUS_MONTH_START = dt
-                 except:
-                     print(f"Warning: Could not parse bonus month '{s}'. Using default 2025-11-01.")
+                print(f"Warning: Could not parse bonus month '{str(first_val).strip()}'. Using default 2025-11-01.")
+    return month_start
 
-    print(f"Calculating bonus for month starting: {BONUS_MONTH_START.date()}")
+def hour_sums(df_hours):
+    """('总工时', '考勤工时') summed per '工号' over the given hour rows."""
+    # Hours may be stored downcast (see sheet_schema); they are summed at full width
+    emp_agg_total = widened(df_hours['总工时']).groupby(df_hours['工号']).sum() if '总工时' in df_hours.columns else pd.Series(dtype=float)
+    emp_agg_monthly = widened(df_hours['考勤工时']).groupby(df_hours['工号']).sum() if '考勤工时' in df_hours.columns else pd.Series(dtype=float)
+    return emp_agg_total, emp_agg_monthly
 
-    # --- Pre-calculate Aggregated Hours per Employee (Before Filtering) ---
+def aggregate_hours(df_hours):
+    """('总工时', '考勤工时') summed per '工号' over all hour rows (before filtering)."""
     print("Calculating aggregated hours per employee...")
-    # Group by '工号' and sum '总工时' and '考勤工时'
-    # Use fillna(0) to ensure numeric summation works
-    emp_agg_total = df_hours.groupby('工号')['总工时'].sum().to_dict() if '总工时' in df_hours.columns else {}
-    emp_agg_monthly = df_hours.groupby('工号')['考勤工时'].sum().to_dict() if '考勤工时' in df_hours.columns else {}
+    emp_agg_total, emp_agg_monthly = hour_sums(df_hours)
     print(f"Aggregated hours calculated for {len(emp_agg_total)} employees.")
+    return emp_agg_total, emp_agg_monthly
 
-    # 2. Apply Filter (筛选条件)
-
+def filter_columns(df_hours, df_filter, main_sheet_name, ref_frames, filter_name='筛选条件'):
+    """The filter sheet's columns that select hour rows, or None when every row is kept."""
     # If filter sheet is not empty, keep only matching rows in df_hours
-    if not df_filter.empty and not df_filter.dropna(how='all').empty:
-        print("Applying filters from '筛选条件'...")
-        
-        # --- PREPARE DATA FOR FILTERING ---
-        # Create a combined dataframe that has columns from all relevant sheets
-        # mapped with prefix "SheetName-"
-        
-        print("Preparing combined data for filtering...")
-        df_combined = df_hours.copy()
-        
-        # 1. Merge Basic Data (基本数据)
-        # Prefix columns
-        df_basic_prefixed = df_basic.add_prefix('基本数据-')
-        # Merge on Employee ID
-        # df_hours['工号'] <-> df_basic['工号']
-        if '工号' in df_combined.columns and '基本数据-工号' in df_basic_prefixed.columns:
-            df_combined = df_combined.merge(df_basic_prefixed, left_on='工号', right_on='基本数据-工号', how='left')
-        
-        # 2. Merge Store Status (门店状态表)
-        # df_hours['门店编码'] <-> df_status['ERP门店编码']
-        df_status_prefixed = df_status.add_prefix('门店状态表-')
-        if '门店编码' in df_combined.columns and '门店状态表-ERP门店编码' in df_status_prefixed.columns:
-            df_combined = df_combined.merge(df_status_prefixed, left_on='门店编码', right_on='门店状态表-ERP门店编码', how='left')
-            
-        # 3. Merge Store Managers (门店负责人)
-        # df_hours['门店编码'] <-> df_managers['部门编号']
-        df_managers_prefixed = df_managers.add_prefix('门店负责人-')
-        if '门店编码' in df_combined.columns and '门店负责人-部门编号' in df_managers_prefixed.columns:
-             df_combined = df_combined.merge(df_managers_prefixed, left_on='门店编码', right_on='门店负责人-部门编号', how='left')
-
-        # 4. Rename original df_hours columns to '{main_sheet_name}-'
-        # We do this last so we don't break the join keys above
-        df_combined = df_combined.rename(columns={col: f'{main_sheet_name}-{col}' for col in df_hours.columns})
-        
-        # --- APPLY FILTERS ---
-        
-        # Get valid columns from filter sheet that also exist in combined data
-        valid_filter_cols = [col for col in df_filter.columns if col in df_combined.columns]
-        
-        if not valid_filter_cols:
-            print(f"No matching columns found. Available columns in data: {list(df_combined.columns)[:10]}...")
-            print("Ignoring filter.")
-        else:
-            print(f"Using filter columns: {valid_filter_cols}")
-            
-            final_mask = pd.Series(False, index=df_combined.index)
-            valid_filter_rows = df_filter.dropna(how='all')
-            
-            for _, filter_row in valid_filter_rows.iterrows():
-                # Create a mask for this specific filter rule
-                rule_mask = pd.Series(True, index=df_combined.index)
-                
-                for col in valid_filter_cols:
-                    val = filter_row[col]
-                    # Skip if the filter value itself is NaN/Empty for this row
-                    if pd.isna(val):
-                        continue
-                        
-                    rule_mask &= (df_combined[col] == val)
-                
-                final_mask |= rule_mask
-            
-            # Filter original df_hours using the mask from df_combined
-            # (They share the same index because we used left join)
-            df_hours = df_hours[final_mask].copy()
-            print(f"Rows after filtering: {len(df_hours)}")
-    else:
-        print("No filters found in '筛选条件'. Using all data.")
+    if df_filter.empty or df_filter.dropna(how='all').empty:
+        print(f"No filters found in '{filter_name}'. Using all data.")
+        return None
 
-    if df_hours.empty:
-        print("No data left after filtering.")
-        return
+    print(f"Applying filters from '{filter_name}'...")
+    # Filter headers refer to columns as "SheetName-Column". Only the sheets and columns
+    # they reference are joined to the hours data, and only when they are referenced.
+    available_cols = available_filter_columns(df_hours, main_sheet_name, ref_frames, FILTER_JOINS)
+
+    # Get valid columns from filter sheet that also exist in the data
+    valid_filter_cols = [col for col in df_filter.columns if col in set(available_cols)]
+    if not valid_filter_cols:
+        print(f"No matching columns found. Available columns in data: {available_cols[:10]}...")
+        print("Ignoring filter.")
+        return None
+
+    print(f"Using filter columns: {valid_filter_cols}")
+    return valid_filter_cols
+
+def filter_hours(df_hours, df_filter, main_sheet_name, ref_frames, filter_name='筛选条件'):
+    """Copy of the hour rows selected by a filter sheet (all of them when it is empty)."""
+    valid_filter_cols = filter_columns(df_hours, df_filter, main_sheet_name, ref_frames, filter_name)
+    if valid_filter_cols is None:
+        return df_hours.copy()
+
+    print("Preparing combined data for filtering...")
+    # Filter rows are compiled into one hash semi-join per set of non-empty columns
+    final_mask = match_hour_rows(df_hours, main_sheet_name, ref_frames, FILTER_JOINS, df_filter, valid_filter_cols)
+    df_hours = df_hours[final_mask].copy()
+    print(f"Rows after filtering: {len(df_hours)}")
+    return df_hours
+
+def prepare_tables(df_basic, df_status, df_managers, df_roster):
+    """
+    Reference lookups, deduplicated on their keys (first occurrence kept, with a warning).
+    Returns a dict with 'basic' / 'roster' / 'status' / 'managers' (EntityIndex of each sheet)
+    and 'manager_pairs' (PairSet of the (store code, 店长) pairs of '门店负责人').
+    The input frames are left untouched: the filter joins the sheets as loaded.
+    """
+    # '工号' is normalized at load time (prepare_sheet); the store keys are normalized here
+    # (string + strip) for the lookups only
 
-    # 3. Prepare Helper Data
-    
-    # Certifications: Group by Employee ID and collect list of valid certs with dates
-    # Valid Certs: Status == '有效'
-    # valid_certs structure: {emp_id: {cert_name: earliest_effective_date}}
-    # We store the EARLIEST date for each cert type to maximize eligibility chances.
-    valid_certs = {}
-    if '生效日期' in df_certs.columns:
-        for _, row in df_certs[df_certs['状态'] == '有效'].iterrows():
-            eid = row['工号']
-            cname = row['证书名称']
-            cdate = row['生效日期']
-            if pd.isna(cdate):
-                continue
-            if eid not in valid_certs:
-                valid_certs[eid] = {}
-            
-            # Keep the earliest date if multiple records exist for same cert name
-            if cname in valid_certs[eid]:
-                if cdate < valid_certs[eid][cname]:
-                    valid_certs[eid][cname] = cdate
-            else:
-                valid_certs[eid][cname] = cdate
-    else:
-        print("Warning: '生效日期' column not found in '过岗数据'. Using certificate existence only (ignoring date).")
-        # Fallback: Use a very old date so date check always passes
-        for _, row in df_certs[df_certs['状态'] == '有效'].iterrows():
-            eid = row['工号']
-            cname = row['证书名称']
-            if eid not in valid_certs:
-                valid_certs[eid] = {}
-            valid_certs[eid][cname] = datetime(2000, 1, 1)
-
-    # Define Target Cert Sets
-    tea_master_certs_required = {'【奈雪】大堂服务岗证书', '【奈雪】后厨岗证书', '【奈雪】水吧岗证书'}
-    
-    # --- Prepare Lookups (Handle Duplicates) ---
-    # Normalize keys to ensure consistent matching (string + strip)
-    
     # 1. Basic Data
-    if '工号' in df_basic.columns:
-        df_basic['工号'] = df_basic['工号'].astype(str).str.strip()
-        dup_basic = df_basic[df_basic.duplicated(subset=['工号'], keep=False)]
-        if not dup_basic.empty:
-            print(f"Warning: Found duplicate '工号' in '基本数据'. Count: {len(dup_basic)}. Keeping first occurrence.")
-        df_basic = df_basic.drop_duplicates(subset=['工号'])
-    basic_lookup = df_basic.set_index('工号').to_dict('index')
-    
+    if '工号' not in df_basic.columns:
+        raise KeyError('工号')
+    basic = EntityIndex(df_basic, '工号', '基本数据')
+
     # 2. Store Status Data
     status_key = 'ERP门店编码'
     if status_key not in df_status.columns:
@@ -287,381 +381,962 @@ def filter_bonus_data():
         else:
             print(f"Warning: Could not find '{status_key}' in '门店状态表'. Available: {list(df_status.columns)}")
             status_key = None
-            
+
     if status_key:
-        df_status[status_key] = df_status[status_key].astype(str).str.strip()
-        dup_status = df_status[df_status.duplicated(subset=[status_key], keep=False)]
-        if not dup_status.empty:
-             print(f"Warning: Found duplicate '{status_key}' in '门店状态表'. Count: {len(dup_status)}. Keeping first occurrence.")
-        df_status = df_status.drop_duplicates(subset=[status_key])
-        status_lookup = df_status.set_index(status_key).to_dict('index')
+        status = EntityIndex(df_status.assign(**{status_key: df_status[status_key].astype(str).str.strip()}),
+                             status_key, '门店状态表')
     else:
-        status_lookup = {}
-        
+        status = EntityIndex.empty('门店状态表')
+
     # 3. Manager Data
-    if '部门编号' in df_managers.columns:
-        df_managers['部门编号'] = df_managers['部门编号'].astype(str).str.strip()
-        dup_managers = df_managers[df_managers.duplicated(subset=['部门编号'], keep=False)]
-        if not dup_managers.empty:
-            print(f"Warning: Found duplicate '部门编号' in '门店负责人'. Count: {len(dup_managers)}. Keeping first occurrence.")
-        df_managers = df_managers.drop_duplicates(subset=['部门编号'])
-    if '店长' in df_managers.columns:
-        df_managers['店长'] = df_managers['店长'].astype(str).str.strip()
-    manager_lookup = df_managers.set_index('部门编号').to_dict('index')
+    if '部门编号' not in df_managers.columns:
+        raise KeyError('部门编号')
+    managers = EntityIndex(df_managers.assign(部门编号=df_managers['部门编号'].astype(str).str.strip()),
+                           '部门编号', '门店负责人')
 
     # 4. Roster Data
-    roster_lookup = {}
     if not df_roster.empty and '工号' in df_roster.columns:
-        df_roster['工号'] = df_roster['工号'].astype(str).str.strip()
-        dup_roster = df_roster[df_roster.duplicated(subset=['工号'], keep=False)]
-        if not dup_roster.empty:
-            print(f"Warning: Found duplicate '工号' in '花名册'. Count: {len(dup_roster)}. Keeping first occurrence.")
-        df_roster = df_roster.drop_duplicates(subset=['工号'])
-        roster_lookup = df_roster.set_index('工号').to_dict('index')
-
-    # Entry Dates: Map ID to Entry Date
-    # Use the cleaned df_basic or basic_lookup
-    # entry_dates = df_basic.set_index('工号')['入职日期'].to_dict() # This is now safe as df_basic is deduplicated
-    # But better to use basic_lookup directly in logic
-    entry_dates = {k: v.get('入职日期') for k, v in basic_lookup.items()}
-    
-    # Store Managers: Map (StoreID, EmpID) to Boolean (True if manager of that store)
-    # Check '门店负责人' sheet. '部门编号' is store code, '店长' is EmpID.
-    # We can create a set of tuples (StoreCode, EmpID)
-    # Ensure types are consistent (strings)
-    manager_set = set()
-    for _, row in df_managers.iterrows():
-        sc = row.get('部门编号')
-        eid = row.get('店长')
-        if pd.notna(sc) and pd.notna(eid):
-            manager_set.add((str(sc).strip(), str(eid).strip()))
+        roster = EntityIndex(df_roster, '工号', '花名册')
+    else:
+        roster = EntityIndex.empty('花名册')
+
+    # Store Managers: (StoreCode, EmpID) pairs from '门店负责人' ('部门编号' is store code, '店长' is EmpID),
+    # compared as stripped strings; rows with either value missing name no manager
+    if '店长' in managers.columns:
+        known = (managers.frame['部门编号'].notna() & managers.frame['店长'].notna()).to_numpy()
+        manager_pairs = PairSet(managers.frame['部门编号'][known], managers.frame['店长'][known])
+    else:
+        manager_pairs = PairSet(pd.Series([], dtype=object), pd.Series([], dtype=object))
+
+    return {'basic': basic, 'roster': roster, 'status': status, 'managers': managers,
+            'manager_pairs': manager_pairs}
 
+def evaluate_months(df_hours, months, emp_agg_total, emp_agg_monthly, cert_index, prepared, cache=None):
+    """
+    Standardize the titles of the (filtered) hour rows in place and evaluate the rules for every
+    bonus month in `months` at once. Returns (emp_ids, key_codes, features, decisions), where
+    features/decisions hold one block of rows per month, in the order of `months`, each block
+    with one row per distinct (工号, standardized title); key_codes maps hour rows to block rows.
+    cache: decision_cache.DecisionCache (a single month only): keys of unchanged employees take
+        the previous run's features and decisions instead of being evaluated again.
+    """
     # --- Pre-process: Standardize Job Titles ---
     # Replace job titles in df_hours with values from Basic Data > Roster Data > Original
     print("Standardizing job titles based on Employee ID...")
-    
+
     # We will create a new column '最终职位' (Final Job Title)
-    final_job_titles = []
-    replaced_count = 0
-    
-    for idx, row in df_hours.iterrows():
-        emp_id_raw = row.get('工号')
-        emp_id = str(emp_id_raw).strip() if pd.notna(emp_id_raw) else ''
-        original_title = str(row.get('职位名称', '')).strip()
-        
-        basic_info = basic_lookup.get(emp_id, {})
-        roster_info = roster_lookup.get(emp_id, {})
-        
-        # Priority: Basic > Roster > Original
-        new_title = str(basic_info.get('职位', '')).strip()
-        
-        # Check if basic title is valid
-        if not new_title or new_title.lower() == 'nan':
-            # Fallback to Roster
-            new_title = str(roster_info.get('职位', '')).strip()
-            
-            # Check if roster title is valid
-            if not new_title or new_title.lower() == 'nan':
-                # Fallback to Original
-                new_title = original_title
-        
-        final_job_titles.append(new_title)
-        
-        if new_title != original_title:
-            replaced_count += 1
-            
+    final_job_titles, replaced_count = standardize_job_titles(df_hours, prepared['basic'], prepared['roster'])
+
     # Update '职位名称' directly as requested to ensure all downstream logic and output use the corrected title
-    df_hours['职位名称'] = final_job_titles
-    df_hours['最终职位'] = final_job_titles # Keep this for reference/debugging
+    df_hours['职位名称'] = pd.Categorical(final_job_titles)
+    df_hours['最终职位'] = df_hours['职位名称'] # Keep this for reference/debugging
     print(f"Job titles standardized. {replaced_count} rows updated with title from Basic/Roster data.")
 
     # 4. Logic Processing
-    eligible_rows = []
-    excluded_rows = []
-
-    for idx, row in df_hours.iterrows():
-        emp_id_raw = row.get('工号')
-        emp_id = str(emp_id_raw).strip() if pd.notna(emp_id_raw) else ''
-        name = row.get('姓名')
-        
-        # Use the standardized job title (which is now in '职位名称' as well)
-        job_title = row['职位名称']
-        
-        # Debug print for specific title mismatch investigation
-        if job_title == '调茶大咖':
-             # Check why we ended up with '调茶大咖'
-             basic_info = basic_lookup.get(emp_id, {})
-             roster_info = roster_lookup.get(emp_id, {})
-             print(f"Debug: Emp {emp_id} ({name}) has title '调茶大咖'. Basic: {basic_info.get('职位')}, Roster: {roster_info.get('职位')}")
-        
-        store_code = row.get('门店编码')
-        
-        # Ensure store_code is string for consistent lookup
-        store_code_str = str(store_code).strip() if pd.notna(store_code) else ''
-        
-        # Use aggregated hours for logic checks
-        monthly_hours = emp_agg_monthly.get(emp_id, 0)
-        total_hours = emp_agg_total.get(emp_id, 0)
-        
-        is_eligible = False
-        reason = ""
-
-        # --- Rule 1: Tea Master & Trainers ---
-        # "茶饮师 / 茶饮师（S）/Pro训练员/茶饮训练员"
-        if job_title in ['茶饮师', '茶饮师（S）', 'Pro训练员', '茶饮训练员']:
-            # Condition: Must have ALL 3 certificates
-            # Judgment Date: The LATEST of the 3 certificates.
-            if emp_id in valid_certs:
-                user_c = valid_certs[emp_id]
-                has_all = True
-                dates = []
-                for req_c in tea_master_certs_required:
-                    if req_c not in user_c:
-                        has_all = False
-                        break
-                    # Ensure date is valid datetime
-                    c_date = user_c[req_c]
-                    if isinstance(c_date, datetime):
-                        dates.append(c_date)
-                    else:
-                        # Try to parse if string
-                        parsed = robust_parse_date(c_date)
-                        if pd.notna(parsed):
-                            dates.append(parsed)
-                        else:
-                             # Invalid date counts as missing for logic safety
-                             has_all = False
-                             break
-                
-                if has_all:
-                    # Logic: "证书取3个证书中最晚拿到的时间作为判断"
-                    latest_cert_date = max(dates)
-                    if latest_cert_date < BONUS_MONTH_START:
-                        is_eligible = True
-                        reason = f"茶饮师：3证齐全且符合时间要求 ({latest_cert_date.date()})"
-                    else:
-                        reason = f"茶饮师：证书日期太新 ({latest_cert_date.date()} >= {BONUS_MONTH_START.date()})"
-                else:
-                    reason = "茶饮师：缺少必要的证书（需凑齐大堂、后厨、水吧）"
-            else:
-                reason = "茶饮师：无任何有效证书"
-
-        # --- Rule 2: Part-time & Interns ---
-        # "兼职 (职位名称包含“兼职”)/就业见习生"
-        elif '兼职' in job_title or job_title == '就业见习生':
-            # Condition 1: Total Hours >= 40
-            # Condition 2: Has ANY of the 3 certificates
-            # Condition 3: Monthly Hours >= 50
-            
-            # Logic: "证书其中一个取最早拿到的时间作为判断"
-            
-            cond_hours_cumulative = (total_hours >= 40)
-            cond_monthly_hours = (monthly_hours >= 50)
-            
-            has_any_cert = False
-            earliest_cert_date = None
-            
-            if emp_id in valid_certs:
-                user_c = valid_certs[emp_id]
-                found_dates = []
-                for req_c in tea_master_certs_required:
-                    if req_c in user_c:
-                        c_date = user_c[req_c]
-                        # Ensure date
-                        if isinstance(c_date, datetime):
-                            found_dates.append(c_date)
-                        else:
-                             parsed = robust_parse_date(c_date)
-                             if pd.notna(parsed):
-                                 found_dates.append(parsed)
-                
-                if found_dates:
-                    has_any_cert = True
-                    earliest_cert_date = min(found_dates)
-            
-            cond_cert_time = False
-            if has_any_cert and earliest_cert_date:
-                if earliest_cert_date < BONUS_MONTH_START:
-                    cond_cert_time = True
-            
-            if cond_hours_cumulative and cond_cert_time and cond_monthly_hours:
-                is_eligible = True
-                reason = "兼职/实习生：符合资格"
-            else:
-                reason_parts = []
-                if not cond_hours_cumulative: reason_parts.append(f"累计工时({total_hours})<40")
-                if not cond_monthly_hours: reason_parts.append(f"当月工时({monthly_hours})<50")
-                if not has_any_cert: reason_parts.append("无任何有效证书")
-                elif not cond_cert_time: reason_parts.append(f"证书日期太新 ({earliest_cert_date.date()})")
-                reason = "兼职/实习生：不符合条件 - " + ", ".join(reason_parts)
-
-        # --- Rule 3: Assistant Manager/Store Manager (副经理, 副店长) ---
-        elif job_title in ['副经理', '副店长']:
-            entry_date = entry_dates.get(emp_id)
-            if pd.notna(entry_date):
-                # "入职满30天的次月参加分配"
-                # Formula: (Entry + 29 days) < Start of Bonus Month
-                cutoff_date = entry_date + timedelta(days=29)
-                if cutoff_date < BONUS_MONTH_START:
-                    is_eligible = True
-                    reason = "副经理/副店长：符合入职时间要求"
-                else:
-                    reason = f"副经理/副店长：入职未满要求天数 ({cutoff_date.date()} >= {BONUS_MONTH_START.date()})"
-            else:
-                reason = "副经理/副店长：缺少入职日期"
-
-        # --- Rule 4: Store Manager ---
-        # "店长 / 店长（S）/见习店长/资深店长"
-        elif job_title in ['店长', '店长（S）', '见习店长', '资深店长']:
-            # Issue 2 Fix: Store Managers should always be eligible regardless of manager_set check
-            is_eligible = True
-            reason = "店长类职位：自动符合资格"
-            # if (store_code, emp_id) in manager_set:
-            #     is_eligible = True
-            #     reason = "Store Manager Eligible"
-            # else:
-            #     reason = "Store Manager: Not managing this store"
-        
-        else:
-            reason = f"职位 '{job_title}' 不在筛选规则范围内"
+    emp_ids = pd.Series(text_values(df_hours['工号']), index=df_hours.index)
+    emp_ids[df_hours['工号'].isna().to_numpy()] = ''
 
-        if is_eligible:
-            # Add to result
-            eligible_rows.append(row)
-            # print(f"kept: {emp_id} {name} ({job_title}) - {reason}")
-        else:
-            excluded_rows.append({
-                '工号': emp_id,
-                '姓名': name,
-                '职位': job_title,
-                '门店编码': store_code,
-                '总工时': total_hours,
-                '月工时': monthly_hours,
-                '排除原因': reason
-            })
-            # print(f"dropped: {emp_id} {name} ({job_title}) - {reason}")
+    # Every input of the eligibility rules (see bonus_rules.RULES) is per employee, so the rules run
+    # once per distinct (工号, standardised title) and the decisions are broadcast back to the hour rows
+    keys = pd.DataFrame({'工号': emp_ids.to_numpy(), 'title': df_hours['职位名称'].to_numpy()})
+    key_codes = keys.groupby(['工号', 'title'], sort=False, dropna=False).ngroup().to_numpy()
+    first_rows = np.flatnonzero(~keys.duplicated().to_numpy())
+    key_emp_ids = emp_ids.iloc[first_rows].reset_index(drop=True)
+    key_titles = df_hours['职位名称'].iloc[first_rows]
+
+    def evaluate(rows):
+        """Features and decisions of the keys at the given positions, for every month."""
+        features = rule_features(key_emp_ids.iloc[rows].reset_index(drop=True), key_titles.iloc[rows],
+                                 emp_agg_total, emp_agg_monthly, cert_index, prepared['basic'], months[0])
+        # Only 'month_start' differs between months: the rules compare every date against the
+        # whole array of month starts in a single pass
+        if len(months) > 1:
+            features = pd.concat([features.assign(month_start=pd.Timestamp(m)) for m in months], ignore_index=True)
+        return features, evaluate_rules(features)
+
+    if cache is None:
+        features, decisions = evaluate(np.arange(len(first_rows)))
+    else:
+        key_names = df_hours['姓名'].iloc[first_rows] if '姓名' in df_hours.columns else None
+        features, decisions = cache.evaluate(key_emp_ids, key_titles, key_names, evaluate)
+
+    return emp_ids, key_codes, features, decisions
+
+def last_store_code(df_hours):
+    """'门店编码' of the last hour row as stripped text ('' if missing)."""
+    code = df_hours['门店编码'].iloc[-1] if '门店编码' in df_hours.columns else None
+    return str(code).strip() if pd.notna(code) else ''
+
+def month_reports(df_hours, emp_ids, key_codes, features, decisions, prepared, output_cols, result_file,
+                  exclusion_file, store_code_str=None):
+    """
+    Reports of one bonus month: [(result_file, 筛选结果 frame), (exclusion_file, 排除原因 frame)]
+    (the latter only when some rows are excluded). features/decisions hold that month's block only.
+    store_code_str: the legacy '是否门店负责人' store code (see below) when df_hours is only one
+        batch of the filtered rows; taken from df_hours' last row if None.
+    """
+    eligible_mask = decisions['eligible'].to_numpy()[key_codes]
+    eligible_rows = df_hours[eligible_mask]
+
+    # Reasons stay as codes until the exclusion report is written
+    excluded_mask = ~eligible_mask
+    excluded_codes = key_codes[excluded_mask]
+    excluded_rows = pd.DataFrame({
+        '工号': emp_ids[excluded_mask],
+        '姓名': df_hours['姓名'][excluded_mask] if '姓名' in df_hours.columns else None,
+        '职位': df_hours['职位名称'][excluded_mask],
+        '门店编码': df_hours['门店编码'][excluded_mask] if '门店编码' in df_hours.columns else None,
+        '总工时': features['total_hours'].to_numpy()[excluded_codes],
+        '月工时': features['monthly_hours'].to_numpy()[excluded_codes],
+    })
+
+    # Legacy: '是否门店负责人' below compares against the store code of the LAST hour row
+    # (the variable used to leak out of the old per-row rule loop)
+    if store_code_str is None:
+        store_code_str = last_store_code(df_hours)
 
     # 5. Construct Output
     print(f"Eligible employees found: {len(eligible_rows)}")
-    
-    if not eligible_rows:
+
+    if eligible_rows.empty:
         print("No eligible employees found.")
         # Proceed to generate exclusion report even if no eligible employees
-    
-    df_result_source = pd.DataFrame(eligible_rows)
-    
-    # Map to Output Columns
-    # We need to pull data from various sources to fill the output columns
-    # Output Columns: ['工号', '姓名', '身份证信息', '门店编码', '部门', '第三方', '工作地区', '职位', '入职日期', '转正日期', '离职日期', '组织类型', '所属区域', '负责人', '开业时间', '闭店时间', '工时', '年假小时数', '总工时', '是否门店负责人']
-    
-    final_data = []
-    
-    for _, row in df_result_source.iterrows():
-        emp_id = row.get('工号')
-        store_code = row.get('门店编码')
-        
-        basic_info = basic_lookup.get(emp_id, {})
-        store_info = status_lookup.get(store_code, {})
-        manager_info = manager_lookup.get(store_code, {})
-        roster_info = roster_lookup.get(emp_id, {})
-        
-        new_row = {}
-        new_row['工号'] = emp_id
-        new_row['姓名'] = row.get('姓名')
-        
-        # Helper for fallback: if value is empty/null/nan, try roster
-        def get_with_fallback(primary_dict, primary_key, roster_dict, roster_key):
-            val = primary_dict.get(primary_key)
-            # Check if val is effectively empty
-            is_empty = False
-            if pd.isna(val):
-                is_empty = True
-            elif isinstance(val, str) and not val.strip():
-                is_empty = True
-            elif str(val).lower() == 'nan':
-                 is_empty = True
-                 
-            if is_empty:
-                return roster_dict.get(roster_key)
-            return val
-
-        new_row['身份证信息'] = get_with_fallback(basic_info, '身份证号码', roster_info, '身份证')
-        new_row['门店编码'] = store_code
-        new_row['部门'] = manager_info.get('部门名称')
-        
-        # '第三方' fallback
-        # Basic Data '第三方公司' might be the key?
-        # My previous inspection showed '第三方公司' in Basic Data.
-        new_row['第三方'] = get_with_fallback(basic_info, '第三方公司', roster_info, '第三方公司')
-        
-        # '工作地区' fallback
-        new_row['工作地区'] = get_with_fallback(basic_info, '工作地区', roster_info, '工作城市')
-        
-        # '职位' fallback
-        # Use the standardized '最终职位' which was computed earlier
-        # We still do a fallback check just in case, but '最终职位' is the source of truth for logic
-        val_job = row.get('最终职位')
-        if pd.isna(val_job) or (isinstance(val_job, str) and not val_job.strip()) or str(val_job).lower() == 'nan':
-             # This shouldn't happen if standardized logic works, but as safety:
-             val_job = get_with_fallback(basic_info, '职位', roster_info, '职位')
-             if pd.isna(val_job) or (isinstance(val_job, str) and not val_job.strip()) or str(val_job).lower() == 'nan':
-                 val_job = row.get('职位名称')
-        new_row['职位'] = val_job
-        
-        # Dates fallback
-        new_row['入职日期'] = get_with_fallback(basic_info, '入职日期', roster_info, '入职日期')
-        new_row['转正日期'] = get_with_fallback(basic_info, '转正日期', roster_info, '转正日期')
-        new_row['离职日期'] = get_with_fallback(basic_info, '离职日期', roster_info, '离职日期')
-        
-        new_row['组织类型'] = store_info.get('品牌') # Template: "取门店状态表的：品牌"
-        new_row['所属区域'] = row.get('区域')
-        new_row['负责人'] = row.get('区经理')
-        new_row['开业时间'] = store_info.get('开始营业') # Check column name in status table. It was '开始营业'
-        new_row['闭店时间'] = store_info.get('闭店时间')
-        new_row['工时'] = row.get('总工时') # Template says "取工时数据：总工时" for '工时' column? Or '考勤工时'?
-                                         # Wait, Template: '工时' -> "取工时数据：总工时". '总工时' -> "判断...".
-                                         # Actually in first inspect: '工时' -> "取工时数据：总工时", '总工时' -> "工时+年假小时".
-                                         # Let's use '总工时' from source for '工时'.
-        new_row['年假小时数'] = 0 # Default
-        new_row['总工时'] = row.get('总工时') # Placeholder, user might want calculation
-        
-        # '是否门店负责人'
-        # "判断：门店负责人在的店长，用门店编码和工号判断"
-        is_manager = "是" if (store_code_str, str(emp_id).strip()) in manager_set else "否"
-        new_row['是否门店负责人'] = is_manager
-        
-        final_data.append(new_row)
-        
-    df_final = pd.DataFrame(final_data, columns=output_cols)
-    
-    # Write to Excel
-    # Format date columns to remove time part
-    date_columns = ['入职日期', '转正日期', '离职日期', '开业时间', '闭店时间']
-    for col in date_columns:
+
+    # Map to Output Columns (see OUTPUT_SPEC)
+    # Legacy: every row is checked against the same (last hour row's) store code, see above
+    manager_store_codes = np.full(len(eligible_rows), store_code_str, dtype=object)
+    df_final = build_output(eligible_rows, prepared, output_cols, prepared['manager_pairs'],
+                            manager_store_codes)
+    for col in OUTPUT_DATE_COLUMNS:
         if col in df_final.columns:
             # Convert to datetime first to ensure correct type
             df_final[col] = pd.to_datetime(df_final[col], errors='coerce')
-            # Format as YYYY-MM-DD string to remove 00:00:00 in Excel
-            # Using .dt.date would result in python object, strings are safer for Excel display without time
-            df_final[col] = df_final[col].dt.strftime('%Y-%m-%d').fillna('')
 
-    df_final.to_excel(result_file, index=False)
+    reports = [(result_file, df_final)]
+    if not excluded_rows.empty:
+        # One reason text per excluded employee key, broadcast to their hour rows
+        excluded_keys = ~decisions['eligible'].to_numpy()
+        reasons = np.full(len(decisions), '', dtype=object)
+        reasons[excluded_keys] = render_reasons(decisions[excluded_keys], features[excluded_keys]).to_numpy()
+        excluded_rows['排除原因'] = reasons[excluded_codes]
+        reports.append((exclusion_file, excluded_rows))
+    return reports
+
+# Columns the hour rows can be partitioned on for the multi-process evaluation (see partition_rows)
+PARTITION_COLUMNS = ['门店编码', '区域']
+
+# What every worker of the partitioned evaluation shares: set once per worker process by the pool
+# initializer (forked workers inherit it without copying, spawned ones unpickle it once)
+_PARTITION_SHARED = {}
+
+def partition_rows(df_hours, emp_ids, n_partitions, by='门店编码'):
+    """
+    Row positions of df_hours per partition (non-empty partitions only, in partition order).
+    by='门店编码': rows are hashed on their store code into n_partitions; by='区域': one partition
+    per region. Every row of an employee goes to the partition of their first row, so each
+    (工号, title) key and the hours behind it are evaluated in exactly one partition.
+    emp_ids: '工号' text of every row.
+    """
+    if by not in df_hours.columns or not len(df_hours):
+        part = np.zeros(len(df_hours), dtype=np.int64)
+    elif by == '区域':
+        part, _ = pd.factorize(text_values(df_hours[by]))
+    else:
+        part = (pd.util.hash_array(text_values(df_hours[by])) % np.uint64(n_partitions)).astype(np.int64)
+    emp_codes, _ = pd.factorize(emp_ids)
+    _, first_rows = np.unique(emp_codes, return_index=True)
+    part = part[first_rows][emp_codes]
+    order = np.argsort(part, kind='stable')
+    return np.split(order, np.flatnonzero(np.diff(part[order])) + 1) if len(order) else []
+
+def _partition_pool_context():
+    """
+    Start method of the rule-worker pool. fork hands the hour rows to the workers without pickling
+    them, but forking a process that runs other threads (the HTTP server of resident mode) can
+    leave a lock held in the child, so such processes start their workers with forkserver.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if 'fork' in methods and threading.active_count() == 1:
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def _init_partition_worker(shared):
+    _PARTITION_SHARED.update(shared)
+
+def _evaluate_partition(rows):
+    """evaluate_months + month_reports for the shared hour rows at positions `rows` (in a worker process)."""
+    shared = _PARTITION_SHARED
+    df_part = shared['hours'].iloc[rows].copy()
+    # The parent prints the progress of the whole run
+    with contextlib.redirect_stdout(io.StringIO()):
+        emp_ids, key_codes, features, decisions = evaluate_months(
+            df_part, [shared['month']], shared['emp_agg_total'], shared['emp_agg_monthly'], shared['cert_index'],
+            shared['prepared'])
+        reports = month_reports(df_part, emp_ids, key_codes, features, decisions, shared['prepared'],
+                                shared['output_cols'], '', '', store_code_str=shared['store_code'])
+    return {'titles': df_part['职位名称'], 'key_codes': key_codes, 'features': features, 'decisions': decisions,
+            'eligible': decisions['eligible'].to_numpy()[key_codes], 'reports': [df for _, df in reports]}
+
+def evaluate_partitioned(df_hours, month, emp_agg_total, emp_agg_monthly, cert_index, prepared, output_cols,
+                         result_file, exclusion_file, workers, partition_by='门店编码'):
+    """
+    evaluate_months + month_reports for one bonus month, with the hour rows split by partition_rows
+    and the partitions evaluated by a pool of `workers` processes. The hour rows and reference
+    indexes go to each worker once (see _PARTITION_SHARED); a task is only its row positions.
+    Returns (emp_ids, key_codes, features, decisions, reports) like the single-process path: the
+    titles of df_hours are standardized in place, features/decisions hold the keys of one partition
+    after the other, and the report rows are merged back into df_hours order, so the reports are
+    the same whatever the number of workers or the order partitions finish in.
+    """
+    print("Standardizing job titles based on Employee ID...")
+    emp_ids = pd.Series(text_values(df_hours['工号']), index=df_hours.index)
+    emp_ids[df_hours['工号'].isna().to_numpy()] = ''
+    parts = partition_rows(df_hours, emp_ids.to_numpy(), workers, partition_by)
+    shared = {'hours': df_hours, 'month': month, 'emp_agg_total': emp_agg_total, 'emp_agg_monthly': emp_agg_monthly,
+              'cert_index': cert_index, 'prepared': prepared, 'output_cols': output_cols,
+              # Legacy '是否门店负责人' store code: the last row of all the filtered rows (see month_reports)
+              'store_code': last_store_code(df_hours)}
+    workers = max(1, min(workers, len(parts)))
+    print(f"Evaluating rules in {len(parts)} partitions by '{partition_by}' with {workers} worker processes...")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_partition_pool_context(),
+                             initializer=_init_partition_worker, initargs=(shared,)) as pool:
+        # map() yields in submission order: the merge below never depends on timing
+        results = list(pool.map(_evaluate_partition, parts))
+
+    n = len(df_hours)
+    original = text_values(df_hours['职位名称']) if '职位名称' in df_hours.columns else np.full(n, '', dtype=object)
+    titles = np.empty(n, dtype=object)
+    key_codes = np.empty(n, dtype=np.int64)
+    eligible = np.empty(n, dtype=bool)
+    offset = 0
+    for rows, result in zip(parts, results):
+        titles[rows] = result['titles'].to_numpy(dtype=object)
+        key_codes[rows] = result['key_codes'] + offset
+        eligible[rows] = result['eligible']
+        offset += len(result['decisions'])
+    df_hours['职位名称'] = pd.Categorical(titles)
+    df_hours['最终职位'] = df_hours['职位名称']
+    print(f"Job titles standardized. {int((titles != original).sum())} rows updated with title from Basic/Roster data.")
+    features = pd.concat([result['features'] for result in results], ignore_index=True)
+    decisions = pd.concat([result['decisions'] for result in results], ignore_index=True)
+
+    def merged(report, mask):
+        """One report of every partition, rows back in df_hours order."""
+        frames = [result['reports'][report] for result in results if len(result['reports']) > report]
+        positions = np.concatenate([rows[mask[rows]] for rows in parts])
+        return pd.concat(frames).iloc[np.argsort(positions, kind='stable')]
+
+    df_final = merged(0, eligible).reset_index(drop=True)
+    print(f"Eligible employees found: {len(df_final)}")
+    if df_final.empty:
+        print("No eligible employees found.")
+    reports = [(result_file, df_final)]
+    if not eligible.all():
+        reports.append((exclusion_file, merged(1, ~eligible)))
+    return emp_ids, key_codes, features, decisions, reports
+
+def filter_bonus_data(input_file='输入数据.xlsx', output_template='输出数据.xlsx', output_dir='', output_cols=None,
+                      load_workers=None, write_workers=None, state_dir=None, profile=None, chunk_rows=None,
+                      warm=None, incremental=False, trace=None, rule_workers=None, partition_by='门店编码'):
+    """
+    input_file / output_template: the workbook and the template whose headers are the result columns.
+    output_dir: where 筛选结果.xlsx and 筛选排除原因.xlsx are written (default: the working directory).
+    output_cols: template headers read beforehand (see template_columns); the template is then not opened.
+    load_workers: processes used to parse the input sheets (None = automatic, 1 = no pool).
+    write_workers: processes used to write the two reports (None = automatic, 1 = no pool).
+    state_dir: month-over-month state directory (see state_store.BonusStateStore). When given, the
+        workbook only holds the bonus month's hours and certificate records; they are merged into
+        the state and cumulative '总工时' and certificate dates are taken from it. Refused for a
+        workbook whose hours come from '累计工时', which already holds the cumulative hours.
+    profile: optional run_profile.RunProfile recording each stage (the caller writes the report).
+    chunk_rows: stream the hours sheet in batches of about this many rows instead of loading it
+        whole, for sheets that do not fit in memory (see filter_bonus_chunked).
+    warm: warm_cache.WarmCache of a long-running process (see resident.py): parsed sheets and the
+        aggregated hours, certificate index and reference lookups built from them are reused while
+        their sheets are unchanged, and the reports are kept after writing. Not used with chunk_rows.
+    incremental: reuse the previous run's decisions (stored in output_dir, see
+        decision_cache.DecisionCache) for employees whose inputs did not change, and write the
+        employees whose result flipped since then to 筛选变化.xlsx. Not used with chunk_rows.
+    trace: employee_trace.EmployeeTrace of the employees / stores to follow through the stages;
+        their trace files are written to output_dir after the run. Not used with chunk_rows.
+    rule_workers: processes evaluating the rules and building the reports (see evaluate_partitioned),
+        with the hour rows partitioned by partition_by ('门店编码' or '区域'). None or 1 evaluates
+        them in this process. Not used with incremental or chunk_rows.
+    Returns a summary dict: 'status' ('ok', 'no data' or 'error'), 'eligible' / 'excluded'
+    (hour rows in each report), 'files' (written reports) and 'message'.
+    """
+    if chunk_rows:
+        if incremental:
+            print("Warning: Incremental mode is not available with chunked reading; every employee is computed.")
+        if trace is not None and trace.enabled:
+            print("Warning: Tracing is not available with chunked reading.")
+        if rule_workers and rule_workers > 1:
+            print("Warning: Partitioned evaluation is not available with chunked reading.")
+        return filter_bonus_chunked(input_file, output_template, output_dir, output_cols, chunk_rows,
+                                    load_workers=load_workers, state_dir=state_dir, profile=profile)
+    result_file = os.path.join(output_dir, '筛选结果.xlsx')
+    exclusion_file = os.path.join(output_dir, '筛选排除原因.xlsx')
+    profile = profile or NullProfile()
+    warm = warm or NullWarmCache()
+    trace = trace or NullTrace()
+    summary = {'status': 'error', 'eligible': 0, 'excluded': 0, 'files': [], 'message': ''}
+
+    # 1. Load Data
+    print("Loading data...")
+    reset_date_memo()
+    with profile.stage('load') as stage:
+        timings = {} if profile.enabled else None
+        try:
+            inputs = load_inputs(input_file, output_template, load_workers=load_workers, timings=timings,
+                                 output_cols=output_cols, memory=warm if warm.enabled else None)
+        except Exception as e:
+            print(f"Error loading files: {e}")
+            summary['message'] = f"Error loading files: {e}"
+            return summary
+        if inputs is None:
+            summary['message'] = "No '工时数据' or '累计工时' sheet"
+            return summary
+        stage.rows_out = len(inputs['hours'])
+        if profile.enabled:
+            # Which sheet the load time went to (sheets without a parse time came from the sheet cache)
+            frames = {inputs['main_sheet_name']: inputs['hours'], '筛选条件': inputs['filters']['筛选条件'],
+                      '过岗数据': inputs['certs'], '基本数据': inputs['basic'], '门店负责人': inputs['managers'],
+                      '门店状态表': inputs['status'], '花名册': inputs['roster']}
+            stage.details['sheets'] = {
+                name: {'rows': len(df), 'columns': len(df.columns),
+                       'parse_seconds': round(timings[name], 4) if name in timings else None,
+                       'source': 'parsed' if name in timings else 'cache'}
+                for name, df in frames.items()}
+            profile.info.update(input_file=os.path.abspath(input_file), main_sheet=inputs['main_sheet_name'])
+    if state_dir is not None and inputs['main_sheet_name'] == '累计工时':
+        summary['message'] = STATE_CUMULATIVE_ERROR
+        print(f"Error: {STATE_CUMULATIVE_ERROR}")
+        return summary
+    df_filter = inputs['filters']['筛选条件']
+    df_hours = inputs['hours']
+    df_certs = inputs['certs']
+
+    # Determine Bonus Month
+    # Look for '奖金月份' column in df_filter
+    BONUS_MONTH_START = bonus_month(df_filter)
+    print(f"Calculating bonus for month starting: {BONUS_MONTH_START.date()}")
+    if profile.enabled:
+        profile.info['bonus_month'] = BONUS_MONTH_START.strftime('%Y-%m')
+
+    # --- Pre-calculate Aggregated Hours per Employee (Before Filtering) ---
+    with profile.stage('aggregation', rows_in=len(df_hours)) as stage:
+        emp_agg_total, emp_agg_monthly = warm.derive('aggregated hours', [df_hours], lambda: aggregate_hours(df_hours))
+        stage.rows_out = len(emp_agg_total)
+
+    # 2. Apply Filter (筛选条件)
+    with profile.stage('filter', rows_in=len(df_hours)) as stage:
+        ref_frames = {'基本数据': inputs['basic'], '门店状态表': inputs['status'], '门店负责人': inputs['managers']}
+        df_hours = filter_hours(df_hours, df_filter, inputs['main_sheet_name'], ref_frames)
+        stage.rows_out = len(df_hours)
+
+    if df_hours.empty:
+        print("No data left after filtering.")
+        trace.write(output_dir, inputs['hours'], df_filter=df_filter, main_sheet_name=inputs['main_sheet_name'],
+                    ref_frames=ref_frames, joins=FILTER_JOINS, emp_agg_total=emp_agg_total,
+                    emp_agg_monthly=emp_agg_monthly, df_certs=df_certs)
+        summary['status'] = 'no data'
+        return summary
+
+    # 3. Prepare Helper Data
+
+    # Certifications: employee x required-certificate matrix of the EARLIEST effective date
+    # (valid certs only, status == '有效'), to maximize eligibility chances.
+    if '生效日期' not in df_certs.columns:
+        print("Warning: '生效日期' column not found in '过岗数据'. Using certificate existence only (ignoring date).")
+    with profile.stage('indexes', rows_in=len(df_certs)) as stage:
+        if state_dir is not None:
+            try:
+                state = BonusStateStore(state_dir)
+                emp_agg_total, df_certs = state.merge_month(BONUS_MONTH_START, emp_agg_total, df_certs)
+            except (OSError, ValueError) as e:
+                print(f"Error updating state: {e}")
+                summary['message'] = f"Error updating state: {e}"
+                return summary
+            print(f"Cumulative hours and certificates taken from state months {state.months()}.")
+        cert_index = warm.derive('certificate index', [df_certs],
+                                 lambda: CertificateIndex(df_certs, TEA_MASTER_CERTS_REQUIRED))
+
+        # --- Prepare Lookups (Handle Duplicates) ---
+        ref_sheets = [inputs['basic'], inputs['status'], inputs['managers'], inputs['roster']]
+        prepared = warm.derive('reference lookups', ref_sheets, lambda: prepare_tables(*ref_sheets))
+        stage.rows_out = len(cert_index.holders)
+
+    partitioned = bool(rule_workers and rule_workers > 1)
+    if partitioned and incremental:
+        print("Warning: Partitioned evaluation is not used in incremental mode.")
+        partitioned = False
+    with profile.stage('rules', rows_in=len(df_hours)) as stage:
+        cache = None
+        if incremental:
+            versions = source_versions(inputs['sheet_versions'], inputs['main_sheet_name'],
+                                       state=state_dir is not None)
+            cache = DecisionCache(os.path.join(output_dir, DECISION_DIR_NAME), BONUS_MONTH_START, versions)
+            cache.fingerprint(emp_agg_total, emp_agg_monthly, df_certs, prepared)
+            cache.affected_report(df_hours['门店编码'] if '门店编码' in df_hours.columns else [])
+        if partitioned:
+            # The workers build the reports as well
+            emp_ids, key_codes, features, decisions, reports = evaluate_partitioned(
+                df_hours, BONUS_MONTH_START, emp_agg_total, emp_agg_monthly, cert_index, prepared,
+                inputs['output_cols'], result_file, exclusion_file, rule_workers, partition_by)
+        else:
+            emp_ids, key_codes, features, decisions = evaluate_months(
+                df_hours, [BONUS_MONTH_START], emp_agg_total, emp_agg_monthly, cert_index, prepared, cache)
+        # One decision per distinct (工号, title)
+        stage.rows_out = len(decisions)
+    with profile.stage('output', rows_in=len(df_hours)) as stage:
+        if cache is not None:
+            # Only the rows of changed employees and stores are built again
+            def build(rows):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    return month_reports(df_hours.iloc[rows], emp_ids.iloc[rows], key_codes[rows], features,
+                                         decisions, prepared, inputs['output_cols'], result_file,
+                                         exclusion_file, last_store_code(df_hours))
+            reports = cache.reports(df_hours, emp_ids, key_codes, decisions, inputs['output_cols'],
+                                    result_file, exclusion_file, build)
+        elif not partitioned:
+            reports = month_reports(df_hours, emp_ids, key_codes, features, decisions, prepared,
+                                    inputs['output_cols'], result_file, exclusion_file)
+        stage.rows_out = len(reports[0][1])
+        # Incremental runs: employees whose result flipped since the previous run
+        changes = []
+        if cache is not None:
+            if cache.comparable:
+                flipped = cache.diff(features, decisions)
+                print(f"{len(flipped)} employees changed between eligible and excluded since the previous run.")
+                changes.append((os.path.join(output_dir, DIFF_FILE), flipped))
+            cache.save(features, decisions)
+
+    # Both reports are streamed to disk, concurrently for large results
+    with profile.stage('write', rows_in=sum(len(df) for _, df in reports)):
+        write_reports(reports + changes, workers=write_workers)
+    warm.keep_reports(reports)
     print(f"Successfully generated {result_file}")
+    # Traced employees are picked out of the stage outputs now that the run is done
+    trace.write(output_dir, inputs['hours'], kept=df_hours, df_filter=df_filter,
+                main_sheet_name=inputs['main_sheet_name'], ref_frames=ref_frames, joins=FILTER_JOINS,
+                emp_agg_total=emp_agg_total, emp_agg_monthly=emp_agg_monthly, df_certs=df_certs,
+                cert_index=cert_index, prepared=prepared, key_codes=key_codes, features=features,
+                decisions=decisions)
+
+    # Exclusion Report
+    if len(reports) > 1:
+        print(f"Successfully generated {exclusion_file} with {len(reports[1][1])} excluded records.")
+    else:
+        print("No excluded employees found.")
+    summary.update(status='ok', eligible=len(reports[0][1]), excluded=len(reports[1][1]) if len(reports) > 1 else 0,
+                   files=[path for path, _ in reports + changes])
+    return summary
+
+def _add_sums(total, part):
+    """Per-'工号' sums of two batches combined (total is None before the first batch)."""
+    if total is None:
+        return part
+    return pd.concat([total, part]).groupby(level=0).sum()
+
+def filter_bonus_chunked(input_file='输入数据.xlsx', output_template='输出数据.xlsx', output_dir='', output_cols=None,
+                         chunk_rows=DEFAULT_CHUNK_ROWS, load_workers=None, state_dir=None, profile=None):
+    """
+    filter_bonus_data for hour sheets too large to hold in memory: the hours sheet is streamed
+    in batches of about chunk_rows rows and never held whole.
+
+    Pass 1 parses every batch once, adds its hours to the per-employee sums and spills the rows
+    the filter keeps to a temporary file next to the reports. Pass 2 reads the kept batches back
+    one at a time, evaluates the rules against the in-memory reference tables and appends the
+    rows to both reports. Memory stays bounded by one batch plus the reference sheets and the
+    per-employee sums. The reports match filter_bonus_data's, except that each batch's column
+    types are inferred from that batch alone (see XlsxReader.iter_sheet).
+    Returns the same summary dict as filter_bonus_data.
+    """
+    result_file = os.path.join(output_dir, '筛选结果.xlsx')
+    exclusion_file = os.path.join(output_dir, '筛选排除原因.xlsx')
+    profile = profile or NullProfile()
+    summary = {'status': 'error', 'eligible': 0, 'excluded': 0, 'files': [], 'message': ''}
+
+    print(f"Loading data (hours streamed in batches of {chunk_rows} rows)...")
+    reset_date_memo()
+    with profile.stage('load'):
+        try:
+            inputs = load_inputs(input_file, output_template, load_workers=load_workers, output_cols=output_cols,
+                                 stream_hours=True)
+        except Exception as e:
+            print(f"Error loading files: {e}")
+            summary['message'] = f"Error loading files: {e}"
+            return summary
+        if inputs is None:
+            summary['message'] = "No '工时数据' or '累计工时' sheet"
+            return summary
+    main_sheet_name = inputs['main_sheet_name']
+    if state_dir is not None and main_sheet_name == '累计工时':
+        summary['message'] = STATE_CUMULATIVE_ERROR
+        print(f"Error: {STATE_CUMULATIVE_ERROR}")
+        return summary
+    df_filter = inputs['filters']['筛选条件']
+    df_certs = inputs['certs']
+    BONUS_MONTH_START = bonus_month(df_filter)
+    print(f"Calculating bonus for month starting: {BONUS_MONTH_START.date()}")
+
+    # The spill directory sits next to the reports rather than in the system temp directory,
+    # which may be memory-backed
+    spill_dir = tempfile.mkdtemp(prefix='.bonus-batches-', dir=output_dir or '.')
+    try:
+        # --- Pass 1: hour sums over all rows, filter each batch, spill the kept rows ---
+        ref_frames = {'基本数据': inputs['basic'], '门店状态表': inputs['status'], '门店负责人': inputs['managers']}
+        emp_agg_total = emp_agg_monthly = None
+        valid_filter_cols = None
+        spilled = []
+        n_rows = n_kept = 0
+        store_code_str = ''
+        with profile.stage('scan') as stage, XlsxReader(input_file) as reader:
+            for n, df_batch in enumerate(reader.iter_sheet(main_sheet_name, usecols=inputs['hours_columns'],
+                                                           batch_rows=chunk_rows)):
+                df_batch = prepare_sheet(main_sheet_name, df_batch)
+                if n == 0:
+                    valid_filter_cols = filter_columns(df_batch, df_filter, main_sheet_name, ref_frames)
+                total, monthly = hour_sums(df_batch)
+                emp_agg_total, emp_agg_monthly = _add_sums(emp_agg_total, total), _add_sums(emp_agg_monthly, monthly)
+                n_rows += len(df_batch)
+                if valid_filter_cols is not None:
+                    df_batch = df_batch[match_hour_rows(df_batch, main_sheet_name, ref_frames, FILTER_JOINS,
+                                                        df_filter, valid_filter_cols)]
+                if df_batch.empty:
+                    continue
+                n_kept += len(df_batch)
+                # Legacy '是否门店负责人' check uses the last kept row of the whole sheet (see month_reports)
+                store_code_str = last_store_code(df_batch)
+                spilled.append(os.path.join(spill_dir, f'batch{n:05d}.pkl'))
+                df_batch.to_pickle(spilled[-1])
+                print(f"Batch {n + 1}: {n_rows} hour rows read, {n_kept} kept by the filter.")
+            stage.rows_in, stage.rows_out = n_rows, n_kept
+            stage.details['batches'] = {'read': n + 1 if n_rows else 0, 'kept': len(spilled)}
+        print(f"Aggregated hours calculated for {len(emp_agg_total)} employees.")
+        print(f"Rows after filtering: {n_kept}")
+        if not spilled:
+            print("No data left after filtering.")
+            summary['status'] = 'no data'
+            return summary
+
+        # --- Reference indexes, as in filter_bonus_data ---
+        if '生效日期' not in df_certs.columns:
+            print("Warning: '生效日期' column not found in '过岗数据'. Using certificate existence only (ignoring date).")
+        with profile.stage('indexes', rows_in=len(df_certs)):
+            if state_dir is not None:
+                try:
+                    state = BonusStateStore(state_dir)
+                    emp_agg_total, df_certs = state.merge_month(BONUS_MONTH_START, emp_agg_total, df_certs)
+                except (OSError, ValueError) as e:
+                    print(f"Error updating state: {e}")
+                    summary['message'] = f"Error updating state: {e}"
+                    return summary
+            cert_index = CertificateIndex(df_certs, TEA_MASTER_CERTS_REQUIRED)
+            prepared = prepare_tables(inputs['basic'], inputs['status'], inputs['managers'], inputs['roster'])
+
+        # --- Pass 2: rules per kept batch, rows appended to the reports ---
+        result_writer = XlsxAppender(result_file, inputs['output_cols'])
+        exclusion_writer = None
+        try:
+            with profile.stage('evaluate', rows_in=n_kept) as stage:
+                for path in spilled:
+                    df_hours = pd.read_pickle(path)
+                    emp_ids, key_codes, features, decisions = evaluate_months(
+                        df_hours, [BONUS_MONTH_START], emp_agg_total, emp_agg_monthly, cert_index, prepared)
+                    reports = month_reports(df_hours, emp_ids, key_codes, features, decisions, prepared,
+                                            inputs['output_cols'], result_file, exclusion_file, store_code_str)
+                    result_writer.append(reports[0][1])
+                    if len(reports) > 1:
+                        if exclusion_writer is None:
+                            exclusion_writer = XlsxAppender(exclusion_file, reports[1][1].columns)
+                        exclusion_writer.append(reports[1][1])
+                stage.rows_out = result_writer.rows
+        finally:
+            result_writer.close()
+            if exclusion_writer is not None:
+                exclusion_writer.close()
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
 
-    # Write Exclusion Report
-    if excluded_rows:
-        exclusion_file = '筛选排除原因.xlsx'
-        df_excluded = pd.DataFrame(excluded_rows)
-        df_excluded.to_excel(exclusion_file, index=False)
-        print(f"Successfully generated {exclusion_file} with {len(excluded_rows)} excluded records.")
+    print(f"Eligible employees found: {result_writer.rows}")
+    print(f"Successfully generated {result_file}")
+    if exclusion_writer is not None:
+        print(f"Successfully generated {exclusion_file} with {exclusion_writer.rows} excluded records.")
     else:
         print("No excluded employees found.")
+    summary.update(status='ok', eligible=result_writer.rows,
+                   excluded=exclusion_writer.rows if exclusion_writer is not None else 0,
+                   files=[result_file] + ([exclusion_file] if exclusion_writer is not None else []))
+    return summary
+
+def filter_bonus_batch(months=None, filter_sheets=('筛选条件',), input_file='输入数据.xlsx',
+                       output_template='输出数据.xlsx', output_dir='', load_workers=None, write_workers=None):
+    """
+    Evaluate several scenarios from a single load of the workbook: every filter sheet in
+    filter_sheets (alternative versions of '筛选条件' in input_file) for every bonus month in
+    months (dates or strings such as '2025-11'; None = each filter sheet's own '奖金月份').
+
+    The sheets, aggregated hours, certificate index and reference lookups are built once;
+    each filter sheet is applied once and all of its months are evaluated in one pass.
+    Each scenario's 筛选结果.xlsx and 筛选排除原因.xlsx go to its own sub-directory
+    <filter sheet>_<YYYY-MM> of output_dir. Returns {(filter sheet, 'YYYY-MM'): [written file paths]}.
+    """
+    filter_sheets = list(dict.fromkeys(filter_sheets))
+
+    print("Loading data...")
+    reset_date_memo()
+    try:
+        inputs = load_inputs(input_file, output_template, filter_sheets, load_workers=load_workers)
+    except Exception as e:
+        print(f"Error loading files: {e}")
+        return {}
+    if inputs is None:
+        return {}
+
+    month_starts = None
+    if months is not None:
+        month_starts = []
+        for value in months:
+            parsed = parse_date(value)
+            if pd.isna(parsed):
+                print(f"Warning: Could not parse bonus month '{value}'. Skipping it.")
+            else:
+                month_starts.append(parsed.replace(day=1))
+        month_starts = list(dict.fromkeys(month_starts))
+        if not month_starts:
+            print("Error: No valid bonus month given.")
+            return {}
+
+    emp_agg_total, emp_agg_monthly = aggregate_hours(inputs['hours'])
+    df_certs = inputs['certs']
+    if '生效日期' not in df_certs.columns:
+        print("Warning: '生效日期' column not found in '过岗数据'. Using certificate existence only (ignoring date).")
+    cert_index = CertificateIndex(df_certs, TEA_MASTER_CERTS_REQUIRED)
+    prepared = prepare_tables(inputs['basic'], inputs['status'], inputs['managers'], inputs['roster'])
+    ref_frames = {'基本数据': inputs['basic'], '门店状态表': inputs['status'], '门店负责人': inputs['managers']}
+
+    reports = []
+    written = {}
+    for sheet_name in filter_sheets:
+        df_filter = inputs['filters'][sheet_name]
+        sheet_months = month_starts or [bonus_month(df_filter)]
+        print(f"Scenario '{sheet_name}': months {[m.strftime('%Y-%m') for m in sheet_months]}")
+        df_hours = filter_hours(inputs['hours'], df_filter, inputs['main_sheet_name'], ref_frames, sheet_name)
+        if df_hours.empty:
+            print("No data left after filtering.")
+            continue
+
+        emp_ids, key_codes, features, decisions = evaluate_months(
+            df_hours, sheet_months, emp_agg_total, emp_agg_monthly, cert_index, prepared)
+        block = len(features) // len(sheet_months)
+        for i, month_start in enumerate(sheet_months):
+            scenario_dir = os.path.join(output_dir, re.sub(r'[\\/:*?"<>|]', '_', sheet_name)
+                                        + f"_{month_start.strftime('%Y-%m')}")
+            os.makedirs(scenario_dir, exist_ok=True)
+            print(f"Bonus month {month_start.strftime('%Y-%m')} ({sheet_name}):")
+            rows = slice(i * block, (i + 1) * block)
+            month_files = month_reports(df_hours, emp_ids, key_codes,
+                                        features.iloc[rows].reset_index(drop=True),
+                                        decisions.iloc[rows].reset_index(drop=True), prepared,
+                                        inputs['output_cols'], os.path.join(scenario_dir, '筛选结果.xlsx'),
+                                        os.path.join(scenario_dir, '筛选排除原因.xlsx'))
+            reports += month_files
+            written[(sheet_name, month_start.strftime('%Y-%m'))] = [path for path, _ in month_files]
+
+    # Every scenario's reports are written together, concurrently for large results
+    write_reports(reports, workers=write_workers)
+    for (sheet_name, month), paths in written.items():
+        print(f"Successfully generated {', '.join(paths)}")
+    return written
+
+# Headless runs: each workbook's reports and console output go to its own sub-directory of the
+# output directory, and one summary row per workbook to RUN_SUMMARY_FILE
+RUN_LOG_FILE = 'run.log'
+RUN_SUMMARY_FILE = '筛选汇总.csv'
+RUN_SUMMARY_COLUMNS = ['workbook', 'status', 'eligible', 'excluded', 'seconds', 'output_dir', 'message']
+
+def expand_inputs(patterns):
+    """Workbook paths from command-line paths and glob patterns, in the order given, without duplicates."""
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            # Skip the lock files Excel leaves next to open workbooks
+            matches = [p for p in sorted(glob.glob(pattern)) if not os.path.basename(p).startswith('~$')]
+            if not matches:
+                print(f"Warning: No workbook matches '{pattern}'.")
+        else:
+            matches = [pattern]
+        paths += [os.path.abspath(p) for p in matches]
+    return list(dict.fromkeys(paths))
+
+def output_names(paths):
+    """Output sub-directory name per workbook: its file name, prefixed by its folder when file names clash."""
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    names = [f"{os.path.basename(os.path.dirname(p))}_{stem}" if stems.count(stem) > 1 else stem
+             for p, stem in zip(paths, stems)]
+    # Same folder and file name: number them
+    return [name if names.count(name) == 1 else f"{name}_{i + 1}" for i, name in enumerate(names)]
+
+def process_workbook(input_file, output_dir, output_cols, profile=False, load_workers=1, chunk_rows=None,
+                     incremental=False, trace=None, state_dir=None, rule_workers=None, partition_by='门店编码'):
+    """
+    One workbook of a headless run: reports, console output (run.log) and, with profile, the run
+    profile go to output_dir. Never raises; failures are reported in the returned summary
+    (filter_bonus_data's, plus 'workbook', 'output_dir' and 'seconds').
+    """
+    start = time.perf_counter()
+    summary = {'status': 'error', 'eligible': 0, 'excluded': 0, 'files': [], 'message': ''}
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, RUN_LOG_FILE), 'w', encoding='utf-8') as log, \
+                contextlib.redirect_stdout(log):
+            run_profile = RunProfile() if profile else None
+            try:
+                summary = filter_bonus_data(input_file, output_dir=output_dir, output_cols=output_cols,
+                                            load_workers=load_workers, write_workers=1, profile=run_profile,
+                                            chunk_rows=chunk_rows, incremental=incremental, trace=trace,
+                                            state_dir=state_dir, rule_workers=rule_workers,
+                                            partition_by=partition_by)
+            except Exception as e:
+                traceback.print_exc(file=log)
+                summary['message'] = f"{type(e).__name__}: {e}"
+            finally:
+                if run_profile is not None:
+                    run_profile.write(output_dir)
+    except OSError as e:
+        summary['message'] = str(e)
+    summary.update(workbook=input_file, output_dir=output_dir, seconds=round(time.perf_counter() - start, 2))
+    return summary
+
+def write_run_summary(summaries, path):
+    """Combined summary of a headless run as CSV (UTF-8 with BOM, so Excel shows the Chinese text)."""
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RUN_SUMMARY_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(summaries)
+
+def run_workbooks(patterns, output_dir='.', output_template='输出数据.xlsx', workers=None, profile=False,
+                  chunk_rows=None, incremental=False, trace=None, load_workers=None, state_dir=None,
+                  rule_workers=None, partition_by='门店编码'):
+    """
+    Headless run over many workbooks (paths or glob patterns), each written to its own
+    sub-directory of output_dir. Workbooks are processed concurrently by `workers` processes
+    (None = one per workbook, up to the CPU count), largest first; the output template is read
+    once and shared. Writes the combined summary (RUN_SUMMARY_FILE) and returns the
+    per-workbook summaries in input order. chunk_rows: stream each hours sheet (see filter_bonus_chunked).
+    incremental: reuse each workbook's previous decisions in its sub-directory (see filter_bonus_data).
+    trace: employee_trace.EmployeeTrace applied to every workbook (trace files go to its sub-directory).
+    load_workers: processes parsing the sheets of each workbook when workbooks are processed one
+        at a time (None = automatic); with several workbook processes each parses in-process.
+    state_dir: month-over-month state (see filter_bonus_data); each workbook keeps its own state in
+        the sub-directory of state_dir named like its output sub-directory.
+    rule_workers / partition_by: partitioned rule evaluation of each workbook (see filter_bonus_data),
+        like load_workers only when workbooks are processed one at a time.
+    """
+    paths = expand_inputs(patterns)
+    if not paths:
+        print("Error: No input workbooks.")
+        return []
+    try:
+        output_cols = template_columns(output_template)
+    except Exception as e:
+        print(f"Error loading template '{output_template}': {e}")
+        return []
+    os.makedirs(output_dir, exist_ok=True)
+    names = dict(zip(paths, output_names(paths)))
+    out_dirs = {path: os.path.join(output_dir, name) for path, name in names.items()}
+    state_dirs = {path: os.path.join(state_dir, name) if state_dir else None for path, name in names.items()}
+
+    if workers is None:
+        workers = min(len(paths), os.cpu_count() or 1)
+    workers = max(1, min(workers, len(paths)))
+    print(f"Processing {len(paths)} workbooks with {workers} worker processes...")
+    if workers > 1 and rule_workers and rule_workers > 1:
+        print("Warning: Partitioned evaluation is only used when workbooks are processed one at a time (-j 1).")
+
+    def report(summary):
+        line = (f"[{summary['status']}] {summary['workbook']}: {summary['eligible']} eligible, "
+                f"{summary['excluded']} excluded ({summary['seconds']}s)")
+        print(line + (f" - {summary['message']}" if summary['message'] else ''))
+
+    summaries = {}
+    if workers == 1:
+        # A single process: each workbook may still parse its sheets in a pool of its own
+        for path in paths:
+            summaries[path] = process_workbook(path, out_dirs[path], output_cols, profile, load_workers=load_workers,
+                                               chunk_rows=chunk_rows, incremental=incremental, trace=trace,
+                                               state_dir=state_dirs[path], rule_workers=rule_workers,
+                                               partition_by=partition_by)
+            report(summaries[path])
+    else:
+        order = sorted(paths, key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0, reverse=True)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(process_workbook, path, out_dirs[path], output_cols, profile,
+                                   chunk_rows=chunk_rows, incremental=incremental, trace=trace,
+                                   state_dir=state_dirs[path]): path
+                       for path in order}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    summaries[path] = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. out of memory)
+                    summaries[path] = {'workbook': path, 'status': 'error', 'eligible': 0, 'excluded': 0,
+                                       'seconds': None, 'output_dir': out_dirs[path],
+                                       'message': f"{type(e).__name__}: {e}"}
+                report(summaries[path])
+
+    results = [summaries[path] for path in paths]
+    summary_file = os.path.join(output_dir, RUN_SUMMARY_FILE)
+    write_run_summary(results, summary_file)
+    failed = sum(s['status'] == 'error' for s in results)
+    print(f"Done: {len(results) - failed} of {len(results)} workbooks processed, "
+          f"{sum(s['eligible'] for s in results)} eligible and {sum(s['excluded'] for s in results)} excluded rows. "
+          f"Summary written to {summary_file}")
+    return results
+
+def parse_args(argv=None, console=True):
+    """
+    Command-line arguments. console: whether a run without workbooks may use the interactive
+    prompt; when it may not (no terminal on stdin), the workbooks must be given.
+    """
+    parser = argparse.ArgumentParser(description='Filter bonus-eligible employees from 输入数据.xlsx.')
+    parser.add_argument('inputs', nargs='*',
+                        help='workbooks or glob patterns (e.g. "regions/*.xlsx") to process without prompting; '
+                             'without them 输入数据.xlsx in the working directory is processed')
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help='with inputs: directory receiving one sub-directory per workbook and the summary; '
+                             'with --months / --filter-sheet: directory receiving one sub-directory per scenario; '
+                             'with --watch: directory receiving the reports')
+    parser.add_argument('--template', default='输出数据.xlsx',
+                        help='with inputs or --watch: the output template (default: 输出数据.xlsx)')
+    parser.add_argument('-j', '--workers', type=int,
+                        help='with inputs: workbooks processed at once (default: one per CPU)')
+    parser.add_argument('--load-workers', type=int,
+                        help='processes parsing the sheets of a workbook (default: automatic, 1 = no pool)')
+    parser.add_argument('--chunk-rows', type=int,
+                        help='stream the hours sheet in batches of this many rows (for sheets too large for memory)')
+    parser.add_argument('--state-dir',
+                        help='month-over-month mode: the workbook holds only the bonus month\'s hours and new '
+                             'certificates, merged into the cumulative state kept in this directory '
+                             '(see python state_store.py STATE_DIR list / rollback YYYY-MM)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='reuse the previous run\'s decisions and report rows for employees and stores whose '
+                             'data did not change and list the employees whose result changed in 筛选变化.xlsx')
+    parser.add_argument('--trace-emp', action='append', default=[], metavar='工号',
+                        help='follow this employee through every stage and write 筛选追踪/<工号>.md '
+                             '(repeatable, or comma-separated)')
+    parser.add_argument('--trace-store', action='append', default=[], metavar='门店编码',
+                        help='trace every employee with hour rows in this store (repeatable, or comma-separated)')
+    parser.add_argument('--rule-workers', type=int,
+                        help='evaluate the rules and build the reports in this many processes, with the hour rows '
+                             'partitioned by --partition-by (for very large workbooks; with several inputs only with -j 1)')
+    parser.add_argument('--partition-by', choices=PARTITION_COLUMNS, default='门店编码',
+                        help='with --rule-workers: partition on a hash of 门店编码 (default) or one partition per 区域')
+    parser.add_argument('--months', action='append', default=[], metavar='YYYY-MM',
+                        help='scenario batch: evaluate these bonus months from one load of the workbooks given, '
+                             'each into its own sub-directory of -o (repeatable, or comma-separated)')
+    parser.add_argument('--filter-sheet', action='append', default=[], metavar='SHEET',
+                        help='scenario batch: evaluate each of these filter sheets (versions of 筛选条件) '
+                             '(repeatable, or comma-separated; default: 筛选条件)')
+    parser.add_argument('--watch', action='store_true',
+                        help='stay running: keep the parsed sheets in memory and re-run whenever the workbook '
+                             '(输入数据.xlsx, or the one given) or the template changes')
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help='with --watch: also answer HTTP/JSON requests on 127.0.0.1:PORT '
+                             '(GET /status, GET /results, POST /run)')
+    parser.add_argument('--poll', type=float, default=1.0, help='with --watch: seconds between file checks')
+    parser.add_argument('--profile', action='store_true',
+                        help='record per-stage time, rows and memory and write run_profile.json / .md')
+    parser.add_argument('--profile-dir', default='.', help='where the run profile is written (default: here)')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='with --profile: also trace Python allocations (slower)')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='with --profile: dump a cProfile of the slowest stage')
+    args = parser.parse_args(argv)
+    if args.months or args.filter_sheet:
+        # Scenario batches are headless: no prompt to fall back on
+        if not args.inputs:
+            parser.error("--months / --filter-sheet need the workbooks to evaluate, e.g. 输入数据.xlsx --months 2025-11")
+        unsupported = [flag for flag, value in [
+            ('--watch', args.watch), ('--serve', args.serve is not None), ('--chunk-rows', args.chunk_rows),
+            ('--incremental', args.incremental), ('--state-dir', args.state_dir), ('--rule-workers', args.rule_workers),
+            ('--trace-emp', args.trace_emp), ('--trace-store', args.trace_store), ('--profile', args.profile)] if value]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} cannot be combined with --months / --filter-sheet")
+    if args.watch or args.serve is not None:
+        # Resident mode keeps whole sheets in memory and watches a single workbook
+        if len(args.inputs) > 1:
+            parser.error("--watch / --serve take at most one workbook")
+        unsupported = [flag for flag, value in [
+            ('--chunk-rows', args.chunk_rows), ('-j', args.workers), ('--profile-memory', args.profile_memory),
+            ('--cprofile', args.cprofile)] if value]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} cannot be combined with --watch / --serve")
+    elif not console and not args.inputs:
+        parser.error("no workbook given: without a console the workbooks must be passed, e.g. 输入数据.xlsx")
+    return args
+
+def main(argv=None, args=None):
+    """
+    Returns the exit status: 1 when a workbook of a headless run failed (or resident mode could not start), 0 otherwise.
+    args: arguments already parsed by parse_args (argv is then not parsed).
+    """
+    if args is None:
+        args = parse_args(argv)
+    trace = None
+    if args.trace_emp or args.trace_store:
+        trace = EmployeeTrace([v for arg in args.trace_emp for v in arg.split(',')],
+                              [v for arg in args.trace_store for v in arg.split(',')])
+    if args.watch or args.serve is not None:
+        # Imported here: resident imports this module
+        from resident import run_resident
+        return run_resident(args.inputs[0] if args.inputs else '输入数据.xlsx', args.template, args.output_dir,
+                            port=args.serve, interval=args.poll, load_workers=args.load_workers,
+                            state_dir=args.state_dir, incremental=args.incremental, trace=trace,
+                            rule_workers=args.rule_workers, partition_by=args.partition_by,
+                            profile_dir=args.profile_dir if args.profile else None)
+    if args.months or args.filter_sheet:
+        months = [v for arg in args.months for v in arg.split(',') if v.strip()] or None
+        filter_sheets = [v for arg in args.filter_sheet for v in arg.split(',') if v.strip()] or ['筛选条件']
+        paths = expand_inputs(args.inputs)
+        # Several workbooks: each one's scenarios go to a sub-directory named after it
+        out_dirs = ([os.path.join(args.output_dir, name) for name in output_names(paths)]
+                    if len(paths) > 1 else [args.output_dir])
+        written = [filter_bonus_batch(months, filter_sheets, path, args.template, out_dir,
+                                      load_workers=args.load_workers)
+                   for path, out_dir in zip(paths, out_dirs)]
+        return 0 if paths and all(written) else 1
+    if args.inputs:
+        summaries = run_workbooks(args.inputs, args.output_dir, args.template, args.workers, args.profile,
+                                  args.chunk_rows, args.incremental, trace, args.load_workers, args.state_dir,
+                                  args.rule_workers, args.partition_by)
+        return 0 if summaries and all(s['status'] != 'error' for s in summaries) else 1
+
+    profile = RunProfile(trace_memory=args.profile_memory, cprofile=args.cprofile) if args.profile else None
+    try:
+        filter_bonus_data(load_workers=args.load_workers, state_dir=args.state_dir, profile=profile,
+                          chunk_rows=args.chunk_rows, incremental=args.incremental, trace=trace,
+                          rule_workers=args.rule_workers, partition_by=args.partition_by)
+    finally:
+        if profile is not None:
+            paths = profile.write(args.profile_dir)
+            print(f"Run profile written to {', '.join(paths)}")
+    return 0
 
 if __name__ == "__main__":
+    # Required for the process pool in the PyInstaller-built exe on Windows
+    multiprocessing.freeze_support()
+    # Workbooks on the command line mean a headless run (e.g. a nightly batch): no prompt at
+    # the end, and the exit status tells the scheduler whether every workbook went through.
+    # Resident mode runs until interrupted and does not prompt either.
+    args = parse_args(console=sys.stdin is not None and sys.stdin.isatty())
+    if args.inputs or args.watch or args.serve is not None:
+        sys.exit(main(args=args))
     try:
-        filter_bonus_data()
+        main(args=args)
     except Exception as e:
-        import traceback
         traceback.print_exc()
     finally:
         input("\nPress Enter to exit...")
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+def compile_filter(df_filter, columns):
+    """
+    Compile the rows of the '筛选条件' sheet into hash-join groups.
+
+    A data row passes if, for at least one filter row, it equals that row's value in every
+    one of `columns` where the filter row is non-empty. Filter rows sharing the same set of
+    non-empty columns form one group, returned as {column tuple: DataFrame of their values}.
+    A filter row that is empty in all of `columns` yields the group () and matches everything.
+    """
+    rows = df_filter.dropna(how='all')[columns]
+    pattern = rows.notna()
+    # One group per distinct set of non-empty columns (the filter sheet has only a few rows)
+    members_of = {}
+    for label, key in zip(rows.index, map(tuple, pattern.to_numpy())):
+        members_of.setdefault(key, []).append(label)
+    groups = {}
+    for key, members in members_of.items():
+        cols = tuple(col for col, present in zip(columns, key) if present)
+        groups[cols] = rows.loc[members, list(cols)].reset_index(drop=True)
+    return groups
+
+def _filter_vocabulary(values, data_col):
+    """Distinct filter values as an object Index, coerced like '==' would against data_col."""
+    values = pd.Series(values, dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(data_col):
+        # Comparing a datetime column with a string parses the string as a date
+        values = values.map(lambda v: pd.to_datetime(v, errors='coerce') if isinstance(v, str) else v)
+    return values
+
+def _encode(data_col, vocab):
+    """Position of every value of data_col in vocab (-1 if absent); categoricals are looked up once per category."""
+    if isinstance(data_col.dtype, pd.CategoricalDtype):
+        positions = vocab.get_indexer(data_col.cat.categories.to_numpy(dtype=object))
+        return np.append(positions, -1)[data_col.cat.codes.to_numpy()]
+    return vocab.get_indexer(data_col.to_numpy(dtype=object))
+
+def match_filter(df, groups):
+    """
+    Boolean mask (numpy array) of the rows of df selected by compile_filter groups.
+    Each group is one multi-key semi-join: values are encoded against the group's value
+    vocabulary per column and the combined keys are looked up in a hash set.
+    """
+    n = len(df)
+    mask = np.zeros(n, dtype=bool)
+    for cols, values in groups.items():
+        if not cols:
+            return np.ones(n, dtype=bool)
+
+        n_filter = len(values)
+        filter_key = np.zeros(n_filter, dtype=np.int64)
+        data_key = np.zeros(n, dtype=np.int64)
+        filter_ok = np.ones(n_filter, dtype=bool)
+        data_ok = np.ones(n, dtype=bool)
+        for col in cols:
+            filter_values = _filter_vocabulary(values[col], df[col])
+            # Values that cannot be compared (e.g. an unparseable date) never match
+            filter_ok &= filter_values.notna().to_numpy()
+            vocab = pd.Index(pd.unique(filter_values[filter_ok].to_numpy()), dtype=object)
+            filter_codes = vocab.get_indexer(filter_values.to_numpy())
+            data_codes = _encode(df[col], vocab)
+            data_ok &= data_codes >= 0
+            filter_key = filter_key * (len(vocab) + 1) + filter_codes + 1
+            data_key = data_key * (len(vocab) + 1) + data_codes + 1
+            # Re-number the combined keys so they stay small however many columns are joined
+            codes, _ = pd.factorize(np.concatenate([filter_key, data_key]))
+            filter_key, data_key = codes[:n_filter], codes[n_filter:]
+
+        mask |= data_ok & np.isin(data_key, filter_key[filter_ok])
+    return mask
+
+def available_filter_columns(df_hours, main_sheet_name, ref_frames, joins):
+    """
+    Every '<sheet>-<column>' name a filter header can refer to: the main sheet's columns plus the
+    columns of each reference sheet that can be joined (both join keys exist).
+    joins: [(sheet name, hours key column, sheet key column), ...]; ref_frames: {sheet name: DataFrame}.
+    """
+    names = [f'{main_sheet_name}-{col}' for col in df_hours.columns]
+    for sheet_name, left_key, right_key in joins:
+        df_ref = ref_frames[sheet_name]
+        if left_key in df_hours.columns and right_key in df_ref.columns:
+            names += [f'{sheet_name}-{col}' for col in df_ref.columns]
+    return names
+
+def build_filter_frame(df_hours, main_sheet_name, ref_frames, joins, columns):
+    """
+    Frame holding only the filter `columns` ('<sheet>-<column>' names), one row per hour row and
+    matching reference row, plus '_row' (position of the hour row in df_hours).
+    Only the reference sheets that `columns` refer to are joined (left join on the keys from
+    `joins`), and only with their key and referenced columns.
+    """
+    needed = set(columns)
+    out = pd.DataFrame({'_row': np.arange(len(df_hours))})
+
+    for sheet_name, left_key, right_key in joins:
+        df_ref = ref_frames[sheet_name]
+        if left_key not in df_hours.columns or right_key not in df_ref.columns:
+            continue
+        cols = [col for col in df_ref.columns if f'{sheet_name}-{col}' in needed]
+        if not cols:
+            continue
+        right = df_ref[list(dict.fromkeys([right_key] + cols))].add_prefix(f'{sheet_name}-')
+        right_on = f'{sheet_name}-{right_key}'
+        out['_key'] = df_hours[left_key].iloc[out['_row'].to_numpy()].reset_index(drop=True)
+        out = out.merge(right, left_on='_key', right_on=right_on, how='left')
+        out = out.drop(columns=['_key'] + ([right_on] if right_key not in cols else []))
+
+    rows = out['_row'].to_numpy()
+    for col in df_hours.columns:
+        name = f'{main_sheet_name}-{col}'
+        if name in needed:
+            out[name] = df_hours[col].iloc[rows].reset_index(drop=True)
+    return out
+
+def match_hour_rows(df_hours, main_sheet_name, ref_frames, joins, df_filter, columns):
+    """
+    Boolean mask over df_hours: rows matching the '筛选条件' rows on `columns`.
+    An hour row joined to several reference rows (duplicate keys) passes if any of them matches.
+    """
+    frame = build_filter_frame(df_hours, main_sheet_name, ref_frames, joins, columns)
+    matched = match_filter(frame, compile_filter(df_filter, columns))
+    return np.bincount(frame['_row'].to_numpy()[matched], minlength=len(df_hours)) > 0
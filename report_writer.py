@@ -0,0 +1,330 @@
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from xlsx_reader import column_letters
+
+# Rows turned into sheet XML at a time. Each chunk is compressed into the zip as soon as it is
+# built, so memory stays bounded by one chunk however long the report is.
+CHUNK_ROWS = 20000
+
+# Below this many cells in total, starting a worker process costs more than it saves,
+# so the reports are written one after the other.
+PARALLEL_MIN_CELLS = 2000000
+
+EXCEL_EPOCH = pd.Timestamp(1899, 12, 30)
+
+# Cell style indexes in STYLES_XML
+HEADER_STYLE = 1  # bold, thin borders, centered (like pandas' to_excel header)
+DATE_STYLE = 2  # yyyy-mm-dd
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{sheet_overrides}'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sst_override}'
+    '</Types>')
+SHEET_OVERRIDE_XML = ('<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                      'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>')
+SST_OVERRIDE_XML = ('<Override PartName="/xl/sharedStrings.xml" '
+                    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>')
+
+ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>')
+
+WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets>'
+    '</workbook>')
+WORKBOOK_SHEET_XML = '<sheet name="{name}" sheetId="{n}" r:id="rId{n}"/>'
+
+WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheet_rels}'
+    '<Relationship Id="rIdStyles" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '{sst_rel}'
+    '</Relationships>')
+SHEET_REL_XML = ('<Relationship Id="rId{n}" '
+                 'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                 'Target="worksheets/sheet{n}.xml"/>')
+SST_REL_XML = ('<Relationship Id="rIdStrings" '
+               'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" '
+               'Target="sharedStrings.xml"/>')
+
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd"/></numFmts>'
+    '<fonts count="2">'
+    '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '</fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>'
+    '</borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" applyFont="1" applyBorder="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="top"/></xf>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>')
+
+SHEET_HEAD_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '{dimension}<sheetData>')
+DIMENSION_XML = '<dimension ref="{ref}"/>'
+SHEET_TAIL_XML = '</sheetData></worksheet>'
+
+# Characters XML 1.0 cannot carry; Excel stores them as _xHHHH_
+_CONTROL_CHARS = r'[\x00-\x08\x0b\x0c\x0e-\x1f]'
+
+def _escape_texts(texts):
+    """XML-escape a Series of strings."""
+    texts = texts.str.replace('&', '&amp;', regex=False).str.replace('<', '&lt;', regex=False) \
+        .str.replace('>', '&gt;', regex=False)
+    if texts.str.contains(_CONTROL_CHARS, regex=True).any():
+        texts = texts.str.replace(_CONTROL_CHARS, lambda m: f'_x{ord(m.group(0)):04X}_', regex=True)
+    return texts
+
+def _text_cells(texts, strings=None):
+    """
+    Cell XML tails for a Series of strings: inline strings, or with `strings` ({text: index}, grown
+    as new texts appear) references into the workbook's shared-string table.
+    """
+    if strings is None:
+        return ' t="inlineStr"><is><t xml:space="preserve">' + _escape_texts(texts) + '</t></is></c>'
+    codes, uniques = pd.factorize(texts)
+    ids = np.array([strings.setdefault(u, len(strings)) for u in np.asarray(uniques, dtype=object)] + [0])
+    return ' t="s"><v>' + pd.Series(ids[codes], index=texts.index).astype(str) + '</v></c>'
+
+def _date_serials(values):
+    """Excel serial numbers (1900 date system) of a datetime64 Series."""
+    serials = (values.dt.tz_localize(None) if values.dt.tz is not None else values) - EXCEL_EPOCH
+    serials = serials / pd.Timedelta(days=1)
+    # Excel counts a non-existent 1900-02-29, so serials before 1900-03-01 are one lower
+    return serials.where(serials >= 61, serials - 1)
+
+def _value_kind(value):
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return 'number'
+    if isinstance(value, (datetime, date, np.datetime64)):
+        return 'date'
+    return 'text'
+
+def _object_cells(values, strings=None):
+    """Cell XML tails for distinct Python values of mixed types, each kind of value formatted in bulk."""
+    values = pd.Series(values, dtype=object)
+    kinds = values.map(_value_kind)
+    tails = np.full(len(values), '', dtype=object)
+    for kind, subset in values.groupby(kinds, sort=False):
+        if kind == 'bool':
+            subset = subset.astype(bool)
+        elif kind == 'number':
+            subset = subset.astype(float)
+        elif kind == 'date':
+            subset = pd.to_datetime(subset)
+        else:
+            subset = subset.astype(str)
+        tails[kinds.to_numpy() == kind] = _cell_tails(subset, strings)
+    return tails
+
+def _cell_tails(s, strings=None):
+    """For every value of a column: cell XML after '<c r="..."', or '' for an empty cell."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # Each category in use is formatted once
+        s = s.cat.remove_unused_categories()
+        return np.append(_cell_tails(pd.Series(s.cat.categories), strings), '')[s.cat.codes.to_numpy()]
+    missing = s.isna().to_numpy()
+    if s.dtype == object:
+        # Object columns holding a single kind of value take the vectorised paths below
+        kind = pd.api.types.infer_dtype(s, skipna=True)
+        if kind in ('floating', 'integer', 'mixed-integer-float'):
+            s = s.astype(float)
+        elif kind == 'string':
+            s = s.astype(str)
+        elif kind in ('datetime', 'datetime64'):
+            s = pd.to_datetime(s)
+    if pd.api.types.is_bool_dtype(s):
+        tails = pd.Series(np.where(s.to_numpy(dtype=bool), ' t="b"><v>1</v></c>', ' t="b"><v>0</v></c>'), index=s.index)
+    elif pd.api.types.is_datetime64_any_dtype(s):
+        tails = f' s="{DATE_STYLE}"><v>' + _date_serials(s).astype(str) + '</v></c>'
+    elif pd.api.types.is_numeric_dtype(s):
+        missing = missing | ~np.isfinite(s.to_numpy(dtype=float, na_value=np.nan))
+        if s.dtype.kind == 'f' and s.dtype.itemsize < 8:
+            # Downcast floats (see sheet_schema) print their exact value, as a float64 would
+            s = s.astype(np.float64)
+        tails = '><v>' + s.astype(str) + '</v></c>'
+    elif pd.api.types.is_string_dtype(s) and s.dtype != object:
+        tails = _text_cells(s, strings)
+    else:
+        # Mixed Python values: format each distinct value once
+        codes, uniques = pd.factorize(s)
+        return np.append(_object_cells(uniques, strings), '')[codes]
+    return np.where(missing, '', tails.astype(object).to_numpy())
+
+def _sheet_rows(df, first_row, strings=None):
+    """Sheet XML of df's rows, numbered from first_row (texts shared through `strings` if given)."""
+    row_numbers = pd.Series(np.arange(first_row, first_row + len(df))).astype(str).to_numpy(dtype=object)
+    xml = '<row r="' + row_numbers + '">'
+    for c, col in enumerate(df.columns):
+        tails = _cell_tails(df.iloc[:, c], strings)
+        cells = '<c r="' + column_letters(c) + row_numbers + '"' + tails
+        xml = xml + np.where(tails == '', '', cells)
+    return ''.join((xml + '</row>').tolist())
+
+def _header_xml(columns):
+    names = _escape_texts(pd.Series([str(name) for name in columns], dtype=object))
+    return '<row r="1">' + ''.join(
+        f'<c r="{column_letters(c)}1" s="{HEADER_STYLE}" t="inlineStr"><is><t xml:space="preserve">{name}</t></is></c>'
+        for c, name in enumerate(names)) + '</row>'
+
+def _write_sheet(zf, part, df, strings):
+    n_rows, n_cols = df.shape
+    ref = f'A1:{column_letters(max(n_cols, 1) - 1)}{n_rows + 1}'
+    with zf.open(part, 'w', force_zip64=True) as sheet:
+        sheet.write((SHEET_HEAD_XML.format(dimension=DIMENSION_XML.format(ref=ref)) + _header_xml(df.columns)).encode('utf-8'))
+        for start in range(0, n_rows, CHUNK_ROWS):
+            chunk = df.iloc[start:start + CHUNK_ROWS]
+            sheet.write(_sheet_rows(chunk, start + 2, strings).encode('utf-8'))
+        sheet.write(SHEET_TAIL_XML.encode('utf-8'))
+
+def _write_shared_strings(zf, strings):
+    texts = _escape_texts(pd.Series(list(strings), dtype=object))
+    with zf.open('xl/sharedStrings.xml', 'w', force_zip64=True) as sst:
+        sst.write((f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                   f'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                   f'count="{len(texts)}" uniqueCount="{len(texts)}">').encode('utf-8'))
+        for start in range(0, len(texts), CHUNK_ROWS):
+            items = '<si><t xml:space="preserve">' + texts.iloc[start:start + CHUNK_ROWS] + '</t></si>'
+            sst.write(''.join(items.tolist()).encode('utf-8'))
+        sst.write(b'</sst>')
+
+def _write_package(zf, sheet_names, shared_strings=False):
+    """Every part of the package besides the sheets and shared strings (content types, relationships, styles)."""
+    sheet_names = _escape_texts(pd.Series([str(name) for name in sheet_names], dtype=object)).str.replace('"', '&quot;')
+    numbers = range(1, len(sheet_names) + 1)
+    zf.writestr('[Content_Types].xml', CONTENT_TYPES_XML.format(
+        sheet_overrides=''.join(SHEET_OVERRIDE_XML.format(n=n) for n in numbers),
+        sst_override=SST_OVERRIDE_XML if shared_strings else ''))
+    zf.writestr('_rels/.rels', ROOT_RELS_XML)
+    zf.writestr('xl/workbook.xml', WORKBOOK_XML.format(
+        sheets=''.join(WORKBOOK_SHEET_XML.format(name=name, n=n) for n, name in zip(numbers, sheet_names))))
+    zf.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS_XML.format(
+        sheet_rels=''.join(SHEET_REL_XML.format(n=n) for n in numbers),
+        sst_rel=SST_REL_XML if shared_strings else ''))
+    zf.writestr('xl/styles.xml', STYLES_XML)
+
+def write_workbook(sheets, path, shared_strings=False):
+    """
+    Write {sheet name: DataFrame} (without the index) to an xlsx file, one sheet after the other,
+    streaming each sheet's XML chunk by chunk.
+    Dates are written as real Excel dates shown as yyyy-mm-dd; missing values as empty cells.
+    The header rows are styled like pandas' to_excel (bold, bordered, centered).
+    shared_strings: store texts once in a shared-string table, like Excel does, instead of inline.
+    """
+    strings = {} if shared_strings else None
+
+    # Level 1 compression: most of the time otherwise goes into deflate, for little size gain
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for n, df in enumerate(sheets.values(), start=1):
+            _write_sheet(zf, f'xl/worksheets/sheet{n}.xml', df, strings)
+        if shared_strings:
+            # Written last: it holds every text of every sheet
+            _write_shared_strings(zf, strings)
+        _write_package(zf, list(sheets), shared_strings)
+
+def write_xlsx(df, path, sheet_name='Sheet1'):
+    """Write df (without its index) to a single-sheet xlsx file, see write_workbook."""
+    write_workbook({sheet_name: df}, path)
+
+class XlsxAppender:
+    """
+    Single-sheet xlsx written batch by batch, for reports too large to hold in memory at once:
+    append(df) streams df's rows (with `columns`, in that order) below the rows already written,
+    close() finishes the file. Cells are formatted like write_workbook's; as the row count is
+    not known up front, the sheet has no <dimension> element (Excel does not need it).
+    """
+
+    def __init__(self, path, columns, sheet_name='Sheet1'):
+        self.path = path
+        self.columns = list(columns)
+        self.sheet_name = sheet_name
+        self.rows = 0
+        self._zf = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1)
+        self._sheet = self._zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self._sheet.write((SHEET_HEAD_XML.format(dimension='') + _header_xml(self.columns)).encode('utf-8'))
+
+    def append(self, df):
+        df = df.reindex(columns=self.columns)
+        for start in range(0, len(df), CHUNK_ROWS):
+            chunk = df.iloc[start:start + CHUNK_ROWS]
+            self._sheet.write(_sheet_rows(chunk, self.rows + start + 2).encode('utf-8'))
+        self.rows += len(df)
+
+    def close(self):
+        if self._sheet is None:
+            return
+        self._sheet.write(SHEET_TAIL_XML.encode('utf-8'))
+        self._sheet.close()
+        self._sheet = None
+        _write_package(self._zf, [self.sheet_name])
+        self._zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_reports(reports, workers=None):
+    """
+    Write several (path, DataFrame) reports, concurrently when worthwhile.
+
+    workers: number of processes; None uses one per report (up to the CPU count) when the
+        reports are large and writes them one after the other otherwise. 1 never starts a pool.
+    The largest report is written in this process while worker processes write the others.
+    """
+    reports = sorted(reports, key=lambda item: item[1].size, reverse=True)
+    if workers is None:
+        total_cells = sum(df.size for _, df in reports)
+        workers = min(len(reports), os.cpu_count() or 1) if total_cells >= PARALLEL_MIN_CELLS else 1
+    workers = max(1, min(workers, len(reports)))
+
+    if workers == 1:
+        for path, df in reports:
+            write_xlsx(df, path)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers - 1) as pool:
+        futures = [pool.submit(write_xlsx, df, path) for path, df in reports[1:]]
+        write_xlsx(reports[0][1], reports[0][0])
+        for future in futures:
+            future.result()
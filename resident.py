@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import filter_bonus_data as fbd
+from run_profile import RunProfile
+from warm_cache import WarmCache
+
+# Seconds between two checks of the watched files
+DEFAULT_POLL_SECONDS = 1.0
+DEFAULT_HOST = '127.0.0.1'
+
+# Reports served by GET /results?report=...: position in the reports of a run
+REPORT_NAMES = {'eligible': 0, 'excluded': 1}
+
+class ResidentSession:
+    """
+    Runs filter_bonus_data repeatedly in one process, keeping the parsed sheets and the indexes
+    built from them in memory (see warm_cache.WarmCache).
+
+    Only sheets whose XML part changed since the previous run are parsed again, and the
+    aggregated hours, certificate index and reference lookups are rebuilt only when their
+    sheets changed, so an edit to '筛选条件' or the template re-runs just the filter, rule and
+    output stages. Runs are serialized: the file watcher and the HTTP endpoint share one session.
+
+    state_dir, incremental, trace, rule_workers and partition_by are passed to every run of
+    filter_bonus_data; with profile_dir, each run's profile is written there (run_profile.json / .md).
+    """
+
+    def __init__(self, input_file='输入数据.xlsx', output_template='输出数据.xlsx', output_dir='', load_workers=None,
+                 write_workers=1, state_dir=None, incremental=False, trace=None, rule_workers=None,
+                 partition_by='门店编码', profile_dir=None):
+        self.input_file = input_file
+        self.output_template = output_template
+        self.output_dir = output_dir
+        self.load_workers = load_workers
+        self.write_workers = write_workers
+        self.state_dir = state_dir
+        self.incremental = incremental
+        self.trace = trace
+        self.rule_workers = rule_workers
+        self.partition_by = partition_by
+        self.profile_dir = profile_dir
+        self.warm = WarmCache()
+        self.lock = threading.Lock()
+        self.runs = 0
+        self.last = None
+        self.ran_signature = None
+        self.pending_signature = None
+
+    def signature(self):
+        """(size, mtime) of the watched files; None for a file that does not exist (yet)."""
+        sig = []
+        for path in (self.input_file, self.output_template):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_size, st.st_mtime_ns))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def run(self, trigger='request'):
+        """One run of the filter on the current files. Returns its summary (filter_bonus_data's, plus timing)."""
+        with self.lock:
+            self.ran_signature = self.signature()
+            self.runs += 1
+            start = time.perf_counter()
+            self.warm.begin_run()
+            profile = RunProfile() if self.profile_dir is not None else None
+            try:
+                summary = fbd.filter_bonus_data(self.input_file, self.output_template, self.output_dir,
+                                                load_workers=self.load_workers, write_workers=self.write_workers,
+                                                state_dir=self.state_dir, profile=profile, warm=self.warm,
+                                                incremental=self.incremental, trace=self.trace,
+                                                rule_workers=self.rule_workers, partition_by=self.partition_by)
+            except Exception as e:
+                traceback.print_exc()
+                summary = {'status': 'error', 'eligible': 0, 'excluded': 0, 'files': [],
+                           'message': f"{type(e).__name__}: {e}"}
+            finally:
+                if profile is not None:
+                    profile.write(self.profile_dir)
+            reused = list(self.warm.reused)
+            # Frames of sheets replaced in this run are no longer needed
+            self.warm.release_unused()
+            if summary['status'] == 'error':
+                # The next run starts from the files, not from reports of an older version of them
+                self.warm.keep_reports([])
+            seconds = time.perf_counter() - start
+            self.last = dict(summary, run=self.runs, trigger=trigger, seconds=round(seconds, 3),
+                             finished=time.strftime('%Y-%m-%d %H:%M:%S'), reused=reused)
+            print(f"Run {self.runs} ({trigger}) finished in {seconds:.2f}s: {summary['status']}, "
+                  f"{summary['eligible']} eligible, {summary['excluded']} excluded"
+                  + (f" - {summary['message']}" if summary['message'] else '')
+                  + (f" (reused from the previous run: {', '.join(reused)})" if reused else ''))
+            return self.last
+
+    def poll(self):
+        """
+        Run if a watched file changed since the last run and has stopped changing (same size and
+        mtime on two checks in a row, so a workbook still being saved is not read). Returns the
+        run's summary, or None.
+        """
+        sig = self.signature()
+        if sig == self.ran_signature or None in sig:
+            self.pending_signature = None
+            return None
+        if sig != self.pending_signature:
+            self.pending_signature = sig
+            return None
+        self.pending_signature = None
+        return self.run('file change')
+
+    def watch(self, interval=DEFAULT_POLL_SECONDS):
+        """Run now, then again whenever the input workbook or the template changes (until interrupted)."""
+        print(f"Watching {self.input_file} and {self.output_template} for changes (Ctrl+C to stop)...")
+        self.run('start')
+        while True:
+            time.sleep(interval)
+            self.poll()
+
+    def status(self):
+        return {
+            'input_file': os.path.abspath(self.input_file),
+            'output_template': os.path.abspath(self.output_template),
+            'output_dir': os.path.abspath(self.output_dir or '.'),
+            'runs': self.runs,
+            'running': self.lock.locked(),
+            'cached_sheets': len(self.warm.frames),
+            'last_run': self.last,
+        }
+
+    def report_rows(self, name):
+        """Rows of a report of the last run as JSON-ready records (empty if the run did not produce it)."""
+        reports = self.warm.reports
+        position = REPORT_NAMES[name]
+        if position >= len(reports):
+            return []
+        return json.loads(reports[position][1].to_json(orient='records', force_ascii=False, date_format='iso'))
+
+def make_handler(session):
+    """
+    HTTP handler class for a session. Endpoints (JSON, UTF-8):
+      GET  /status                   files, run count and the last run's summary
+      GET  /results?report=eligible  rows of 筛选结果 of the last run (report=excluded: 筛选排除原因)
+      POST /run                      run now (waits for a run in progress) and return its summary
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/status':
+                self._send(200, session.status())
+            elif url.path == '/results':
+                name = parse_qs(url.query).get('report', ['eligible'])[0]
+                if name not in REPORT_NAMES:
+                    self._send(400, {'error': f"Unknown report '{name}'. Use one of {list(REPORT_NAMES)}."})
+                    return
+                with session.lock:
+                    rows = session.report_rows(name)
+                    run = session.last['run'] if session.last else None
+                self._send(200, {'report': name, 'run': run, 'rows': rows})
+            else:
+                self._send(404, {'error': f"Unknown path '{url.path}'"})
+
+        def do_POST(self):
+            if urlparse(self.path).path == '/run':
+                self._send(200, session.run('http'))
+            else:
+                self._send(404, {'error': f"Unknown path '{self.path}'"})
+
+        def _send(self, code, payload):
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Keep the console for the runs' own output
+            pass
+
+    return Handler
+
+def serve(session, port, host=DEFAULT_HOST):
+    """Start the HTTP endpoint for a session in a background thread. Returns the server (call shutdown() to stop)."""
+    server = ThreadingHTTPServer((host, port), make_handler(session))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving on http://{host}:{server.server_address[1]} (GET /status, GET /results, POST /run)")
+    return server
+
+def run_resident(input_file='输入数据.xlsx', output_template='输出数据.xlsx', output_dir='', port=None,
+                 interval=DEFAULT_POLL_SECONDS, host=DEFAULT_HOST, **options):
+    """
+    Resident mode: watch the files and re-run on change, optionally serving HTTP on port. Returns the exit status.
+    options: further ResidentSession arguments (load_workers, state_dir, incremental, trace, ...).
+    """
+    session = ResidentSession(input_file, output_template, output_dir, **options)
+    server = None
+    try:
+        if port is not None:
+            server = serve(session, port, host)
+        session.watch(interval)
+    except KeyboardInterrupt:
+        print("Stopped.")
+    except OSError as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        if server is not None:
+            server.shutdown()
+    return 0
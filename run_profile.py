@@ -0,0 +1,215 @@
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 * 1024
+
+PROFILE_JSON = 'run_profile.json'
+PROFILE_MARKDOWN = 'run_profile.md'
+
+def current_rss_mb():
+    """Resident set size of this process in MB (the peak so far where the current one cannot be read)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / MB
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        return peak / (MB if sys.platform == 'darwin' else 1024)
+    return None
+
+class StageRecord:
+    """Measurements of one stage; the stage body sets rows_out and may add entries to details."""
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.details = {}
+        self.wall = self.cpu = 0.0
+        self.rss_before = self.rss_after = None
+        self.alloc_delta = self.alloc_peak = None
+
+    def as_dict(self):
+        rss_delta = (self.rss_after - self.rss_before
+                     if self.rss_after is not None and self.rss_before is not None else None)
+        record = {
+            'stage': self.name,
+            'wall_seconds': round(self.wall, 4),
+            'cpu_seconds': round(self.cpu, 4),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rss_mb': _round(self.rss_after),
+            'rss_delta_mb': _round(rss_delta),
+        }
+        if self.alloc_peak is not None:
+            record['alloc_delta_mb'] = _round(self.alloc_delta)
+            record['alloc_peak_mb'] = _round(self.alloc_peak)
+        if self.details:
+            record['details'] = self.details
+        return record
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+class _NullRecord:
+    """Stand-in record for runs without profiling: attribute writes are simply dropped."""
+
+    def __setattr__(self, name, value):
+        pass
+
+    @property
+    def details(self):
+        return {}
+
+_NULL_RECORD = _NullRecord()
+
+class NullProfile:
+    """Profile used when --profile is off: every stage is a no-op context."""
+    enabled = False
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None):
+        yield _NULL_RECORD
+
+class RunProfile:
+    """
+    Per-stage wall time, CPU time, rows in/out and RSS change of one run, reported as JSON and
+    Markdown by write().
+
+    trace_memory: also trace Python allocations with tracemalloc (allocated and peak MB per stage);
+        this slows the run down noticeably, so it is a separate switch.
+    cprofile: run every stage under cProfile and dump the slowest stage's profile.
+    """
+    enabled = True
+
+    def __init__(self, trace_memory=False, cprofile=False):
+        self.trace_memory = trace_memory
+        self.cprofile = cprofile
+        self.stages = []
+        self.profiles = {}
+        self.started = time.time()
+        self.info = {}
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None):
+        record = StageRecord(name, rows_in)
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            alloc_start = tracemalloc.get_traced_memory()[0]
+        profiler = cProfile.Profile() if self.cprofile else None
+        record.rss_before = current_rss_mb()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.profiles[name] = profiler
+            record.wall = time.perf_counter() - wall_start
+            record.cpu = time.process_time() - cpu_start
+            record.rss_after = current_rss_mb()
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record.alloc_delta = (current - alloc_start) / MB
+                record.alloc_peak = (peak - alloc_start) / MB
+            self.stages.append(record)
+
+    def slowest(self):
+        return max(self.stages, key=lambda record: record.wall) if self.stages else None
+
+    def report(self):
+        total = sum(record.wall for record in self.stages)
+        slowest = self.slowest()
+        return {
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+            'total_wall_seconds': round(total, 4),
+            'slowest_stage': slowest.name if slowest else None,
+            'peak_rss_mb': _round(max((r.rss_after for r in self.stages if r.rss_after is not None), default=None)),
+            'trace_memory': self.trace_memory,
+            **self.info,
+            'stages': [record.as_dict() for record in self.stages],
+        }
+
+    def markdown(self, report, cprofile_text=None):
+        lines = [f"# Run profile ({report['started']})", '',
+                 f"Total {report['total_wall_seconds']:.2f}s, slowest stage: **{report['slowest_stage']}**, "
+                 f"peak RSS {report['peak_rss_mb']} MB", '']
+        for key, value in self.info.items():
+            lines.append(f"- {key}: {value}")
+        if self.info:
+            lines.append('')
+        header = '| stage | wall s | cpu s | rows in | rows out | RSS MB | RSS Δ MB |'
+        if self.trace_memory:
+            header += ' alloc Δ MB | alloc peak MB |'
+        lines += [header, '|' + ' --- |' * (header.count('|') - 1)]
+        for record in report['stages']:
+            row = (f"| {record['stage']} | {record['wall_seconds']:.3f} | {record['cpu_seconds']:.3f} | "
+                   f"{_cell(record['rows_in'])} | {_cell(record['rows_out'])} | {_cell(record['rss_mb'])} | "
+                   f"{_cell(record['rss_delta_mb'])} |")
+            if self.trace_memory:
+                row += f" {_cell(record.get('alloc_delta_mb'))} | {_cell(record.get('alloc_peak_mb'))} |"
+            lines.append(row)
+        for record in report['stages']:
+            for key, value in record.get('details', {}).items():
+                lines += ['', f"## {record['stage']}: {key}", '']
+                if isinstance(value, dict) and all(isinstance(v, dict) for v in value.values()):
+                    columns = list(dict.fromkeys(k for v in value.values() for k in v))
+                    lines += ['| name | ' + ' | '.join(columns) + ' |', '|' + ' --- |' * (len(columns) + 1)]
+                    for name, v in value.items():
+                        lines.append(f"| {name} | " + ' | '.join(_cell(v.get(c)) for c in columns) + ' |')
+                else:
+                    lines.append(f"{value}")
+        if cprofile_text:
+            lines += ['', f"## cProfile of the slowest stage ({report['slowest_stage']})", '', '```', cprofile_text.rstrip(), '```']
+        return '\n'.join(lines) + '\n'
+
+    def write(self, out_dir='.'):
+        """Write run_profile.json / run_profile.md (and run_profile_<stage>.prof) to out_dir. Returns the paths."""
+        os.makedirs(out_dir, exist_ok=True)
+        report = self.report()
+        paths = []
+        cprofile_text = None
+        slowest = self.slowest()
+        if slowest is not None and slowest.name in self.profiles:
+            prof_path = os.path.join(out_dir, f'run_profile_{slowest.name}.prof')
+            self.profiles[slowest.name].dump_stats(prof_path)
+            paths.append(prof_path)
+            report['cprofile_dump'] = prof_path
+            text = io.StringIO()
+            pstats.Stats(self.profiles[slowest.name], stream=text).sort_stats('cumulative').print_stats(25)
+            cprofile_text = text.getvalue()
+
+        json_path = os.path.join(out_dir, PROFILE_JSON)
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        md_path = os.path.join(out_dir, PROFILE_MARKDOWN)
+        with open(md_path, 'w', encoding='utf-8') as f:
+            f.write(self.markdown(report, cprofile_text))
+        if self.trace_memory:
+            tracemalloc.stop()
+        return [json_path, md_path] + paths
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return f'{value:.3f}' if abs(value) < 100 else f'{value:.1f}'
+    return str(value)
@@ -0,0 +1,297 @@
+import argparse
+import re
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+
+# Only the standard library is imported here: probing a workbook reads workbook.xml, the
+# first row of each sheet and the shared strings those cells use, and is done long before
+# (or instead of) loading pandas and the sheet data.
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# What filter_bonus_data() needs from the input workbook; checked by check_workbook before loading.
+# The hours sheet is the first of HOURS_SHEETS present. Columns not listed here are optional:
+# a missing one is left blank in the results or skips the rule that uses it.
+HOURS_SHEETS = ['工时数据', '累计工时']
+REQUIRED_COLUMNS = {
+    'hours': ['工号'],
+    '过岗数据': ['工号', '证书名称', '状态'],
+    '基本数据': ['工号'],
+    '门店负责人': ['部门编号'],
+    '门店状态表': [],
+}
+OPTIONAL_SHEETS = ['花名册']
+
+# Bytes read per step while looking for the end of the header row
+PROBE_CHUNK = 1 << 16
+
+class _HeaderDone(Exception):
+    """Raised by the parser handlers once the header row is complete."""
+
+def column_index(letters):
+    """'A' -> 0, 'AB' -> 27"""
+    idx = 0
+    for ch in letters:
+        idx = idx * 26 + (ord(ch) - 64)
+    return idx - 1
+
+def workbook_sheet_parts(zf):
+    """Map sheet names to their worksheet XML part inside an opened xlsx zip (in workbook order)."""
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    rels = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    targets = {}
+    for rel in rels.iter(f'{{{NS_PKG_REL}}}Relationship'):
+        target = rel.get('Target', '')
+        # Targets are usually relative to xl/, but some writers use absolute '/xl/...' paths
+        if target.startswith('/'):
+            target = target.lstrip('/')
+        else:
+            target = 'xl/' + target
+        targets[rel.get('Id')] = target
+
+    parts = {}
+    for sheet in workbook.iter(f'{{{NS_MAIN}}}sheet'):
+        parts[sheet.get('name')] = targets.get(sheet.get(f'{{{NS_REL}}}id'))
+    return parts
+
+def uses_1904_dates(zf):
+    """Whether an opened xlsx zip counts date serials from 1904-01-01 (workbookPr date1904) instead of 1899-12-30."""
+    workbook = ET.fromstring(zf.read('xl/workbook.xml'))
+    pr = workbook.find(f'{{{NS_MAIN}}}workbookPr')
+    return pr is not None and pr.get('date1904') in ('1', 'true')
+
+def header_names(header):
+    """Column names the way pandas derives them from the header row: blanks become 'Unnamed: i', duplicates get '.1', '.2'."""
+    if not header:
+        return {}
+    names = {}
+    seen = {}
+    for c in range(max(header) + 1):
+        name = header.get(c, '')
+        if name == '' or name is None:
+            name = f'Unnamed: {c}'
+        if name in seen:
+            seen[name] += 1
+            new_name = f'{name}.{seen[name]}'
+            while new_name in seen:
+                seen[name] += 1
+                new_name = f'{name}.{seen[name]}'
+            seen[new_name] = 0
+            name = new_name
+        else:
+            seen[name] = 0
+        names[c] = name
+    return names
+
+def _header_cells(f):
+    """
+    {column index: (cell type, raw text)} of the first row of a worksheet XML stream.
+    Parsing stops at the first tag of the second row, so only the head of the part is read.
+    """
+    cells = {}
+    state = {'row': -1, 'col': -1, 'type': None, 'text': None, 'capture': False, 'rph': False}
+    chunk = f.read(PROBE_CHUNK)
+    m = re.search(rb'<(\w+:)?worksheet[\s>]', chunk)
+    prefix = m.group(1).decode() if m and m.group(1) else ''
+    tag_c, tag_v, tag_t, tag_row, tag_rph, tag_sheet_data = (
+        prefix + name for name in ('c', 'v', 't', 'row', 'rPh', 'sheetData'))
+
+    def start(tag, attrs):
+        if tag == tag_row:
+            r = attrs.get('r')
+            state['row'] = int(r) - 1 if r else state['row'] + 1
+            state['col'] = -1
+            if state['row'] > 0:
+                raise _HeaderDone
+        elif tag == tag_c:
+            ref = attrs.get('r')
+            state['col'] = column_index(ref.rstrip('0123456789')) if ref else state['col'] + 1
+            state['type'] = attrs.get('t')
+            state['text'] = None
+        elif tag == tag_v:
+            state['capture'] = True
+        elif tag == tag_t:
+            state['capture'] = not state['rph']
+        elif tag == tag_rph:
+            state['rph'] = True
+
+    def chars(data):
+        if state['capture']:
+            state['text'] = data if state['text'] is None else state['text'] + data
+
+    def end(tag):
+        if tag == tag_c:
+            if state['row'] == 0 and state['text'] is not None:
+                cells[state['col']] = (state['type'], state['text'])
+        elif tag == tag_v or tag == tag_t:
+            state['capture'] = False
+        elif tag == tag_rph:
+            state['rph'] = False
+        elif tag == tag_sheet_data:
+            raise _HeaderDone
+
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = chars
+    try:
+        while chunk:
+            parser.Parse(chunk, False)
+            chunk = f.read(PROBE_CHUNK)
+        parser.Parse(b'', True)
+    except _HeaderDone:
+        pass
+    return cells
+
+def read_shared_strings(zf, count=None):
+    """The shared-strings table of an opened xlsx zip; only its first `count` entries when given (the rest is not parsed)."""
+    strings = []
+    if count == 0 or 'xl/sharedStrings.xml' not in set(zf.namelist()):
+        return strings
+    with zf.open('xl/sharedStrings.xml') as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == f'{{{NS_MAIN}}}si':
+                # Rich text is split over several <r><t> runs; phonetic hints (<rPh>) are not part of the value
+                texts = []
+                for child in elem:
+                    if child.tag == f'{{{NS_MAIN}}}t':
+                        texts.append(child.text or '')
+                    elif child.tag == f'{{{NS_MAIN}}}r':
+                        texts.extend(t.text or '' for t in child.iter(f'{{{NS_MAIN}}}t'))
+                strings.append(''.join(texts))
+                elem.clear()
+                if count is not None and len(strings) >= count:
+                    break
+    return strings
+
+def _cell_value(cell_type, text, sst):
+    """Header cell value as read_excel names the column (date-formatted numbers stay numbers)."""
+    if cell_type == 's':
+        index = int(text)
+        return sst[index] if index < len(sst) else ''
+    if cell_type is None or cell_type == 'n':
+        number = float(text)
+        return int(number) if number.is_integer() else number
+    if cell_type == 'b':
+        return bool(int(text))
+    return text
+
+def probe_workbook(path, sheet_names=None):
+    """
+    Sheet names and header row of an xlsx workbook without loading any data rows.
+    Returns {sheet name: [column names]} in workbook order, with the names pd.read_excel would give
+    the columns; sheet_names limits the probe to those sheets (names missing from the workbook are left out).
+    """
+    with zipfile.ZipFile(path) as zf:
+        parts = workbook_sheet_parts(zf)
+        names = set(zf.namelist())
+        cells = {}
+        for name, part in parts.items():
+            if sheet_names is not None and name not in sheet_names:
+                continue
+            if part in names:
+                with zf.open(part) as f:
+                    cells[name] = _header_cells(f)
+            else:
+                cells[name] = {}
+        # Only the shared strings up to the last one a header uses are decoded
+        needed = [int(text) + 1 for sheet in cells.values() for t, text in sheet.values() if t == 's']
+        sst = read_shared_strings(zf, max(needed, default=0))
+    return {name: list(header_names({c: _cell_value(t, text, sst) for c, (t, text) in sheet.items()}).values())
+            for name, sheet in cells.items()}
+
+def template_headers(path):
+    """Headers of the first sheet of a workbook (what pd.read_excel(path, nrows=0) returns as columns)."""
+    headers = probe_workbook(path)
+    if not headers:
+        raise ValueError(f"No worksheet found in '{path}'")
+    return next(iter(headers.values()))
+
+def check_workbook(headers, filter_sheets=('筛选条件',)):
+    """
+    Preflight check of a probed workbook (see probe_workbook) against what filter_bonus_data() needs.
+    Returns a dict with 'main_sheet' (hours sheet used, None if there is none), 'errors' (problems
+    that stop the run) and 'warnings' (the run continues without the missing part).
+    """
+    errors = []
+    warnings = []
+    main_sheet = next((name for name in HOURS_SHEETS if name in headers), None)
+    if main_sheet is None:
+        errors.append("Could not find '工时数据' or '累计工时' sheet.")
+
+    for sheet_name in filter_sheets:
+        if sheet_name not in headers:
+            errors.append(f"Worksheet named '{sheet_name}' not found")
+    for sheet_name, cols in REQUIRED_COLUMNS.items():
+        if sheet_name == 'hours':
+            sheet_name = main_sheet
+            if sheet_name is None:
+                continue
+        if sheet_name not in headers:
+            errors.append(f"Worksheet named '{sheet_name}' not found")
+            continue
+        missing = [col for col in cols if col not in headers[sheet_name]]
+        if missing:
+            errors.append(f"Missing columns in '{sheet_name}': {missing}")
+    for sheet_name in OPTIONAL_SHEETS:
+        if sheet_name not in headers:
+            warnings.append(f"Could not find '{sheet_name}' sheet. Fallback logic will be skipped.")
+
+    if '门店状态表' in headers and not {'ERP门店编码', '门店编码'} & set(headers['门店状态表']):
+        warnings.append(f"Could not find 'ERP门店编码' in '门店状态表'. Available: {headers['门店状态表']}")
+
+    # Filter headers name their column as '<sheet>-<column>'; unknown ones are ignored by the filter
+    for sheet_name in filter_sheets:
+        for header in headers.get(sheet_name, []):
+            ref_sheet, sep, col = str(header).partition('-')
+            if sep and ref_sheet in headers and col not in headers[ref_sheet]:
+                warnings.append(f"Filter column '{header}' of '{sheet_name}': '{ref_sheet}' has no column '{col}'.")
+    return {'main_sheet': main_sheet, 'errors': errors, 'warnings': warnings}
+
+def main(argv=None):
+    """Print the sheets and headers of a workbook (and a template) and the preflight result; exit code 1 on errors."""
+    parser = argparse.ArgumentParser(description="List the sheets and headers of the input workbook and check "
+                                                 "that everything the bonus filter needs is there, without loading data.")
+    parser.add_argument('workbook', nargs='?', default='输入数据.xlsx', help="Input workbook (default: 输入数据.xlsx)")
+    parser.add_argument('--template', help="Also list the headers of this output template")
+    parser.add_argument('--sheet', action='append', help="Only list this sheet (repeatable)")
+    parser.add_argument('--filter-sheet', action='append', help="Filter sheet(s) to check (default: 筛选条件)")
+    args = parser.parse_args(argv)
+
+    try:
+        headers = probe_workbook(args.workbook)
+    except (OSError, KeyError, zipfile.BadZipFile, ET.ParseError) as e:
+        print(f"Error reading {args.workbook}: {e}")
+        return 1
+    print(f"Sheet Names: {list(headers)}")
+    for name, cols in headers.items():
+        if args.sheet is None or name in args.sheet:
+            print(f"--- Sheet: {name} ---")
+            print(cols)
+    if args.template:
+        try:
+            print(f"--- Template: {args.template} ---")
+            print(template_headers(args.template))
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile, ET.ParseError) as e:
+            print(f"Error reading {args.template}: {e}")
+            return 1
+
+    result = check_workbook(headers, tuple(args.filter_sheet or ('筛选条件',)))
+    print()
+    if result['main_sheet']:
+        print(f"Using main data sheet: {result['main_sheet']}")
+    for message in result['warnings']:
+        print(f"Warning: {message}")
+    for message in result['errors']:
+        print(f"Error: {message}")
+    if not result['errors']:
+        print("Preflight check passed.")
+    return 1 if result['errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
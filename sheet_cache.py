@@ -0,0 +1,430 @@
+import hashlib
+import io
+import json
+import os
+import time
+import zipfile
+from datetime import date, datetime, time as dt_time
+
+import numpy as np
+import pandas as pd
+
+from xlsx_reader import uses_1904_dates, workbook_sheet_parts
+
+# Bump this whenever the per-sheet preprocessing (ID normalization, date parsing,
+# compact dtypes) or the cache format changes, so frames cached by an older version of the tool are never reused.
+CACHE_VERSION = 5
+
+CACHE_DIR_NAME = '.sheet_cache'
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = 'manifest.lock'
+
+# Manifest updates are serialized through LOCK_NAME; a lock older than this is left over from a crashed run.
+LOCK_TIMEOUT = 30
+LOCK_STALE_SECONDS = 120
+# Files no entry references are only swept once they are this old, so frames another run has
+# written but not yet recorded in the manifest are left alone.
+ORPHAN_GRACE_SECONDS = 3600
+
+# Eviction limits: total size of all cached frames, and days since last use.
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 30
+
+def file_sha1(path, chunk_size=1024 * 1024):
+    """Content hash of a file, read in chunks."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _load_manifest(cache_dir):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == CACHE_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'version': CACHE_VERSION, 'workbooks': {}, 'entries': {}}
+
+def _save_manifest(cache_dir, manifest):
+    # Write to a temp file first so a crashed run never leaves a half-written manifest
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _acquire_lock(cache_dir, timeout=LOCK_TIMEOUT):
+    """Create the manifest lock file, waiting for other runs to release it. Returns its path, or None on timeout."""
+    path = os.path.join(cache_dir, LOCK_NAME)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode('ascii'))
+            os.close(fd)
+            return path
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > LOCK_STALE_SECONDS:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+        if time.time() > deadline:
+            return None
+        time.sleep(0.05)
+
+def _merge_manifest(disk, manifest, cache_dir):
+    """
+    Fold what this run recorded into the manifest currently on disk, so entries written by
+    runs that finished in the meantime are kept. Entries whose file another run evicted are dropped.
+    """
+    for key, entry in manifest['entries'].items():
+        current = disk['entries'].get(key)
+        if current is None:
+            if os.path.exists(os.path.join(cache_dir, entry['file'])):
+                disk['entries'][key] = entry
+        else:
+            current['last_used'] = max(current.get('last_used', 0), entry.get('last_used', 0))
+    for sha, rec in manifest['workbooks'].items():
+        current = disk['workbooks'].get(sha)
+        if current is None:
+            disk['workbooks'][sha] = rec
+        else:
+            sheets = {**current.get('sheets', {}), **rec.get('sheets', {})}
+            cols = {**current.get('columns', {}), **rec.get('columns', {})}
+            current.update(rec)
+            current.update(sheets=sheets, columns=cols)
+    return disk
+
+def sweep_orphans(cache_dir, manifest, grace_seconds=ORPHAN_GRACE_SECONDS):
+    """Remove cache files no manifest entry references (left by crashed or concurrent runs)."""
+    keep = {MANIFEST_NAME, LOCK_NAME} | {e['file'] for e in manifest['entries'].values()}
+    now = time.time()
+    removed = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name in keep or not os.path.isfile(path):
+            continue
+        try:
+            if now - os.path.getmtime(path) > grace_seconds:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        print(f"Sheet cache: removed {removed} unreferenced files.")
+
+def _encode_value(v):
+    """One value of an object column as type-tagged text (see _decode_value); None stays None."""
+    if v is None:
+        return None
+    if isinstance(v, str):
+        return 's:' + v
+    if v is pd.NaT:
+        return 'N:'
+    if isinstance(v, (bool, np.bool_)):
+        return f'b:{bool(v)}'
+    if isinstance(v, (int, np.integer)):
+        return f'i:{int(v)}'
+    if isinstance(v, (float, np.floating)):
+        return 'f:' + repr(float(v))
+    if isinstance(v, pd.Timestamp):
+        return 'T:' + v.isoformat()
+    if isinstance(v, datetime):
+        return 'd:' + v.isoformat()
+    if isinstance(v, date):
+        return 'D:' + v.isoformat()
+    if isinstance(v, dt_time):
+        return 'h:' + v.isoformat()
+    raise ValueError(f'{type(v).__name__} values')
+
+_DECODERS = {'s': str, 'N': lambda text: pd.NaT, 'b': lambda text: text == 'True', 'i': int, 'f': float,
+             'T': pd.Timestamp, 'd': datetime.fromisoformat, 'D': date.fromisoformat, 'h': dt_time.fromisoformat}
+
+def _decode_value(text):
+    # Missing values (stored None) read back as None or NaN depending on the string dtype
+    if not isinstance(text, str):
+        return None
+    if text[:1] not in _DECODERS:
+        raise ValueError(f'unknown cached value {text[:20]!r}')
+    return _DECODERS[text[0]](text[2:])
+
+def _round_trip(df):
+    """df written to Parquet in memory and read back."""
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return pd.read_parquet(buffer)
+
+def _write_frame(df, base_path):
+    """
+    Store a frame as Parquet. Returns (file name, column names, positions of the object columns).
+    Columns are stored as '0', '1', ... and named again on reading, as headers need not be text.
+    Object columns (mixed values such as 'PD0001' and 1003) would come back as numbers or text,
+    so their values are stored as type-tagged text and decoded on reading. Frames that cannot be
+    stored exactly raise ValueError, and the sheet is parsed again on the next run.
+    Only Parquet is written: the cache sits next to the workbook, often on a shared folder,
+    and a pickle planted there would run code when loaded.
+    """
+    columns = list(df.columns)
+    try:
+        json.dumps(columns)
+    except TypeError:
+        raise ValueError('column names are not plain values')
+    objects = [i for i, dtype in enumerate(df.dtypes) if dtype == object]
+    df = df.set_axis([str(i) for i in range(len(columns))], axis=1)
+    if objects:
+        df = df.assign(**{str(i): pd.Series([_encode_value(v) for v in df[str(i)]], index=df.index, dtype=object)
+                          for i in objects})
+    path = base_path + '.parquet'
+    try:
+        # Whether a column keeps its dtype does not depend on its values once object columns are text
+        if list(_round_trip(df.iloc[:0]).dtypes.astype(str)) != list(df.dtypes.astype(str)):
+            raise ValueError('column types change in Parquet')
+        df.to_parquet(path, index=False)
+    except (ImportError, NotImplementedError, TypeError, ValueError) as e:
+        # pyarrow missing, unsupported column types, ... (pyarrow's errors derive from these)
+        if os.path.exists(path):
+            os.remove(path)
+        raise ValueError(str(e).splitlines()[0] if str(e) else type(e).__name__) from e
+    return os.path.basename(path), columns, objects
+
+def _read_frame(path, columns, objects):
+    df = pd.read_parquet(path)
+    if len(df.columns) != len(columns):
+        raise ValueError(f'{os.path.basename(path)} does not match its manifest entry')
+    if objects:
+        df = df.assign(**{str(i): pd.Series([_decode_value(v) for v in df[str(i)]], index=df.index, dtype=object)
+                          for i in objects})
+    return df.set_axis(columns, axis=1)
+
+def _sst_bounds(sst_bytes):
+    """
+    Offsets of the first <si> and the end of the last </si> in the shared-strings part.
+    The header in front (count/uniqueCount attributes) changes on every save, so it is left out.
+    """
+    start = sst_bytes.find(b'<si')
+    end = sst_bytes.rfind(b'</si>')
+    if start < 0 or end < 0:
+        return 0, 0
+    return start, end + len(b'</si>')
+
+def _part_key(sheet_name, zf, part, styles_crc, date1904, columns):
+    # date1904 moves every date serial of the sheet by four years without touching its XML
+    info = zf.getinfo(part)
+    raw = f'{CACHE_VERSION}|{sheet_name}|{part}|{info.CRC}|{info.file_size}|{styles_crc}|{date1904}|{columns}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def evict_stale_entries(cache_dir, manifest, max_bytes=DEFAULT_MAX_BYTES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+    """Drop entries unused for more than max_age_days, then least recently used ones until under max_bytes."""
+    entries = manifest['entries']
+    now = time.time()
+    doomed = {k for k, e in entries.items() if now - e.get('last_used', 0) > max_age_days * 86400}
+
+    remaining = sorted((e.get('last_used', 0), k) for k, e in entries.items() if k not in doomed)
+    total = sum(entries[k].get('bytes', 0) for _, k in remaining)
+    for _, k in remaining:
+        if total <= max_bytes:
+            break
+        total -= entries[k].get('bytes', 0)
+        doomed.add(k)
+
+    for k in doomed:
+        try:
+            os.remove(os.path.join(cache_dir, entries[k]['file']))
+        except OSError:
+            pass
+        del entries[k]
+
+    # Forget workbook records that point at evicted entries
+    for sha, rec in list(manifest['workbooks'].items()):
+        if any(k not in entries for k in rec.get('sheets', {}).values()):
+            del manifest['workbooks'][sha]
+
+    if doomed:
+        print(f"Sheet cache: evicted {len(doomed)} stale entries.")
+
+def read_sheets_cached(workbook_path, sheet_names, read_sheets, columns=None, cache_dir=None,
+                       max_bytes=DEFAULT_MAX_BYTES, max_age_days=DEFAULT_MAX_AGE_DAYS, memory=None, versions=None):
+    """
+    Load the requested sheets of a workbook, reusing preprocessed frames from a cache next to it.
+
+    read_sheets(names) is called once with every sheet that is not cached yet and must return
+    {sheet_name: fully preprocessed DataFrame (normalized IDs, parsed dates)} to be stored.
+    columns: optional {sheet_name: column list} that read_sheet loads; part of the cache key,
+    so a sheet is re-read when the pipeline needs different columns from it.
+    Sheets missing from the workbook are not returned.
+    memory: optional in-memory store of frames by entry key (get(key) / put(key, df), see
+    warm_cache.WarmCache) checked before the cache files, for processes that run many times.
+    versions: optional dict that receives {sheet_name: content version} for the returned sheets that
+    have a cache entry: equal versions mean the same preprocessed frame, so callers can tell which
+    sheets changed since an earlier run without comparing the frames.
+
+    Cache lookup is done in two steps:
+      1. Whole workbook: file size + mtime, or its content hash, matches a previous run
+         -> every sheet comes straight from the cache without opening the xlsx.
+      2. Per sheet: the CRC of the sheet's XML part (plus styles) matches and the shared-strings
+         entries that existed when it was cached are unchanged -> only that sheet is reused.
+         This keeps edits to '筛选条件' from forcing a re-parse of the big sheets.
+    """
+    workbook_path = os.path.abspath(workbook_path)
+    columns = {name: sorted(map(str, cols)) for name, cols in (columns or {}).items() if name in sheet_names}
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(workbook_path), CACHE_DIR_NAME)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Warning: Sheet cache disabled ({e}).")
+        cache_dir = None
+
+    manifest = _load_manifest(cache_dir) if cache_dir else {'version': CACHE_VERSION, 'workbooks': {}, 'entries': {}}
+    entries = manifest['entries']
+
+    def load(key):
+        """Frame of a cache entry, from memory when it holds it."""
+        df = memory.get(key) if memory is not None else None
+        if df is None:
+            entry = entries[key]
+            df = _read_frame(os.path.join(cache_dir, entry['file']), entry['columns'], entry['objects'])
+            if memory is not None:
+                memory.put(key, df)
+        return df
+
+    st = os.stat(workbook_path)
+    now = time.time()
+
+    # --- Step 1: whole-workbook fingerprint ---
+    wb_sha = None
+    for sha, rec in manifest['workbooks'].items():
+        if rec.get('path') == workbook_path and rec.get('size') == st.st_size and rec.get('mtime_ns') == st.st_mtime_ns:
+            wb_sha = sha
+            break
+    if wb_sha is None:
+        wb_sha = file_sha1(workbook_path)
+
+    rec = manifest['workbooks'].get(wb_sha)
+    if rec and all(k in entries for k in rec['sheets'].values()) and all(
+            rec.get('columns', {}).get(name) == cols for name, cols in columns.items()):
+        try:
+            frames = {}
+            for name in sheet_names:
+                if name in rec['sheets']:
+                    frames[name] = load(rec['sheets'][name])
+                    entries[rec['sheets'][name]]['last_used'] = now
+            if all(name in rec['sheets'] or name not in rec['sheet_names'] for name in sheet_names):
+                rec.update(path=workbook_path, size=st.st_size, mtime_ns=st.st_mtime_ns)
+                _record_versions(versions, entries, {name: rec['sheets'][name] for name in frames})
+                print(f"Loaded {len(frames)} sheets from cache (workbook unchanged).")
+                _finish(cache_dir, manifest, max_bytes, max_age_days)
+                return frames
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read sheet cache ({e}). Re-parsing workbook.")
+
+    # --- Step 2: per-sheet part fingerprints ---
+    sheet_keys = {}
+    with zipfile.ZipFile(workbook_path) as zf:
+        parts = workbook_sheet_parts(zf)
+        names = set(zf.namelist())
+        styles_crc = zf.getinfo('xl/styles.xml').CRC if 'xl/styles.xml' in names else 0
+        date1904 = uses_1904_dates(zf)
+        sst = zf.read('xl/sharedStrings.xml') if 'xl/sharedStrings.xml' in names else b''
+        for name in sheet_names:
+            if parts.get(name) in names:
+                sheet_keys[name] = _part_key(name, zf, parts[name], styles_crc, date1904, columns.get(name))
+    sst_start, sst_end = _sst_bounds(sst)
+
+    frames = {}
+    hits = []
+    misses = []
+    for name, key in sheet_keys.items():
+        entry = entries.get(key)
+        if entry is not None and cache_dir:
+            # The sheet XML only stores indexes into the shared strings; make sure the strings
+            # that existed when this entry was written are still the same.
+            end = sst_start + entry['sst_len']
+            if end <= len(sst) and hashlib.sha1(sst[sst_start:end]).hexdigest() == entry['sst_digest']:
+                try:
+                    frames[name] = load(key)
+                    entry['last_used'] = now
+                    hits.append(name)
+                    continue
+                except (OSError, ValueError):
+                    pass
+        misses.append(name)
+
+    parsed = read_sheets(misses) if misses else {}
+    for name in misses:
+        df = parsed[name]
+        key = sheet_keys[name]
+        frames[name] = df
+        if memory is not None:
+            memory.put(key, df)
+        if cache_dir:
+            try:
+                file_name, frame_columns, objects = _write_frame(df, os.path.join(cache_dir, key))
+                entries[key] = {
+                    'sheet': name,
+                    'file': file_name,
+                    'columns': frame_columns,
+                    'objects': objects,
+                    'bytes': os.path.getsize(os.path.join(cache_dir, file_name)),
+                    'sst_len': sst_end - sst_start,
+                    'sst_digest': hashlib.sha1(sst[sst_start:sst_end]).hexdigest(),
+                    'created': now,
+                    'last_used': now,
+                }
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not write sheet cache for '{name}' ({e}).")
+
+    if hits:
+        print(f"Loaded {len(hits)} unchanged sheets from cache: {hits}")
+    if cache_dir:
+        _record_versions(versions, entries, sheet_keys)
+
+    if cache_dir and all(k in entries for k in sheet_keys.values()):
+        # Merge with what earlier calls recorded for this workbook (sheets can be loaded in several calls)
+        rec = manifest['workbooks'].setdefault(wb_sha, {'sheets': {}, 'columns': {}})
+        rec.update(path=workbook_path, size=st.st_size, mtime_ns=st.st_mtime_ns, sheet_names=list(parts))
+        rec['sheets'].update(sheet_keys)
+        rec.setdefault('columns', {}).update(columns)
+
+    _finish(cache_dir, manifest, max_bytes, max_age_days)
+    return frames
+
+def _record_versions(versions, entries, keys):
+    """Content version of every sheet in keys ({sheet_name: entry key}) with a cache entry: key plus shared-strings digest."""
+    if versions is None:
+        return
+    for name, key in keys.items():
+        entry = entries.get(key)
+        if entry is not None:
+            versions[name] = f"{key}:{entry['sst_len']}:{entry['sst_digest']}"
+
+def _finish(cache_dir, manifest, max_bytes, max_age_days):
+    if not cache_dir:
+        return
+    try:
+        lock = _acquire_lock(cache_dir)
+    except OSError as e:
+        print(f"Warning: Could not update sheet cache manifest ({e}).")
+        return
+    if lock is None:
+        print("Warning: Sheet cache manifest is locked by another run; not recording this run's sheets.")
+        return
+    try:
+        # Re-read under the lock: another run may have saved its entries since this one loaded the manifest
+        manifest = _merge_manifest(_load_manifest(cache_dir), manifest, cache_dir)
+        evict_stale_entries(cache_dir, manifest, max_bytes, max_age_days)
+        _save_manifest(cache_dir, manifest)
+        sweep_orphans(cache_dir, manifest)
+    except OSError as e:
+        print(f"Warning: Could not update sheet cache manifest ({e}).")
+    finally:
+        try:
+            os.remove(lock)
+        except OSError:
+            pass
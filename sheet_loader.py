@@ -0,0 +1,79 @@
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from xlsx_reader import XlsxReader, workbook_sheet_parts
+
+# Below this much uncompressed sheet XML, starting worker processes (each importing
+# pandas) costs more than it saves, so sheets are parsed in-process.
+PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+
+# One reader per worker process, reused across tasks so shared strings and
+# styles are decoded once per worker rather than once per sheet. Its zip handle is
+# closed after every task: an open handle keeps the workbook locked on Windows.
+_worker_readers = {}
+
+def _load_sheet_worker(path, sheet_name, usecols, prepare):
+    """(parsed frame, seconds spent parsing and preparing it)."""
+    start = time.perf_counter()
+    reader = _worker_readers.get(path)
+    if reader is None:
+        reader = _worker_readers[path] = XlsxReader(path)
+    else:
+        reader.reopen()
+    try:
+        df = reader.read_sheet(sheet_name, usecols=usecols)
+    finally:
+        reader.close()
+    if prepare is not None:
+        df = prepare(sheet_name, df)
+    return df, time.perf_counter() - start
+
+def load_sheets(path, sheet_names, usecols=None, prepare=None, workers=None, timings=None):
+    """
+    Parse several sheets of one workbook, concurrently in a process pool when worthwhile.
+
+    usecols: optional {sheet_name: column list} passed to XlsxReader.read_sheet.
+    prepare(sheet_name, df): optional preprocessing run in the worker (ID normalization,
+        date parsing), so the parent only receives finished frames. Must be picklable
+        (a module-level function).
+    workers: number of processes; None picks one per sheet (up to the CPU count) for large
+        workbooks and parses in-process for small ones. 1 always parses in-process.
+    timings: optional dict that receives {sheet_name: seconds spent parsing + preparing it}.
+
+    The first sheet in sheet_names (the main hours sheet) is submitted first and the rest
+    largest first, so the biggest parse starts immediately and the load phase approaches
+    the cost of that one sheet.
+    """
+    usecols = usecols or {}
+    with zipfile.ZipFile(path) as zf:
+        parts = workbook_sheet_parts(zf)
+        sizes = {name: zf.getinfo(parts[name]).file_size for name in sheet_names}
+    order = sheet_names[:1] + sorted(sheet_names[1:], key=lambda name: sizes[name], reverse=True)
+
+    if workers is None:
+        workers = min(len(order), os.cpu_count() or 1) if sum(sizes.values()) >= PARALLEL_MIN_BYTES else 1
+    workers = max(1, min(workers, len(order)))
+
+    if workers == 1:
+        with XlsxReader(path) as reader:
+            frames = {}
+            for name in order:
+                start = time.perf_counter()
+                df = reader.read_sheet(name, usecols=usecols.get(name))
+                frames[name] = prepare(name, df) if prepare is not None else df
+                if timings is not None:
+                    timings[name] = time.perf_counter() - start
+            return frames
+
+    print(f"Parsing {len(order)} sheets with {workers} worker processes...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(_load_sheet_worker, path, name, usecols.get(name), prepare)
+                   for name in order}
+        frames = {}
+        for name, future in futures.items():
+            frames[name], seconds = future.result()
+            if timings is not None:
+                timings[name] = seconds
+        return frames
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# Compact dtype of the known columns of each sheet, applied once at load time (see apply_schema)
+# and kept through filtering and joins:
+#   CATEGORY: low-cardinality text (titles, regions, certificate names, statuses) held as a
+#       categorical, so comparisons, isin and joins work on its integer codes
+#   NUMBER: numbers downcast to the smallest dtype that holds every value exactly (int32, float32, ...)
+# '工号' stays an Arrow-backed string (normalized by prepare_sheet): nearly every value is
+# distinct, so a categorical would not save anything. Dates are datetime64 (see SHEET_DATE_COLUMNS);
+# columns not listed here keep the dtype the reader gave them.
+CATEGORY = 'category'
+NUMBER = 'number'
+
+HOURS_SCHEMA = {
+    '区域': CATEGORY, '区经理': CATEGORY, '职位名称': CATEGORY,
+    '门店编码': NUMBER, '考勤工时': NUMBER, '总工时': NUMBER,
+}
+SHEET_SCHEMA = {
+    '工时数据': HOURS_SCHEMA,
+    '累计工时': HOURS_SCHEMA,
+    '过岗数据': {'证书名称': CATEGORY, '状态': CATEGORY},
+    '基本数据': {'第三方公司': CATEGORY, '职位': CATEGORY, '工作地区': CATEGORY},
+    '门店负责人': {'部门编号': NUMBER},
+    '门店状态表': {'ERP门店编码': NUMBER, '门店编码': NUMBER, '品牌': CATEGORY},
+    '花名册': {'第三方公司': CATEGORY, '工作城市': CATEGORY, '职位': CATEGORY},
+}
+
+# Text columns with more distinct values than this share of their rows are left as strings
+MAX_CATEGORY_SHARE = 0.5
+
+def compact_text(s):
+    """Categorical version of a string column with few distinct values (s unchanged otherwise)."""
+    if s.dtype == object or not pd.api.types.is_string_dtype(s.dtype) or s.empty:
+        # Mixed Python values keep their exact types
+        return s
+    if s.nunique(dropna=False) > len(s) * MAX_CATEGORY_SHARE:
+        return s
+    return s.astype('category')
+
+def compact_number(s):
+    """Numeric column downcast without changing any value (s unchanged if nothing smaller fits)."""
+    if s.dtype.kind == 'i':
+        return pd.to_numeric(s, downcast='integer')
+    if s.dtype.kind == 'f' and s.dtype.itemsize > 4:
+        narrow = s.astype(np.float32)
+        if ((narrow.to_numpy(dtype=np.float64) == s.to_numpy()) | s.isna().to_numpy()).all():
+            return narrow
+    return s
+
+def apply_schema(sheet_name, df):
+    """Convert the known columns of a loaded sheet to their compact dtypes (in place). Returns df."""
+    for col, kind in SHEET_SCHEMA.get(sheet_name, {}).items():
+        if col in df.columns:
+            df[col] = compact_text(df[col]) if kind == CATEGORY else compact_number(df[col])
+    return df
+
+def widened(s):
+    """64-bit version of a downcast numeric column, for sums and anything else that must not overflow."""
+    if s.dtype.kind == 'i' and s.dtype.itemsize < 8:
+        return s.astype(np.int64)
+    if s.dtype.kind == 'f' and s.dtype.itemsize < 8:
+        return s.astype(np.float64)
+    return s
+
+def decoded(s):
+    """A categorical column as plain values of its categories' dtype (other columns unchanged)."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.astype(s.cat.categories.dtype)
+    return s
@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from cert_index import FALLBACK_CERT_DATE
+
+# Bump this when the layout or meaning of the stored frames changes; a state directory
+# written by another version is refused rather than silently mixed with new months.
+STATE_VERSION = 1
+
+MANIFEST_NAME = 'manifest.json'
+
+# Files kept per bonus month ('YYYY-MM' directory):
+#   delta_hours / delta_certs: what that month's workbook contributed
+#   total_hours / certs: cumulative state up to and including that month (the snapshot)
+DELTA_HOURS = 'delta_hours.parquet'
+DELTA_CERTS = 'delta_certs.parquet'
+TOTAL_HOURS = 'total_hours.parquet'
+CERTS = 'certs.parquet'
+
+def month_key(month):
+    """'YYYY-MM' of a bonus month (datetime / Timestamp)."""
+    return pd.Timestamp(month).strftime('%Y-%m')
+
+def hours_delta(emp_agg_total):
+    """One month's '总工时' per '工号' (the workbook's aggregated hours) as a stored frame."""
+    return pd.DataFrame({'工号': emp_agg_total.index.astype(str),
+                         '总工时': pd.to_numeric(emp_agg_total.to_numpy(), errors='coerce')})
+
+def certs_delta(df_certs):
+    """
+    One month's valid certificates ('状态' == '有效') as the earliest '生效日期' per ('工号', '证书名称').
+    Records without a date are ignored; without a '生效日期' column every certificate gets
+    FALLBACK_CERT_DATE, like CertificateIndex does.
+    """
+    columns = ['工号', '证书名称', '生效日期']
+    if not {'工号', '证书名称', '状态'}.issubset(df_certs.columns):
+        return pd.DataFrame({col: pd.Series(dtype='datetime64[us]' if col == '生效日期' else str) for col in columns})
+    valid = df_certs[df_certs['状态'] == '有效']
+    if '生效日期' in valid.columns:
+        valid = valid[valid['生效日期'].notna()]
+        dates = pd.to_datetime(valid['生效日期'])
+    else:
+        dates = pd.Series(FALLBACK_CERT_DATE, index=valid.index)
+    delta = pd.DataFrame({'工号': valid['工号'].astype(str), '证书名称': valid['证书名称'].astype(str),
+                          '生效日期': dates.astype('datetime64[us]')})
+    return _min_dates(delta)
+
+def _sum_hours(frame):
+    return frame.groupby('工号', sort=True)['总工时'].sum().reset_index()
+
+def _min_dates(frame):
+    return frame.groupby(['工号', '证书名称'], sort=True)['生效日期'].min().reset_index()
+
+def _digest(*frames):
+    """Content hash of the delta frames (already sorted by their keys), used to spot re-submitted months."""
+    h = hashlib.sha1()
+    for frame in frames:
+        h.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+class BonusStateStore:
+    """
+    Per-employee state carried from one bonus month to the next, under state_dir:
+    cumulative '总工时' and the earliest valid date of every certificate.
+
+    Each month's workbook then only needs that month's hour rows and new certificate records;
+    merge_month() adds them to the previous month's snapshot, so a run costs the same however
+    long the history is. Re-submitting a month that was already merged replaces its
+    contribution (later months are rebuilt on top of it); rollback() returns to an earlier snapshot.
+
+    Certificates only accumulate: a certificate that later becomes invalid stays in the state
+    until the months that contributed it are rolled back and merged again.
+    """
+
+    def __init__(self, state_dir):
+        self.state_dir = os.path.abspath(state_dir)
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        path = os.path.join(self.state_dir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return {'version': STATE_VERSION, 'months': {}}
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != STATE_VERSION:
+            raise ValueError(f"State directory '{self.state_dir}' was written by state version "
+                             f"{manifest.get('version')}, expected {STATE_VERSION}")
+        return manifest
+
+    def _save_manifest(self):
+        # Write to a temp file first so a crashed run never leaves a half-written manifest
+        path = os.path.join(self.state_dir, MANIFEST_NAME)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    def months(self):
+        """Bonus months in the state, oldest first ('YYYY-MM')."""
+        return sorted(self.manifest['months'])
+
+    def _path(self, key, name):
+        return os.path.join(self.state_dir, key, name)
+
+    def _snapshot(self, key):
+        """(total hours, certificate dates) frames after month `key`, or empty frames before the first month."""
+        if key is None:
+            return (pd.DataFrame({'工号': pd.Series(dtype=str), '总工时': pd.Series(dtype=float)}),
+                    certs_delta(pd.DataFrame()))
+        return pd.read_parquet(self._path(key, TOTAL_HOURS)), pd.read_parquet(self._path(key, CERTS))
+
+    def _build_snapshot(self, key, previous):
+        """Snapshot of month `key` = snapshot of `previous` + the deltas of `key`."""
+        total, certs = self._snapshot(previous)
+        delta_total = pd.read_parquet(self._path(key, DELTA_HOURS))
+        delta_certs = pd.read_parquet(self._path(key, DELTA_CERTS))
+        _sum_hours(pd.concat([total, delta_total], ignore_index=True)).to_parquet(self._path(key, TOTAL_HOURS), index=False)
+        _min_dates(pd.concat([certs, delta_certs], ignore_index=True)).to_parquet(self._path(key, CERTS), index=False)
+
+    def merge_month(self, month, emp_agg_total, df_certs):
+        """
+        Merge one bonus month into the state and return its cumulative view:
+        (total '总工时' per '工号' as a Series, certificate frame for CertificateIndex).
+
+        emp_agg_total: that month's '总工时' per '工号'; df_certs: that month's '过岗数据' records.
+        A month already merged with the same data is not merged again.
+        """
+        key = month_key(month)
+        delta_total = hours_delta(emp_agg_total).sort_values('工号', ignore_index=True)
+        delta_certs = certs_delta(df_certs)
+        digest = _digest(delta_total, delta_certs)
+
+        months = self.months()
+        record = self.manifest['months'].get(key)
+        if record is not None and record['digest'] == digest:
+            print(f"State: month {key} already merged with the same data, reusing its snapshot.")
+        else:
+            if record is not None:
+                print(f"State: month {key} was merged before with different data, replacing it.")
+            os.makedirs(os.path.join(self.state_dir, key), exist_ok=True)
+            delta_total.to_parquet(self._path(key, DELTA_HOURS), index=False)
+            delta_certs.to_parquet(self._path(key, DELTA_CERTS), index=False)
+
+            # Rebuild this month's snapshot and every later one on top of it
+            months = sorted(set(months) | {key})
+            start = months.index(key)
+            for i in range(start, len(months)):
+                self._build_snapshot(months[i], months[i - 1] if i else None)
+            self.manifest['months'][key] = {'digest': digest, 'merged': time.time(),
+                                            'employees': len(delta_total), 'certificates': len(delta_certs)}
+            self._save_manifest()
+            later = months[start + 1:]
+            print(f"State: merged month {key} ({len(delta_total)} employees, {len(delta_certs)} certificates)"
+                  + (f"; rebuilt later months {later}." if later else "."))
+
+        total, certs = self._snapshot(key)
+        certs = certs.assign(状态='有效')
+        return total.set_index('工号')['总工时'], certs
+
+    def rollback(self, month):
+        """Forget every month after `month` ('YYYY-MM' or a date), so its snapshot becomes the latest state."""
+        key = month if isinstance(month, str) else month_key(month)
+        if key not in self.manifest['months']:
+            raise ValueError(f"Month {key} is not in the state (known: {self.months()})")
+        dropped = [m for m in self.months() if m > key]
+        for m in dropped:
+            del self.manifest['months'][m]
+        # Manifest first: a crash in between leaves orphan directories, never a manifest pointing at nothing
+        self._save_manifest()
+        for m in dropped:
+            shutil.rmtree(os.path.join(self.state_dir, m), ignore_errors=True)
+        return dropped
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inspect or roll back the month-over-month bonus state.')
+    parser.add_argument('state_dir')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='show the merged months')
+    rollback = sub.add_parser('rollback', help='drop every month after MONTH')
+    rollback.add_argument('month', help='YYYY-MM')
+    args = parser.parse_args(argv)
+
+    store = BonusStateStore(args.state_dir)
+    if args.command == 'list':
+        for key in store.months():
+            rec = store.manifest['months'][key]
+            merged = time.strftime('%Y-%m-%d %H:%M', time.localtime(rec['merged']))
+            print(f"{key}  merged {merged}  employees {rec['employees']}  certificates {rec['certificates']}")
+    else:
+        dropped = store.rollback(args.month)
+        print(f"Rolled back to {args.month}; dropped {dropped or 'nothing'}.")
+
+if __name__ == '__main__':
+    main()
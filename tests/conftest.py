@@ -0,0 +1,66 @@
+import os
+import sys
+import zipfile
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+
+REPORT_NAMES = ['筛选结果.xlsx', '筛选排除原因.xlsx']
+
+# The tool is a set of flat modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def write_openpyxl(path, sheets):
+    """Write {sheet name: list of rows (header first)} with openpyxl, the way Excel stores cells (shared strings)."""
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+    return path
+
+def rewrite_part(path, part, replace):
+    """Replace one zip member of an xlsx by replace(its bytes), keeping every other member as it is."""
+    with zipfile.ZipFile(path) as zf:
+        items = [(info, zf.read(info.filename)) for info in zf.infolist()]
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for info, data in items:
+            zf.writestr(info, replace(data) if info.filename == part else data)
+
+@pytest.fixture
+def sample_sheets():
+    """Two small sheets covering texts, numbers, dates and blank cells."""
+    return {
+        '工时数据': [
+            ['工号', '姓名', '职位名称', '门店编码', '考勤工时', '总工时', '入职日期'],
+            ['PD0001', '张三', '茶饮师', 1001, 52, 120.5, datetime(2025, 3, 1)],
+            ['PD0002', '李四', None, 1002, 48, None, datetime(2024, 12, 31, 8, 30)],
+            [1003, '王五', '兼职茶饮师', '1003', 60.25, 40, None],
+            ['PD0004', None, '店长', 1001, None, 0, datetime(2025, 10, 1)],
+        ],
+        '筛选条件': [
+            ['工时数据-区域', '奖金月份'],
+            ['华南', '2025年11月'],
+            [None, None],
+            ['华东', None],
+        ],
+    }
+
+@pytest.fixture(scope='module')
+def generated_workbook(tmp_path_factory):
+    """A small generated 输入数据.xlsx / 输出数据.xlsx pair: (input path, template path)."""
+    from benchmarks.generate import TEMPLATE_NAME, generate_workbook
+    out_dir = tmp_path_factory.mktemp('generated')
+    return generate_workbook(str(out_dir), 1500, seed=3), str(out_dir / TEMPLATE_NAME)
+
+def run_reports(workbook, out_dir, **options):
+    """Run filter_bonus_data on a (input, template) pair; returns both reports read back, as text."""
+    import filter_bonus_data
+    os.makedirs(out_dir, exist_ok=True)
+    summary = filter_bonus_data.filter_bonus_data(*workbook, str(out_dir), load_workers=1, write_workers=1, **options)
+    assert summary['status'] == 'ok'
+    return [pd.read_excel(os.path.join(out_dir, name), dtype=object) for name in REPORT_NAMES]
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from bonus_rules import evaluate_rules, render_reasons
+
+MONTH = pd.Timestamp('2025-11-01')
+
+# Features of an employee that passes every check; each case below overrides what it tests
+BASE = {'title': '茶饮师', 'total_hours': 100.0, 'monthly_hours': 100.0, 'has_any_cert': True,
+        'has_all_required': True, 'latest_required': pd.Timestamp('2025-10-31'), 'has_any_required': True,
+        'earliest_required': pd.Timestamp('2025-01-01'), 'entry_date': pd.Timestamp('2025-01-01')}
+
+NO_CERTS = {'has_any_cert': False, 'has_all_required': False, 'latest_required': pd.NaT,
+            'has_any_required': False, 'earliest_required': pd.NaT}
+
+# (overrides, eligible, reason code, 排除原因 text of the legacy if/elif loop), one row per branch
+CASES = [
+    # Rule 1: tea masters
+    ({**NO_CERTS}, False, 'TEA_NO_CERT', '茶饮师：无任何有效证书'),
+    ({'has_all_required': False, 'latest_required': pd.NaT}, False, 'TEA_MISSING_CERT',
+     '茶饮师：缺少必要的证书（需凑齐大堂、后厨、水吧）'),
+    ({'title': 'Pro训练员'}, True, 'TEA_OK', '茶饮师：3证齐全且符合时间要求 (2025-10-31)'),
+    ({'title': '茶饮师（S）', 'latest_required': MONTH}, False, 'TEA_CERT_TOO_NEW',
+     '茶饮师：证书日期太新 (2025-11-01 >= 2025-11-01)'),
+    # Rule 2: part-time and interns
+    ({'title': '兼职茶饮师', 'total_hours': 40.0, 'monthly_hours': 50.0}, True, 'PART_TIME_OK', '兼职/实习生：符合资格'),
+    ({'title': '兼职收银员', 'total_hours': 39.5}, False, 'PART_TIME_FAIL', '兼职/实习生：不符合条件 - 累计工时(39.5)<40'),
+    ({'title': '就业见习生', 'monthly_hours': 49.0}, False, 'PART_TIME_FAIL', '兼职/实习生：不符合条件 - 当月工时(49.0)<50'),
+    ({'title': '兼职茶饮师', **NO_CERTS}, False, 'PART_TIME_FAIL', '兼职/实习生：不符合条件 - 无任何有效证书'),
+    ({'title': '兼职茶饮师', 'earliest_required': pd.Timestamp('2025-11-05')}, False, 'PART_TIME_FAIL',
+     '兼职/实习生：不符合条件 - 证书日期太新 (2025-11-05)'),
+    ({'title': '兼职茶饮师', 'total_hours': 10.0, 'monthly_hours': 20.0, **NO_CERTS}, False, 'PART_TIME_FAIL',
+     '兼职/实习生：不符合条件 - 累计工时(10.0)<40, 当月工时(20.0)<50, 无任何有效证书'),
+    # Rule 3: assistant managers (entry date + 29 days before the bonus month)
+    ({'title': '副经理', 'entry_date': pd.NaT}, False, 'AM_NO_ENTRY_DATE', '副经理/副店长：缺少入职日期'),
+    ({'title': '副店长', 'entry_date': pd.Timestamp('2025-10-02')}, True, 'AM_OK', '副经理/副店长：符合入职时间要求'),
+    ({'title': '副经理', 'entry_date': pd.Timestamp('2025-10-03')}, False, 'AM_TOO_RECENT',
+     '副经理/副店长：入职未满要求天数 (2025-11-01 >= 2025-11-01)'),
+    # Rule 4: store managers pass whatever their certificates or hours
+    ({'title': '见习店长', 'total_hours': 0.0, **NO_CERTS}, True, 'SM_OK', '店长类职位：自动符合资格'),
+    # No rule for the title
+    ({'title': '收银员'}, False, 'OUT_OF_SCOPE', "职位 '收银员' 不在筛选规则范围内"),
+]
+
+def features_of(cases):
+    return pd.DataFrame([{**BASE, **overrides, 'month_start': MONTH} for overrides, *_ in cases])
+
+@pytest.mark.parametrize('case', CASES, ids=[f'{i}-{case[2]}' for i, case in enumerate(CASES)])
+def test_branch(case):
+    _, eligible, code, text = case
+    features = features_of([case])
+    decisions = evaluate_rules(features)
+    assert decisions['eligible'].tolist() == [eligible]
+    assert decisions['reason_code'].tolist() == [code]
+    assert render_reasons(decisions, features).tolist() == [text]
+
+def test_all_branches_in_one_frame():
+    # Evaluated together (the way the pipeline does), every row still gets its own branch
+    features = features_of(CASES).set_index(pd.Index(range(100, 100 + len(CASES))))
+    decisions = evaluate_rules(features)
+    assert decisions.index.equals(features.index)
+    assert decisions['eligible'].tolist() == [case[1] for case in CASES]
+    assert decisions['reason_code'].tolist() == [case[2] for case in CASES]
+    assert render_reasons(decisions, features).tolist() == [case[3] for case in CASES]
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from filter_bonus_data import OUTPUT_CONSTANTS, OUTPUT_SPEC, build_output, prepare_tables
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '输出数据.xlsx')
+
+def values(series):
+    """Series values with every missing value as None."""
+    return [None if pd.isna(v) else v for v in series]
+
+@pytest.fixture
+def template_cols():
+    return list(pd.read_excel(TEMPLATE).columns)
+
+@pytest.fixture
+def indexes():
+    basic = pd.DataFrame({
+        '工号': ['A', 'B', 'C'],
+        '身份证号码': ['110101', '  ', 'nan'],
+        '第三方公司': ['/', None, '外包A'],
+        '工作地区': ['深圳', None, None],
+        '职位': ['茶饮师', '店长', None],
+        '入职日期': pd.to_datetime(['2024-01-01', None, '2024-03-01']),
+        '转正日期': pd.to_datetime([None, None, None]),
+        '离职日期': pd.to_datetime([None, None, None]),
+    })
+    roster = pd.DataFrame({
+        '工号': ['B', 'C', 'D'],
+        '身份证': ['220202', '330303', '440404'],
+        '第三方公司': ['外包B', '外包C', None],
+        '工作城市': ['上海', '杭州', '北京'],
+        '职位': ['店长', '茶饮师', '兼职茶饮师'],
+        '入职日期': pd.to_datetime(['2023-05-01', '2023-06-01', '2023-07-01']),
+    })
+    status = pd.DataFrame({'ERP门店编码': ['1001', 1002], '品牌': ['奈雪', '台盖'],
+                           '开始营业': pd.to_datetime(['2020-01-01', '2021-01-01']), '闭店时间': pd.to_datetime([None, None])})
+    managers = pd.DataFrame({'部门编号': [1001, 1002], '部门名称': ['店1001', '店1002'], '店长': ['B', None]})
+    return prepare_tables(basic, status, managers, roster)
+
+@pytest.fixture
+def rows():
+    return pd.DataFrame({
+        '工号': ['A', 'B', 'C', 'D', 'E'],
+        '姓名': ['甲', '乙', '丙', '丁', '戊'],
+        '门店编码': ['1001', '1001', '1002', '1003', '1001'],
+        '区域': ['华南'] * 5,
+        '区经理': ['经理'] * 5,
+        '职位名称': ['茶饮师', '店长', '茶饮师', '兼职茶饮师', '副经理'],
+        '最终职位': ['茶饮师', '店长', '', '兼职茶饮师', None],
+        '总工时': [10.0, 20.0, 30.0, 40.0, 50.0],
+    }, index=[7, 3, 9, 1, 5])
+
+def test_columns_follow_the_template(indexes, rows, template_cols):
+    out = build_output(rows, indexes, template_cols, indexes['manager_pairs'], np.full(len(rows), '1001', dtype=object))
+    assert list(out.columns) == template_cols
+    assert out.index.tolist() == list(range(len(rows)))
+    # Every template column is produced by the spec, a constant or the manager flag
+    assert set(template_cols) == set(OUTPUT_SPEC) | set(OUTPUT_CONSTANTS) | {'是否门店负责人'}
+
+def test_values_and_blanks(indexes, rows, template_cols):
+    out = build_output(rows, indexes, template_cols, indexes['manager_pairs'], np.full(len(rows), '1001', dtype=object))
+    # 基本数据 first; blank, whitespace-only and 'nan' texts fall through to 花名册
+    assert out['身份证信息'].tolist()[:4] == ['110101', '220202', '330303', '440404']
+    assert values(out['第三方'][:4]) == ['/', '外包B', '外包A', None]
+    assert out['工作地区'].tolist()[:4] == ['深圳', '上海', '杭州', '北京']
+    # '最终职位' wins unless blank; then 基本数据, 花名册 and the hour row's own title
+    assert out['职位'].tolist() == ['茶饮师', '店长', '茶饮师', '兼职茶饮师', '副经理']
+    assert out['入职日期'].tolist() == [pd.Timestamp('2024-01-01'), pd.Timestamp('2023-05-01'),
+                                    pd.Timestamp('2024-03-01'), pd.Timestamp('2023-07-01'), pd.NaT]
+    # An employee in neither sheet gets blanks, not another row's values
+    assert out.loc[4, ['身份证信息', '第三方', '工作地区']].isna().all()
+    # Store lookups: sheet keys stripped to text, unknown store 1003 blank
+    assert values(out['部门']) == ['店1001', '店1001', '店1002', None, '店1001']
+    assert values(out['组织类型']) == ['奈雪', '奈雪', '台盖', None, '奈雪']
+    assert out['工时'].tolist() == out['总工时'].tolist() == [10.0, 20.0, 30.0, 40.0, 50.0]
+    assert (out['年假小时数'] == 0).all()
+    # Only B manages store 1001 (the store code passed for every row)
+    assert out['是否门店负责人'].tolist() == ['否', '是', '否', '否', '否']
+
+def test_columns_missing_from_the_spec_stay_blank(indexes, rows):
+    out = build_output(rows, indexes, ['工号', '备注', '姓名'], indexes['manager_pairs'],
+                       np.full(len(rows), '', dtype=object))
+    assert list(out.columns) == ['工号', '备注', '姓名']
+    assert out['备注'].isna().all()
+
+def test_store_lookups_use_the_hour_rows_value_as_is(indexes, rows, template_cols):
+    # Legacy: the hour row's 门店编码 is looked up unconverted, so a numeric code finds no text key
+    rows['门店编码'] = [1001, 1001, 1002, 1003, 1001]
+    out = build_output(rows, indexes, template_cols, indexes['manager_pairs'], np.full(len(rows), '1001', dtype=object))
+    assert out['部门'].isna().all() and out['组织类型'].isna().all()
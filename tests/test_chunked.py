@@ -0,0 +1,24 @@
+import functools
+
+import pandas as pd
+import pytest
+
+from conftest import run_reports
+from xlsx_reader import XlsxReader
+
+@pytest.fixture(scope='module')
+def serial(generated_workbook, tmp_path_factory):
+    return run_reports(generated_workbook, tmp_path_factory.mktemp('serial'))
+
+# 200 rows: employees and stores are split across batches; 10**6: a single batch
+@pytest.mark.parametrize('chunk_rows', [200, 10 ** 6])
+def test_chunked_reports_match_serial(generated_workbook, serial, tmp_path, monkeypatch, capsys, chunk_rows):
+    # Batches are cut at read-chunk boundaries; a small read chunk lets this small sheet split
+    monkeypatch.setattr(XlsxReader, 'iter_sheet', functools.partialmethod(XlsxReader.iter_sheet, chunk_size=1 << 12))
+    capsys.readouterr()
+    chunked = run_reports(generated_workbook, tmp_path, chunk_rows=chunk_rows)
+    n_batches = capsys.readouterr().out.count('hour rows read')
+    assert n_batches > 5 if chunk_rows == 200 else n_batches == 1
+    assert len(serial[0]) and len(serial[1])
+    for expected, actual in zip(serial, chunked):
+        pd.testing.assert_frame_equal(actual, expected)
@@ -0,0 +1,26 @@
+import pytest
+
+from filter_bonus_data import parse_args
+
+@pytest.mark.parametrize('argv', [['--months', '2025-11'], ['--filter-sheet', '筛选条件2'], ['-o', 'out', '--months', '2025-11']])
+def test_scenario_batch_needs_workbooks(argv, capsys):
+    with pytest.raises(SystemExit) as exc:
+        parse_args(argv)
+    assert exc.value.code == 2
+    assert '--months / --filter-sheet need the workbooks' in capsys.readouterr().err
+
+def test_scenario_batch_with_workbooks():
+    args = parse_args(['输入数据.xlsx', '--months', '2025-10,2025-11'])
+    assert args.inputs == ['输入数据.xlsx'] and args.months == ['2025-10,2025-11']
+
+@pytest.mark.parametrize('argv', [[], ['--profile'], ['--chunk-rows', '1000']])
+def test_no_console_needs_workbooks(argv, capsys):
+    # Without a console the prompt cannot be answered
+    with pytest.raises(SystemExit):
+        parse_args(argv, console=False)
+    assert 'no workbook given' in capsys.readouterr().err
+    assert parse_args(argv).inputs == []
+
+@pytest.mark.parametrize('argv', [['a.xlsx'], ['--watch'], ['--watch', '--serve', '8765']])
+def test_no_console_runs_headless_modes(argv):
+    parse_args(argv, console=False)
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from date_parser import EXCEL_MAX_SERIAL, parse_date, parse_date_column, reset_date_memo
+
+@pytest.fixture(autouse=True)
+def fresh_memo():
+    reset_date_memo()
+    yield
+    reset_date_memo()
+
+@pytest.mark.parametrize('value, expected', [
+    # Excel serials, whole and fractional
+    (45000, '2023-03-15'),
+    (np.int64(45000), '2023-03-15'),
+    (45000.25, '2023-03-15 06:00'),
+    (EXCEL_MAX_SERIAL, '2262-04-11'),
+    # Whole numbers above the serial range: yyyymmdd / yyyymm digits
+    (20251201, '2025-12-01'),
+    (20251201.0, '2025-12-01'),
+    (202512, '2025-12-01'),
+    # Text
+    ('2025年11月30日', '2025-11-30'),
+    ('2025年11月', '2025-11-01'),
+    ('2025-11-30', '2025-11-30'),
+    ('2025/1/5', '2025-01-05'),
+    ('2025.11.30', '2025-11-30'),
+    ('2025-11', '2025-11-01'),
+    ('2025-11-30 08:15:00', '2025-11-30 08:15'),
+    (' 20251130 ', '2025-11-30'),
+    (datetime(2025, 11, 30, 9), '2025-11-30 09:00'),
+])
+def test_parses(value, expected):
+    assert parse_date(value) == pd.Timestamp(expected)
+
+@pytest.mark.parametrize('value', [
+    0, -3, 150000, 20251301, 2025113, 1e20, 45000.5e3 + 0.5, True, 'nan', '下个月', '2025-13-01', None, np.nan,
+])
+def test_unparseable_values_are_nat(value):
+    assert parse_date(value) is pd.NaT
+
+def test_column_mixes_every_kind():
+    series = pd.Series([45000, '2025年11月', None, 202511, 150000, 45000, datetime(2024, 2, 29)], index=list('abcdefg'))
+    parsed = parse_date_column(series)
+    assert parsed.dtype == 'datetime64[us]'
+    assert parsed.index.tolist() == list('abcdefg')
+    assert parsed.tolist() == [pd.Timestamp('2023-03-15'), pd.Timestamp('2025-11-01'), pd.NaT,
+                               pd.Timestamp('2025-11-01'), pd.NaT, pd.Timestamp('2023-03-15'),
+                               pd.Timestamp('2024-02-29')]
+
+def test_memo_keeps_types_apart():
+    # 1 (serial: 1899-12-31) and True (not a date) are equal as dict keys
+    assert parse_date(1) == pd.Timestamp('1899-12-31')
+    assert parse_date(True) is pd.NaT
+
+def test_datetime_column_is_returned_as_is():
+    series = pd.Series(pd.to_datetime(['2025-11-01', None]))
+    assert parse_date_column(series) is series
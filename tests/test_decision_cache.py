@@ -0,0 +1,84 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import filter_bonus_data as fbd
+from benchmarks.generate import INPUT_NAME, OUTPUT_HEADERS, TEMPLATE_NAME, generate_sheets
+from bonus_rules import TEA_MASTER_TITLES
+from decision_cache import DECISION_DIR_NAME, DIFF_FILE, MANIFEST_NAME, DecisionCache
+from report_writer import write_workbook
+
+REPORTS = ['筛选结果.xlsx', '筛选排除原因.xlsx']
+
+@pytest.fixture
+def workdir(tmp_path):
+    write_workbook({'Sheet1': pd.DataFrame(columns=OUTPUT_HEADERS)}, tmp_path / TEMPLATE_NAME)
+    return tmp_path
+
+def write_input(workdir, sheets):
+    write_workbook(sheets, workdir / INPUT_NAME, shared_strings=True)
+
+def run(workdir, out, incremental, capsys):
+    os.makedirs(workdir / out, exist_ok=True)
+    summary = fbd.filter_bonus_data(str(workdir / INPUT_NAME), str(workdir / TEMPLATE_NAME), str(workdir / out),
+                                    incremental=incremental, load_workers=1, write_workers=1)
+    assert summary['status'] == 'ok'
+    return capsys.readouterr().out
+
+def assert_same_reports(workdir, a, b):
+    for name in REPORTS:
+        pd.testing.assert_frame_equal(pd.read_excel(workdir / a / name), pd.read_excel(workdir / b / name))
+
+def test_unchanged_rerun_reuses_everything(workdir, capsys):
+    write_input(workdir, generate_sheets(300, seed=1))
+    first = run(workdir, 'inc', True, capsys)
+    assert 'no previous run' in first
+    second = run(workdir, 'inc', True, capsys)
+    assert '0 employees with changed inputs' in second
+    assert 'recomputing 0.' in second
+    assert 'building 0.' in second
+    run(workdir, 'cold', False, capsys)
+    assert_same_reports(workdir, 'inc', 'cold')
+    assert len(pd.read_excel(workdir / 'inc' / DIFF_FILE)) == 0
+
+def test_changed_certificates_are_diffed(workdir, capsys):
+    sheets = generate_sheets(300, seed=1)
+    write_input(workdir, sheets)
+    run(workdir, 'inc', True, capsys)
+    eligible = pd.read_excel(workdir / 'inc' / REPORTS[0])
+    tea_masters = eligible.loc[eligible['职位'].isin(TEA_MASTER_TITLES), '工号'].astype(str).unique()[:2]
+    assert len(tea_masters) == 2
+
+    certs = sheets['过岗数据']
+    certs.loc[certs['工号'].astype(str).isin(tea_masters), '状态'] = '失效'
+    write_input(workdir, sheets)
+    out = run(workdir, 'inc', True, capsys)
+    assert '2 employees with changed inputs' in out
+    run(workdir, 'cold', False, capsys)
+    assert_same_reports(workdir, 'inc', 'cold')
+
+    flipped = pd.read_excel(workdir / 'inc' / DIFF_FILE)
+    assert sorted(flipped['工号'].astype(str)) == sorted(tea_masters)
+    assert set(flipped['原结果']) == {'符合'} and set(flipped['新结果']) == {'排除'}
+    assert flipped['新排除原因'].str.len().gt(0).all()
+
+def test_state_is_switched_atomically(workdir, capsys):
+    write_input(workdir, generate_sheets(100, seed=2))
+    for _ in range(3):
+        run(workdir, 'inc', True, capsys)
+    cache_dir = workdir / 'inc' / DECISION_DIR_NAME
+    manifest = json.loads((cache_dir / MANIFEST_NAME).read_text(encoding='utf-8'))
+    assert manifest['serial'] == 3
+    # Superseded state directories are removed once the manifest points at the new one
+    assert sorted(os.listdir(cache_dir)) == sorted([MANIFEST_NAME, manifest['dir']])
+
+def test_other_month_is_not_reused(workdir, capsys):
+    write_input(workdir, generate_sheets(100, seed=2))
+    run(workdir, 'inc', True, capsys)
+    cache_dir = workdir / 'inc' / DECISION_DIR_NAME
+    month = pd.Timestamp(json.loads((cache_dir / MANIFEST_NAME).read_text(encoding='utf-8'))['month'])
+    assert DecisionCache(str(cache_dir), month).reusable
+    other = DecisionCache(str(cache_dir), month + pd.DateOffset(months=1))
+    assert not other.comparable and not other.reusable
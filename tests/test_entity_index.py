@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from entity_index import EntityIndex, PairSet, blank_values, coalesce, text_values
+
+def test_text_values():
+    # Equal values of different types keep their own str(), as the scalar code did
+    series = pd.Series([' A1 ', 1001, 1001.0, None, 'A1', np.nan, True, 1])
+    assert text_values(series).tolist() == ['A1', '1001', '1001.0', 'nan', 'A1', 'nan', 'True', '1']
+    assert text_values(pd.Series([1.0, np.nan])).tolist() == ['1.0', 'nan']
+
+def test_blank_values_per_dtype():
+    assert blank_values(pd.Series(['x', '', '  ', 'nan', 'NaN', None, 0], dtype=object)).tolist() == \
+        [False, True, True, True, True, True, False]
+    assert blank_values(pd.Series(['x', ' ', 'NAN', None], dtype='string')).tolist() == [False, True, True, True]
+    assert blank_values(pd.Series(['x', ' ', None, 'x'], dtype='category')).tolist() == [False, True, True, False]
+    assert blank_values(pd.Series([1.0, np.nan, 0.0])).tolist() == [False, True, False]
+    assert blank_values(pd.Series(pd.to_datetime(['2025-01-01', None]))).tolist() == [False, True]
+
+def test_coalesce_takes_the_first_non_blank_candidate():
+    first = pd.Series(['a', ' ', 'nan', None])
+    second = pd.Series(pd.Categorical(['x', 'b', None, ' ']))
+    last = pd.Series([None, 'z', 'c', ''])
+    # Row 3: every candidate blank, so the last one is used as it is
+    assert coalesce([first, second, last]).tolist() == ['a', 'b', 'c', '']
+    assert coalesce([last]).equals(last)
+
+def test_entity_index_keeps_first_duplicate(capsys):
+    index = EntityIndex(pd.DataFrame({'工号': ['A', 'B', 'A'], '职位': ['茶饮师', '店长', '副经理']}, index=[5, 6, 7]),
+                        '工号', '基本数据')
+    assert "Found duplicate '工号' in '基本数据'. Count: 2" in capsys.readouterr().out
+    assert len(index) == 2
+    positions = index.positions(pd.Series(['B', 'X', 'A']))
+    assert positions.tolist() == [1, -1, 0]
+    assert index.take('职位', positions).tolist()[::2] == ['店长', '茶饮师']
+    assert pd.isna(index.take('职位', positions)[1])
+    assert index.lookup(pd.Series(['A', 'X']), '职位', default='-').tolist() == ['茶饮师', '-']
+    assert index.lookup(pd.Series(['A']), '不存在', default=0).tolist() == [0]
+
+def test_empty_entity_index():
+    index = EntityIndex.empty('花名册')
+    assert len(index) == 0
+    assert index.positions(pd.Series(['A'])).tolist() == [-1]
+    assert index.lookup(pd.Series(['A', 'B']), '职位').tolist() == [None, None]
+
+def test_pair_set_compares_stripped_text():
+    pairs = PairSet(pd.Series([1001, '1002 ']), pd.Series([' PD1', 'PD2']))
+    assert len(pairs) == 2
+    assert pairs.contains(np.array(['1001', '1002', '1001'], dtype=object), pd.Series(['PD1', 'PD2 ', 'PD2'])).tolist() \
+        == [True, True, False]
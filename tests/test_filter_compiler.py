@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from filter_compiler import (available_filter_columns, build_filter_frame, compile_filter, match_filter,
+                             match_hour_rows)
+
+JOINS = [('基本数据', '工号', '工号'), ('门店状态表', '门店编码', 'ERP门店编码')]
+
+def legacy_mask(df, df_filter, columns):
+    """The original loop: OR over filter rows of AND over their non-empty columns of df[col] == value."""
+    mask = pd.Series(False, index=df.index)
+    for _, row in df_filter.dropna(how='all').iterrows():
+        rule = pd.Series(True, index=df.index)
+        for col in columns:
+            if pd.notna(row[col]):
+                rule &= df[col] == row[col]
+        mask |= rule
+    return mask.to_numpy()
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({
+        '区域': ['华南', '华东', '华北', '华南', None, '华东'],
+        '门店编码': [1001, 1002, 1003, 1004, 1005, 1001],
+        '品牌': pd.Categorical(['奈雪', '奈雪PRO', '奈雪', '台盖', '奈雪', '奈雪PRO']),
+        '开业': pd.to_datetime(['2024-01-01', '2024-02-01', None, '2024-01-01', '2024-03-01', '2024-02-01']),
+    })
+
+def test_compile_groups_rows_by_non_empty_columns():
+    df_filter = pd.DataFrame({'区域': ['华南', None, '华东', None], '品牌': [None, '奈雪', '奈雪PRO', None]})
+    groups = compile_filter(df_filter, ['区域', '品牌'])
+    assert set(groups) == {('区域',), ('品牌',), ('区域', '品牌')}
+    assert groups[('区域', '品牌')].to_dict('records') == [{'区域': '华东', '品牌': '奈雪PRO'}]
+
+@pytest.mark.parametrize('df_filter', [
+    pd.DataFrame({'区域': ['华南'], '品牌': [None]}),
+    pd.DataFrame({'区域': ['华南', '华东'], '品牌': [None, '奈雪PRO']}),
+    # Several columns: values are encoded per column and combined into one key
+    pd.DataFrame({'区域': ['华南', '华东', '华北'], '品牌': ['台盖', '奈雪PRO', '奈雪']}),
+    # Duplicate filter rows select the same rows as one of them
+    pd.DataFrame({'区域': ['华东', '华东', '华东'], '品牌': ['奈雪PRO', '奈雪PRO', None]}),
+    # A value no data row has
+    pd.DataFrame({'区域': ['西北'], '品牌': ['奈雪']}),
+    # Numbers: 1001.0 equals 1001, the text '1002' does not equal 1002
+    pd.DataFrame({'门店编码': [1001.0, '1002']}),
+])
+def test_matches_legacy_loop(data, df_filter):
+    columns = list(df_filter.columns)
+    mask = match_filter(data, compile_filter(df_filter, columns))
+    assert mask.tolist() == legacy_mask(data, df_filter, columns).tolist()
+
+def test_empty_filter_row_matches_everything(data):
+    df_filter = pd.DataFrame({'区域': ['华南', None], '品牌': [None, None], '备注': [None, 'x']})
+    assert match_filter(data, compile_filter(df_filter, ['区域', '品牌'])).all()
+
+def test_date_column_compares_with_parsed_text(data):
+    df_filter = pd.DataFrame({'开业': ['2024-02-01', pd.Timestamp('2024-03-01'), '不是日期']}, dtype=object)
+    mask = match_filter(data, compile_filter(df_filter, ['开业']))
+    assert mask.tolist() == [False, True, False, False, True, True]
+
+@pytest.fixture
+def hours():
+    return pd.DataFrame({'工号': ['A', 'B', 'C'], '门店编码': [1001, 1002, 1003], '区域': ['华南', '华东', '华南']},
+                        index=[10, 11, 12])
+
+@pytest.fixture
+def ref_frames():
+    return {
+        # 'A' is listed twice, with different 职位
+        '基本数据': pd.DataFrame({'工号': ['A', 'A', 'B'], '职位': ['茶饮师', '店长', '店长'], '门店': ['x', 'y', 'z']}),
+        '门店状态表': pd.DataFrame({'ERP门店编码': [1001, 1002, 1003], '品牌': ['奈雪', '奈雪', '台盖']}),
+    }
+
+def test_available_columns(hours, ref_frames):
+    names = available_filter_columns(hours, '工时数据', ref_frames, JOINS)
+    assert names == ['工时数据-工号', '工时数据-门店编码', '工时数据-区域', '基本数据-工号', '基本数据-职位',
+                     '基本数据-门店', '门店状态表-ERP门店编码', '门店状态表-品牌']
+
+def test_only_referenced_sheets_and_columns_are_joined(hours, ref_frames):
+    frame = build_filter_frame(hours, '工时数据', ref_frames, JOINS, ['门店状态表-品牌', '工时数据-区域'])
+    assert list(frame.columns) == ['_row', '门店状态表-品牌', '工时数据-区域']
+    assert frame['_row'].tolist() == [0, 1, 2]
+    assert frame['门店状态表-品牌'].tolist() == ['奈雪', '奈雪', '台盖']
+
+def test_duplicate_reference_keys_keep_hour_rows_aligned(hours, ref_frames):
+    # Regression: the legacy left merge gave 'A' two rows and the mask built on that frame was
+    # applied to the hour rows by position, shifting every later row. Now an hour row passes if
+    # any of its joined reference rows matches, and the mask has one entry per hour row.
+    df_filter = pd.DataFrame({'基本数据-职位': ['店长']})
+    mask = match_hour_rows(hours, '工时数据', ref_frames, JOINS, df_filter, ['基本数据-职位'])
+    assert mask.tolist() == [True, True, False]
+
+    df_filter = pd.DataFrame({'基本数据-职位': ['茶饮师'], '工时数据-区域': ['华南']})
+    mask = match_hour_rows(hours, '工时数据', ref_frames, JOINS, df_filter, ['基本数据-职位', '工时数据-区域'])
+    assert mask.tolist() == [True, False, False]
+
+def test_unmatched_join_keys_only_pass_rows_without_conditions_on_that_sheet(hours, ref_frames):
+    # 'C' has no 基本数据 row: a condition on 基本数据 cannot hold, one on 工时数据 still can
+    df_filter = pd.DataFrame({'基本数据-职位': ['茶饮师', None], '工时数据-区域': [None, '华南']})
+    mask = match_hour_rows(hours, '工时数据', ref_frames, JOINS, df_filter, ['基本数据-职位', '工时数据-区域'])
+    assert mask.tolist() == [True, False, True]
+    assert isinstance(mask, np.ndarray)
@@ -0,0 +1,35 @@
+import threading
+
+import pandas as pd
+import pytest
+
+import filter_bonus_data
+from conftest import run_reports
+
+@pytest.fixture(scope='module')
+def serial(generated_workbook, tmp_path_factory):
+    return run_reports(generated_workbook, tmp_path_factory.mktemp('serial'))
+
+@pytest.mark.parametrize('rule_workers, partition_by', [(2, '门店编码'), (3, '区域')])
+def test_partitioned_reports_match_serial(generated_workbook, serial, tmp_path, capsys, rule_workers, partition_by):
+    capsys.readouterr()
+    partitioned = run_reports(generated_workbook, tmp_path, rule_workers=rule_workers, partition_by=partition_by)
+    assert f"by '{partition_by}' with {rule_workers} worker processes" in capsys.readouterr().out
+    assert len(serial[0]) and len(serial[1])
+    for expected, actual in zip(serial, partitioned):
+        pd.testing.assert_frame_equal(actual, expected)
+
+def test_threaded_process_does_not_fork_its_workers(generated_workbook, serial, tmp_path, capsys):
+    # Resident mode runs an HTTP server thread beside the runs
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait, daemon=True)
+    thread.start()
+    try:
+        assert filter_bonus_data._partition_pool_context().get_start_method() != 'fork'
+        partitioned = run_reports(generated_workbook, tmp_path, rule_workers=2)
+    finally:
+        stop.set()
+        thread.join()
+    assert filter_bonus_data._partition_pool_context().get_start_method() == 'fork'
+    for expected, actual in zip(serial, partitioned):
+        pd.testing.assert_frame_equal(actual, expected)
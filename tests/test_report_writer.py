@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+from report_writer import XlsxAppender, write_reports, write_workbook, write_xlsx
+
+@pytest.fixture
+def report():
+    return pd.DataFrame({
+        '工号': ['PD0001', 'PD0002', None],
+        '姓名': ['张三', 'A & <B>', ''],
+        '门店编码': [1001, 1002, 1003],
+        '工时': [120.5, np.nan, 0.0],
+        '是否门店负责人': [True, False, None],
+        '入职日期': pd.to_datetime(['2025-03-01', None, '2024-12-31']),
+        '备注': ['x', 12, 3.5],
+    })
+
+def read_back(path):
+    """{sheet name: (rows as tuples, number formats of the data cells)} of a workbook, via openpyxl."""
+    wb = openpyxl.load_workbook(path)
+    return {ws.title: ([tuple(row) for row in ws.iter_rows(values_only=True)],
+                       [[cell.number_format for cell in row] for row in ws.iter_rows(min_row=2)])
+            for ws in wb.worksheets}
+
+EXPECTED_ROWS = [
+    ('工号', '姓名', '门店编码', '工时', '是否门店负责人', '入职日期', '备注'),
+    ('PD0001', '张三', 1001, 120.5, True, datetime(2025, 3, 1), 'x'),
+    ('PD0002', 'A & <B>', 1002, None, False, None, 12),
+    (None, '', 1003, 0, None, datetime(2024, 12, 31), 3.5),
+]
+
+@pytest.mark.parametrize('shared_strings', [False, True])
+def test_round_trip(tmp_path, report, shared_strings):
+    path = tmp_path / 'out.xlsx'
+    write_workbook({'结果': report, '空表': report.iloc[:0]}, path, shared_strings=shared_strings)
+    sheets = read_back(path)
+    assert list(sheets) == ['结果', '空表']
+    rows, formats = sheets['结果']
+    assert rows == EXPECTED_ROWS
+    # Dates are real date cells shown as yyyy-mm-dd
+    assert formats[0][5] == 'yyyy-mm-dd'
+    assert sheets['空表'][0] == EXPECTED_ROWS[:1]
+
+def test_round_trip_through_read_excel(tmp_path, report):
+    path = tmp_path / 'out.xlsx'
+    # read_excel turns booleans next to blank cells into floats
+    report = report.drop(columns='是否门店负责人')
+    write_xlsx(report, path)
+    expected = report.assign(姓名=report['姓名'].replace('', np.nan))
+    pd.testing.assert_frame_equal(pd.read_excel(path), expected, check_dtype=False)
+
+def test_appender_matches_write_xlsx(tmp_path, report):
+    whole = tmp_path / 'whole.xlsx'
+    write_xlsx(report, whole)
+    appended = tmp_path / 'appended.xlsx'
+    with XlsxAppender(appended, report.columns) as out:
+        out.append(report.iloc[:2])
+        # Columns are taken by name, in the appender's order
+        out.append(report.iloc[2:][report.columns[::-1]])
+    assert read_back(appended)['Sheet1'][0] == read_back(whole)['Sheet1'][0]
+
+def test_write_reports(tmp_path, report):
+    paths = [tmp_path / 'a.xlsx', tmp_path / 'b.xlsx']
+    write_reports([(paths[0], report), (paths[1], report.iloc[:1])], workers=1)
+    assert len(read_back(paths[0])['Sheet1'][0]) == 4
+    assert len(read_back(paths[1])['Sheet1'][0]) == 2
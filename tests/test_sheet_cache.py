@@ -0,0 +1,128 @@
+import json
+import os
+import time
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from conftest import rewrite_part, write_openpyxl
+from sheet_cache import CACHE_VERSION, MANIFEST_NAME, read_sheets_cached
+from xlsx_reader import read_sheet
+
+class CountingReader:
+    """read_sheets callback that records which sheets were actually parsed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.calls = []
+
+    def __call__(self, names):
+        self.calls.append(sorted(names))
+        return {name: read_sheet(self.path, name) for name in names}
+
+@pytest.fixture
+def workbook(tmp_path, sample_sheets):
+    return str(write_openpyxl(tmp_path / 'in.xlsx', sample_sheets))
+
+def load(workbook, cache_dir, names=('工时数据', '筛选条件'), columns=None, versions=None):
+    reader = CountingReader(workbook)
+    frames = read_sheets_cached(workbook, list(names), reader, columns=columns, cache_dir=str(cache_dir),
+                                versions=versions)
+    return frames, reader.calls
+
+def test_miss_then_hit(workbook, tmp_path):
+    first, calls = load(workbook, tmp_path / 'cache')
+    assert calls == [['工时数据', '筛选条件']]
+    second, calls = load(workbook, tmp_path / 'cache')
+    assert calls == []
+    for name, df in first.items():
+        pd.testing.assert_frame_equal(second[name], df)
+
+def test_content_hash_hit_after_touch(workbook, tmp_path):
+    load(workbook, tmp_path / 'cache')
+    later = time.time() + 10
+    os.utime(workbook, (later, later))
+    _, calls = load(workbook, tmp_path / 'cache')
+    assert calls == []
+
+def test_only_edited_sheet_is_parsed_again(tmp_path, sample_sheets):
+    path = str(write_openpyxl(tmp_path / 'in.xlsx', sample_sheets))
+    before = {}
+    load(path, tmp_path / 'cache', versions=before)
+
+    sample_sheets['筛选条件'][1][0] = '华北'
+    write_openpyxl(path, sample_sheets)
+    after = {}
+    frames, calls = load(path, tmp_path / 'cache', versions=after)
+    assert calls == [['筛选条件']]
+    assert frames['筛选条件'].loc[0, '工时数据-区域'] == '华北'
+    assert after['工时数据'] == before['工时数据']
+    assert after['筛选条件'] != before['筛选条件']
+
+def test_changed_shared_strings_invalidate(tmp_path, sample_sheets):
+    path = str(write_openpyxl(tmp_path / 'in.xlsx', sample_sheets))
+    load(path, tmp_path / 'cache')
+    # A text of the first sheet changes: its XML may stay the same, its shared strings do not
+    sample_sheets['工时数据'][1][1] = '张三丰'
+    write_openpyxl(path, sample_sheets)
+    frames, calls = load(path, tmp_path / 'cache')
+    assert '工时数据' in calls[0]
+    assert frames['工时数据'].loc[0, '姓名'] == '张三丰'
+
+def test_other_columns_are_a_miss(workbook, tmp_path):
+    load(workbook, tmp_path / 'cache', columns={'工时数据': ['工号']})
+    _, calls = load(workbook, tmp_path / 'cache', columns={'工时数据': ['工号', '总工时']})
+    assert calls == [['工时数据']]
+
+def test_manifest_of_another_version_is_ignored(workbook, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    load(workbook, cache_dir)
+    manifest_path = cache_dir / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    manifest['version'] = CACHE_VERSION - 1
+    manifest_path.write_text(json.dumps(manifest), encoding='utf-8')
+    _, calls = load(workbook, cache_dir)
+    assert calls == [['工时数据', '筛选条件']]
+
+def test_only_parquet_is_written(workbook, tmp_path):
+    # '工号' mixes texts and a number, '门店编码' numbers and a numeric text
+    first, _ = load(workbook, tmp_path / 'cache')
+    files = os.listdir(tmp_path / 'cache')
+    assert not [name for name in files if name.endswith('.pkl')]
+    assert len([name for name in files if name.endswith('.parquet')]) == 2
+    second, calls = load(workbook, tmp_path / 'cache')
+    assert calls == []
+    assert [type(v) for v in second['工时数据']['工号']] == [type(v) for v in first['工时数据']['工号']]
+    assert second['工时数据']['门店编码'].tolist() == first['工时数据']['门店编码'].tolist()
+
+def test_non_text_headers_and_mixed_values_round_trip(tmp_path):
+    path = str(write_openpyxl(tmp_path / 'in.xlsx', {'工时数据': [
+        ['工号', 10, 2.5, '备注'],
+        ['PD0001', 1, 'a', datetime(2025, 1, 2)],
+        [1002, None, 3, '见习'],
+        [None, 4, True, None],
+    ]}))
+    first, _ = load(path, tmp_path / 'cache', names=['工时数据'])
+    second, calls = load(path, tmp_path / 'cache', names=['工时数据'])
+    assert calls == []
+    pd.testing.assert_frame_equal(second['工时数据'], first['工时数据'])
+    assert list(second['工时数据'].columns) == ['工号', 10, 2.5, '备注']
+
+def test_frames_parquet_cannot_hold_are_not_cached(workbook, tmp_path, capsys):
+    def reader(names):
+        return {name: pd.DataFrame({'a': pd.Series([{'x': 1}], dtype=object)}) for name in names}
+
+    for _ in range(2):
+        frames = read_sheets_cached(workbook, ['筛选条件'], reader, cache_dir=str(tmp_path / 'cache'))
+        assert frames['筛选条件'].loc[0, 'a'] == {'x': 1}
+        assert "Warning: Could not write sheet cache for '筛选条件'" in capsys.readouterr().out
+    assert not [name for name in os.listdir(tmp_path / 'cache') if name != MANIFEST_NAME]
+
+def test_date1904_flag_is_part_of_the_key(workbook, tmp_path):
+    load(workbook, tmp_path / 'cache')
+    # Same sheet XML, but every date serial now counts from 1904
+    rewrite_part(workbook, 'xl/workbook.xml', lambda data: data.replace(b'<workbookPr', b'<workbookPr date1904="1"', 1))
+    frames, calls = load(workbook, tmp_path / 'cache')
+    assert calls == [['工时数据', '筛选条件']]
+    assert frames['工时数据'].loc[0, '入职日期'] == pd.Timestamp('2029-03-02')
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from state_store import BonusStateStore
+
+def hours(**totals):
+    return pd.Series(totals, dtype=float)
+
+def certs(*records):
+    """过岗数据 rows from (工号, 证书名称, 生效日期, 状态) tuples."""
+    return pd.DataFrame(records, columns=['工号', '证书名称', '生效日期', '状态']).assign(
+        生效日期=lambda df: pd.to_datetime(df['生效日期']))
+
+def merge(store, month, total, df_certs):
+    total, state_certs = store.merge_month(pd.Timestamp(month), total, df_certs)
+    dates = state_certs.set_index(['工号', '证书名称'])['生效日期']
+    return total.to_dict(), {key: value.strftime('%Y-%m-%d') for key, value in dates.items()}
+
+def test_months_accumulate(tmp_path):
+    store = BonusStateStore(tmp_path)
+    merge(store, '2025-09-01', hours(A=10, B=5), certs(('A', '后厨', '2025-09-03', '有效'),
+                                                      ('B', '后厨', '2025-09-04', '失效')))
+    total, dates = merge(store, '2025-10-01', hours(A=7, C=1), certs(('A', '后厨', '2025-10-01', '有效'),
+                                                                    ('B', '水吧', '2025-10-02', '有效')))
+    assert total == {'A': 17, 'B': 5, 'C': 1}
+    # The earliest valid date wins; invalid records never enter the state
+    assert dates == {('A', '后厨'): '2025-09-03', ('B', '水吧'): '2025-10-02'}
+    assert BonusStateStore(tmp_path).months() == ['2025-09', '2025-10']
+
+def test_same_month_again_is_reused(tmp_path, capsys):
+    store = BonusStateStore(tmp_path)
+    merge(store, '2025-09-01', hours(A=10), certs())
+    assert merge(store, '2025-09-01', hours(A=10), certs())[0] == {'A': 10}
+    assert 'already merged with the same data' in capsys.readouterr().out
+
+def test_resubmitted_month_rebuilds_later_months(tmp_path):
+    store = BonusStateStore(tmp_path)
+    merge(store, '2025-09-01', hours(A=10), certs())
+    merge(store, '2025-10-01', hours(A=1), certs())
+    # September is corrected after October was merged: it replaces, not adds to, its first version
+    assert merge(store, '2025-09-01', hours(A=20), certs())[0] == {'A': 20}
+    assert store.merge_month(pd.Timestamp('2025-10-01'), hours(A=1), certs())[0].to_dict() == {'A': 21}
+
+def test_rollback(tmp_path):
+    store = BonusStateStore(tmp_path)
+    for month, value in (('2025-09-01', 10), ('2025-10-01', 1), ('2025-11-01', 2)):
+        merge(store, month, hours(A=value), certs())
+    assert store.rollback('2025-09') == ['2025-10', '2025-11']
+    assert not (tmp_path / '2025-10').exists()
+    store = BonusStateStore(tmp_path)
+    assert store.months() == ['2025-09']
+    assert merge(store, '2025-10-01', hours(A=3), certs())[0] == {'A': 13}
+    with pytest.raises(ValueError):
+        store.rollback('2024-01')
@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from conftest import rewrite_part, write_openpyxl
+from report_writer import write_workbook
+from xlsx_reader import XlsxReader, read_sheet
+
+def assert_matches_read_excel(path, sheet_names, usecols=None):
+    for name in sheet_names:
+        expected = pd.read_excel(path, sheet_name=name, usecols=usecols)
+        pd.testing.assert_frame_equal(read_sheet(path, name, usecols=usecols), expected)
+
+def test_shared_strings_match_read_excel(tmp_path, sample_sheets):
+    path = write_openpyxl(tmp_path / 'in.xlsx', sample_sheets)
+    assert_matches_read_excel(path, sample_sheets)
+
+def test_usecols_match_read_excel(tmp_path, sample_sheets):
+    path = write_openpyxl(tmp_path / 'in.xlsx', sample_sheets)
+    assert_matches_read_excel(path, ['工时数据'], usecols=['工号', '总工时', '入职日期'])
+
+def test_inline_strings_match_read_excel(tmp_path):
+    df = pd.DataFrame({
+        '工号': ['PD0001', 'PD0002', None],
+        '门店编码': [1001, 1002, 1003],
+        '总工时': [1.5, None, 3.0],
+        '入职日期': pd.to_datetime(['2025-01-31', None, '2024-02-29']),
+    })
+    path = tmp_path / 'inline.xlsx'
+    write_workbook({'Sheet1': df}, path)
+    assert_matches_read_excel(path, ['Sheet1'])
+
+@pytest.mark.parametrize('absolute', [True, False])
+def test_relationship_targets(tmp_path, sample_sheets, absolute):
+    # openpyxl writes absolute '/xl/worksheets/...' targets, Excel relative 'worksheets/...' ones
+    path = write_openpyxl(tmp_path / 'in.xlsx', sample_sheets)
+    if not absolute:
+        rewrite_part(path, 'xl/_rels/workbook.xml.rels', lambda data: data.replace(b'Target="/xl/', b'Target="'))
+    with XlsxReader(path) as reader:
+        assert reader.sheet_names == list(sample_sheets)
+    assert_matches_read_excel(path, sample_sheets)
+
+def test_batches_cover_every_row(tmp_path, sample_sheets):
+    path = write_openpyxl(tmp_path / 'in.xlsx', sample_sheets)
+    with XlsxReader(path) as reader:
+        batches = list(reader.iter_sheet('工时数据', batch_rows=3))
+    assert [len(b) for b in batches] == [3, 1]
+    assert pd.concat(batches, ignore_index=True)['工号'].tolist() == ['PD0001', 'PD0002', 1003, 'PD0004']
+
+def test_missing_sheet(tmp_path, sample_sheets):
+    path = write_openpyxl(tmp_path / 'in.xlsx', sample_sheets)
+    with pytest.raises(ValueError):
+        read_sheet(path, '花名册')
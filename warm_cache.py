@@ -0,0 +1,75 @@
+class WarmCache:
+    """
+    What a long-running process (see resident.py) keeps in memory between runs of filter_bonus_data:
+
+    - parsed sheets, keyed like the sheet cache entries (see sheet_cache.read_sheets_cached), so a
+      sheet whose XML part did not change is neither parsed again nor read back from disk;
+    - values derived from those sheets (aggregated hours, certificate index, reference lookups),
+      rebuilt only when one of the frames they were built from is replaced;
+    - the reports of the last run, for callers that serve them instead of reading the xlsx files.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.frames = {}
+        self.used = set()
+        self.derived = {}
+        self.reports = []
+        # Names of the derived values reused in the current run (reported once per run by the caller)
+        self.reused = []
+
+    def begin_run(self):
+        self.reused = []
+
+    # --- Sheet frames (the `memory` of read_sheets_cached) ---
+
+    def get(self, key):
+        """Frame stored under a sheet cache key, or None."""
+        df = self.frames.get(key)
+        if df is not None:
+            self.used.add(key)
+        return df
+
+    def put(self, key, df):
+        self.frames[key] = df
+        self.used.add(key)
+
+    def release_unused(self):
+        """Drop the frames no run has used since the last call (older versions of changed sheets)."""
+        for key in set(self.frames) - self.used:
+            del self.frames[key]
+        self.used = set()
+
+    # --- Derived values ---
+
+    def derive(self, name, sources, build):
+        """
+        build() memoized on the identity of its source frames: the stored value is returned as long
+        as every frame in sources is the same object as last time (frames come from get() above,
+        so an unchanged sheet is the same object across runs). Values must not be modified by callers.
+        """
+        sources = tuple(sources)
+        stored = self.derived.get(name)
+        if stored is not None and len(stored[0]) == len(sources) and all(
+                a is b for a, b in zip(stored[0], sources)):
+            self.reused.append(name)
+            return stored[1]
+        value = build()
+        self.derived[name] = (sources, value)
+        return value
+
+    def keep_reports(self, reports):
+        self.reports = reports
+
+class NullWarmCache:
+    """Stand-in for single runs: nothing is kept, derive() simply builds."""
+
+    enabled = False
+    reports = []
+
+    def derive(self, name, sources, build):
+        return build()
+
+    def keep_reports(self, reports):
+        pass
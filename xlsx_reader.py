@@ -0,0 +1,415 @@
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from xml.parsers import expat
+
+import numpy as np
+import pandas as pd
+from openpyxl.styles.numbers import (
+    BUILTIN_FORMATS_REVERSE,
+    builtin_format_code,
+    is_date_format,
+    is_timedelta_format,
+)
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+from pandas.io.parsers import TextParser
+
+from schema_probe import NS_MAIN, column_index, header_names, read_shared_strings, uses_1904_dates, workbook_sheet_parts
+
+# Kinds of values seen in a column, used to pick the output dtype
+KIND_NUM = 1
+KIND_FLOAT = 2   # at least one non-integral number
+KIND_DATE = 4    # number in a date-formatted cell
+KIND_OTHER = 8   # strings, booleans, ISO dates: needs pandas' text inference
+
+# Initial row capacity when the sheet dimension is missing or huge (some exports
+# declare ~1M rows of styled but empty cells); buffers grow on demand.
+MAX_PREALLOCATED_ROWS = 1 << 16
+
+WINDOWS_EPOCH = np.datetime64('1899-12-30', 'us')
+MAC_EPOCH = np.datetime64('1904-01-01', 'us')
+
+_DIGITS = '0123456789'
+
+def column_letters(idx):
+    """0 -> 'A', 27 -> 'AB'"""
+    letters = ''
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+class XlsxReader:
+    """
+    Streaming reader for the input workbook.
+
+    Reads worksheet XML straight from the zip with an incremental (expat) parser instead of
+    building an openpyxl workbook. The shared-strings table and the date styles are decoded
+    once and reused for every sheet, and cells outside the requested columns are skipped
+    without being converted.
+
+    Results match pd.read_excel(..., sheet_name=name, usecols=cols): numeric and date-only
+    columns are built directly as int64/float64/datetime64 arrays, while columns holding text
+    go through the same pandas text inference read_excel uses (NA strings, numeric strings).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.zf = zipfile.ZipFile(path)
+        self.parts = workbook_sheet_parts(self.zf)
+        self.epoch = MAC_EPOCH if uses_1904_dates(self.zf) else WINDOWS_EPOCH
+        self.epoch_datetime = self.epoch.astype(datetime)
+        self._shared_strings = None
+        self._date_styles = None
+
+    @property
+    def sheet_names(self):
+        return list(self.parts)
+
+    def close(self):
+        self.zf.close()
+
+    def reopen(self):
+        """Open the workbook again after close(); the decoded shared strings and styles are kept."""
+        if self.zf.fp is None:
+            self.zf = zipfile.ZipFile(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Workbook-level tables (decoded once) ---
+
+    @property
+    def shared_strings(self):
+        if self._shared_strings is None:
+            self._shared_strings = read_shared_strings(self.zf)
+        return self._shared_strings
+
+    @property
+    def date_styles(self):
+        """(date style indexes, timedelta style indexes), decided the same way openpyxl does."""
+        if self._date_styles is None:
+            date_styles, timedelta_styles = set(), set()
+            if 'xl/styles.xml' in set(self.zf.namelist()):
+                styles = ET.fromstring(self.zf.read('xl/styles.xml'))
+                custom = {}
+                num_fmts = styles.find(f'{{{NS_MAIN}}}numFmts')
+                if num_fmts is not None:
+                    for nf in num_fmts:
+                        custom[int(nf.get('numFmtId'))] = nf.get('formatCode')
+                cell_xfs = styles.find(f'{{{NS_MAIN}}}cellXfs')
+                for idx, xf in enumerate(cell_xfs if cell_xfs is not None else []):
+                    fmt_id = int(xf.get('numFmtId', 0))
+                    fmt = custom[fmt_id] if fmt_id in custom else builtin_format_code(fmt_id)
+                    if fmt in BUILTIN_FORMATS_REVERSE:
+                        fmt = builtin_format_code(BUILTIN_FORMATS_REVERSE[fmt])
+                    if fmt and is_date_format(fmt):
+                        date_styles.add(str(idx))
+                    if fmt and is_timedelta_format(fmt):
+                        timedelta_styles.add(str(idx))
+            self._date_styles = (date_styles, timedelta_styles)
+        return self._date_styles
+
+    # --- Sheet parsing ---
+
+    def read_sheet(self, sheet_name, usecols=None, chunk_size=1 << 20):
+        """
+        Read one sheet into a DataFrame, using the first row as header.
+        usecols: list of header names to keep (others are skipped while parsing); None keeps all.
+        """
+        return next(self.iter_sheet(sheet_name, usecols=usecols, chunk_size=chunk_size))
+
+    def iter_sheet(self, sheet_name, usecols=None, batch_rows=None, chunk_size=1 << 20):
+        """
+        Stream one sheet as DataFrames of about batch_rows data rows each (a single frame when
+        batch_rows is None), so only one batch is held in memory at a time.
+        Each batch gets its dtypes from its own values, the way read_excel would type a sheet
+        holding just those rows: e.g. a column of numeric-looking texts can come out as numbers
+        in one batch and as strings in another.
+        """
+        part = self.parts.get(sheet_name)
+        if part is None:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+
+        sst = self.shared_strings
+        date_styles, timedelta_styles = self.date_styles
+        wanted_names = set(usecols) if usecols is not None else None
+
+        header = {}          # column index -> header value
+        slots = None         # column index -> position in the buffers below (data rows only)
+        slot_names = []
+        buffers = []         # one preallocated list of cell values per kept column
+        kinds = []
+        date_rows = []       # per kept column: row positions of date-formatted numbers
+        capacity = MAX_PREALLOCATED_ROWS
+        last_row = 0         # last sheet row holding any value (trailing empty rows are trimmed)
+        base = 0             # data row held at position 0 of the buffers (rows before it were yielded)
+        yielded = False
+        col_cache = {}       # 'AB' -> 27
+
+        # Parser state, updated by the handlers below
+        row = -1
+        col = -1
+        cell_type = None
+        cell_style = None
+        keep = False
+        capture = False
+        in_rph = False
+        cell_text = None
+
+        with self.zf.open(part) as f:
+            chunk = f.read(chunk_size)
+            # Tags are matched without namespace processing (noticeably faster in expat);
+            # pick up the prefix some writers put on every tag, e.g. <x:c>
+            m = re.search(rb'<(\w+:)?worksheet[\s>]', chunk)
+            prefix = m.group(1).decode() if m and m.group(1) else ''
+            tag_c, tag_v, tag_t, tag_is, tag_row, tag_rph, tag_dimension = (
+                prefix + name for name in ('c', 'v', 't', 'is', 'row', 'rPh', 'dimension'))
+
+            def start(tag, attrs):
+                nonlocal row, col, cell_type, cell_style, keep, capture, in_rph, capacity, cell_text, last_row
+                if tag == tag_c:
+                    ref = attrs.get('r')
+                    if ref:
+                        letters = ref.rstrip(_DIGITS)
+                        col = col_cache.get(letters)
+                        if col is None:
+                            col = col_cache[letters] = column_index(letters)
+                    else:
+                        col += 1
+                    keep = row == 0 or col in slots
+                    cell_type = attrs.get('t')
+                    cell_style = attrs.get('s')
+                    cell_text = None
+                elif tag == tag_v:
+                    capture = keep
+                    # Any value (even in a skipped column) keeps the row from being trimmed as trailing
+                    if row > last_row:
+                        last_row = row
+                elif tag == tag_row:
+                    r = attrs.get('r')
+                    row = int(r) - 1 if r else row + 1
+                    col = -1
+                    if slots is None and row > 0:
+                        _finish_header()
+                elif tag == tag_t:
+                    capture = keep and not in_rph
+                elif tag == tag_is:
+                    if row > last_row:
+                        last_row = row
+                elif tag == tag_rph:
+                    in_rph = True
+                elif tag == tag_dimension:
+                    # 'A1:L996305' -> preallocate for the declared rows (capped)
+                    ref = attrs.get('ref', '')
+                    if ':' in ref:
+                        declared = int(ref.split(':')[1].lstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ') or 0)
+                        capacity = max(1, min(declared, MAX_PREALLOCATED_ROWS))
+
+            def chars(data):
+                nonlocal cell_text
+                if capture:
+                    cell_text = data if cell_text is None else cell_text + data
+
+            def end(tag):
+                nonlocal capture, in_rph, capacity
+                if tag == tag_c:
+                    if cell_text is None:
+                        return
+                    if row == 0:
+                        header[col] = _convert_scalar(cell_text)
+                        return
+                    pos = slots[col]
+                    i = row - 1 - base
+                    if i >= capacity:
+                        grow = max(capacity, i + 1 - capacity)
+                        for buf in buffers:
+                            buf.extend([None] * grow)
+                        capacity += grow
+                    t = cell_type
+                    value = cell_text
+                    if t is None or t == 'n':
+                        if cell_style in date_styles:
+                            number = float(value)
+                            if cell_style in timedelta_styles:
+                                buffers[pos][i] = from_excel(number, self.epoch_datetime, timedelta=True)
+                                kinds[pos] |= KIND_OTHER
+                                return
+                            buffers[pos][i] = number
+                            kinds[pos] |= KIND_DATE
+                            date_rows[pos].append(i)
+                        elif '.' in value or 'E' in value or 'e' in value:
+                            number = float(value)
+                            if number.is_integer():
+                                buffers[pos][i] = int(number)
+                                kinds[pos] |= KIND_NUM
+                            else:
+                                buffers[pos][i] = number
+                                kinds[pos] |= KIND_NUM | KIND_FLOAT
+                        else:
+                            # Plain integers are parsed exactly (18-digit IDs do not survive a float round-trip)
+                            buffers[pos][i] = int(value)
+                            kinds[pos] |= KIND_NUM
+                    elif t == 's':
+                        buffers[pos][i] = sst[int(value)]
+                        kinds[pos] |= KIND_OTHER
+                    elif t == 'str' or t == 'inlineStr':
+                        buffers[pos][i] = value
+                        kinds[pos] |= KIND_OTHER
+                    elif t == 'b':
+                        buffers[pos][i] = bool(int(value))
+                        kinds[pos] |= KIND_OTHER
+                    elif t == 'd':
+                        buffers[pos][i] = from_ISO8601(value)
+                        kinds[pos] |= KIND_OTHER
+                    # t == 'e' (error cells such as #N/A) read as missing, like pandas does
+                elif tag == tag_v or tag == tag_t:
+                    capture = False
+                elif tag == tag_rph:
+                    in_rph = False
+
+            def _convert_scalar(value):
+                """Cell value as openpyxl + pandas would see it (used for the header row)."""
+                t = cell_type
+                if t == 's':
+                    return sst[int(value)]
+                if t is None or t == 'n':
+                    number = float(value)
+                    if cell_style in date_styles:
+                        return from_excel(number, self.epoch_datetime, timedelta=cell_style in timedelta_styles)
+                    return int(number) if number.is_integer() else number
+                return value
+
+            def _take(n):
+                """Frame of the first n buffered data rows; the buffers then start at the row after them."""
+                nonlocal base
+                frame = self._build_frame(slot_names, [buf[:n] for buf in buffers], kinds, date_rows, n)
+                for pos, buf in enumerate(buffers):
+                    del buf[:n]
+                    buf.extend([None] * n)
+                    # A row being parsed may already hold values: type them for the next batch
+                    date_rows[pos] = [i - n for i in date_rows[pos] if i >= n]
+                    kinds[pos] = _value_kinds(buf, date_rows[pos])
+                base += n
+                return frame
+
+            def _finish_header():
+                nonlocal slots
+                slots = {}
+                for c, name in header_names(header).items():
+                    if wanted_names is None or name in wanted_names:
+                        slots[c] = len(buffers)
+                        slot_names.append(name)
+                        buffers.append([None] * capacity)
+                        kinds.append(0)
+                        date_rows.append([])
+
+            parser = expat.ParserCreate()
+            parser.buffer_text = True
+            parser.StartElementHandler = start
+            parser.EndElementHandler = end
+            parser.CharacterDataHandler = chars
+            # Exports often carry ~1M styled rows with no values (<c r="G9" s="9"/>).
+            # Dropping those bytes before expat sees them avoids millions of handler calls;
+            # only cells/rows with an explicit 'r' are dropped, so positions stay correct.
+            p = re.escape(prefix.encode())
+            empty_cell = rb'<' + p + rb'c r="[A-Z]+\d+"[^>]*?/>'
+            empty = re.compile(rb'<' + p + rb'row r="\d+"[^>]*?(?:/>|>(?:\s*' + empty_cell + rb')*\s*</' + p + rb'row>)|' + empty_cell)
+            pending = b''
+            while chunk:
+                data = pending + chunk
+                cut = data.rfind(b'>') + 1
+                pending = data[cut:]
+                parser.Parse(empty.sub(b'', data[:cut]), False)
+                chunk = f.read(chunk_size)
+                if batch_rows and slots is not None:
+                    # Rows before the one being parsed are complete; empty rows after the last
+                    # value wait for the next batch, as they may turn out to be trailing rows
+                    ready = min(last_row, row - 1) - base
+                    if ready >= batch_rows:
+                        yield _take(ready)
+                        yielded = True
+            parser.Parse(pending, True)
+
+            if slots is None:
+                _finish_header()
+            if last_row > base or not yielded:
+                yield _take(max(last_row - base, 0))
+
+    def _build_frame(self, slot_names, values, kinds, date_rows, n_rows):
+        """DataFrame of n_rows rows from the per-column cell values collected by iter_sheet."""
+        columns = {}
+        object_cols = []
+        for pos, name in enumerate(slot_names):
+            columns[name] = self._build_column(values[pos], kinds[pos], n_rows)
+            if columns[name] is None:
+                object_cols.append((name, values[pos], date_rows[pos]))
+
+        if object_cols:
+            # Text-bearing columns: let pandas apply the exact inference read_excel uses
+            data = []
+            for name, col_values, d_rows in object_cols:
+                for i in d_rows:
+                    if i < n_rows:
+                        col_values[i] = from_excel(col_values[i], self.epoch_datetime)
+                data.append(['' if v is None else v for v in col_values])
+            header_row = [str(i) for i in range(len(object_cols))]
+            parsed = TextParser([header_row] + [list(r) for r in zip(*data)], header=0, skip_blank_lines=False).read()
+            for i, (name, _, _) in enumerate(object_cols):
+                columns[name] = parsed[str(i)].reset_index(drop=True)
+
+        return pd.DataFrame({name: columns[name] for name in slot_names}, columns=slot_names)
+
+    def _build_column(self, values, kind, n_rows):
+        """Typed array for numeric / date-only columns; None when pandas text inference is needed."""
+        if n_rows == 0:
+            return pd.Series([], dtype=object)
+        if kind == 0:
+            return pd.Series(np.full(n_rows, np.nan))
+        if kind & KIND_OTHER:
+            return None
+        if kind & KIND_DATE:
+            if kind & KIND_NUM:
+                return None
+            serials = np.array(values, dtype=float)
+            valid = serials[~np.isnan(serials)]
+            # Serials below 61 hit Excel's 1900 leap-year quirk / time-only values: leave those to openpyxl's rules
+            if valid.size and valid.min() < 61:
+                return None
+            days = np.floor(serials)
+            millis = np.round((serials - days) * 86400000.0)
+            stamps = self.epoch + (np.nan_to_num(days).astype('int64') * 86400000000
+                                   + np.nan_to_num(millis).astype('int64') * 1000).astype('timedelta64[us]')
+            stamps[np.isnan(serials)] = np.datetime64('NaT')
+            return pd.Series(stamps)
+        if not kind & KIND_FLOAT and None not in values:
+            try:
+                return pd.Series(np.array(values, dtype=np.int64))
+            except OverflowError:
+                return None
+        return pd.Series(np.array(values, dtype=float))
+
+def _value_kinds(values, date_rows):
+    """KIND_* flags of already converted cell values (date_rows: positions of date-formatted numbers)."""
+    kind = KIND_DATE if date_rows else 0
+    dates = set(date_rows)
+    for i, value in enumerate(values):
+        if value is None or i in dates:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            kind |= KIND_OTHER
+        elif isinstance(value, float):
+            kind |= KIND_NUM | KIND_FLOAT
+        else:
+            kind |= KIND_NUM
+    return kind
+
+def read_sheet(path, sheet_name, usecols=None):
+    """Convenience wrapper: read a single sheet with XlsxReader."""
+    with XlsxReader(path) as reader:
+        return reader.read_sheet(sheet_name, usecols=usecols)